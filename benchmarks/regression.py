@@ -0,0 +1,186 @@
+# ------------------- Benchmark Regression Tracking -------------------
+# Stores benchmark reports as versioned baselines and compares new runs against them.
+#
+# A metric only counts as a regression when its median got slower than the threshold
+# AND the bootstrap confidence intervals of the two medians do not overlap, so a single
+# noisy run on a busy machine does not fail the build.
+#
+#   python benchmarks/run_benchmarks.py --repeat 5 --save-baseline main
+#   python benchmarks/run_benchmarks.py --repeat 5 --compare main --threshold 0.10
+#   python benchmarks/regression.py old_report.json new_report.json
+
+import os
+import sys
+import json
+import random
+import argparse
+import datetime
+import subprocess
+from pathlib import Path
+
+
+SCHEMA_VERSION = 1
+BASELINE_DIR = Path(__file__).resolve().parent / "baselines"
+
+
+def median(values):
+    ordered = sorted(values)
+    mid = len(ordered) // 2
+    if len(ordered) % 2:
+        return ordered[mid]
+    return (ordered[mid - 1] + ordered[mid]) / 2
+
+
+def bootstrap_ci(samples, confidence=0.95, iterations=2000, seed=1234):
+    """Percentile bootstrap interval for the median of samples"""
+    if len(samples) < 2:
+        return samples[0], samples[0]
+    rng = random.Random(seed)
+    medians = sorted(median([rng.choice(samples) for _ in samples]) for _ in range(iterations))
+    tail = (1 - confidence) / 2
+    return medians[int(tail * (iterations - 1))], medians[int((1 - tail) * (iterations - 1))]
+
+
+def summarize(samples):
+    mid = median(samples)
+    low, high = bootstrap_ci(samples)
+    return {
+        "samples": list(samples),
+        "median": mid,
+        "mad": median([abs(s - mid) for s in samples]),
+        "ci_low": low,
+        "ci_high": high,
+    }
+
+
+def metrics_from_report(report):
+    """Flatten a run_benchmarks report into {metric name: summary} (all values in seconds)"""
+    metrics = {}
+    for row in report["scenarios"]:
+        metrics[f"scenario:{row['scenario']}"] = summarize(row.get("samples") or [row["seconds"]])
+    for row in report["stages"]:
+        samples = row.get("samples") or [row["mean_ms"]]
+        metrics[f"stage:{row['stage']}"] = summarize([s / 1000 for s in samples])
+    return metrics
+
+
+def _git_commit():
+    try:
+        result = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=Path(__file__).resolve().parent)
+        return result.stdout.strip() or None
+    except OSError:
+        return None
+
+
+def build_baseline(report):
+    return {
+        "schema": SCHEMA_VERSION,
+        "created": datetime.datetime.now().isoformat(),
+        "commit": _git_commit(),
+        "profile": report["profile"],
+        "jvm_startup_s": report.get("jvm_startup_s", 0.0),
+        "platform": report["platform"],
+        "python": report["python"],
+        "cpus": report["cpus"],
+        "metrics": metrics_from_report(report),
+    }
+
+
+def baseline_path(name):
+    path = Path(name)
+    if path.suffix == ".json" or os.sep in name:
+        return path
+    return BASELINE_DIR / f"{name}.json"
+
+
+def save_baseline(report, name):
+    path = baseline_path(name)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(build_baseline(report), f, indent=4)
+    return path
+
+
+def load_baseline(name):
+    with open(baseline_path(name), "r") as f:
+        data = json.load(f)
+    if "scenarios" in data:  # a raw run_benchmarks report
+        data = build_baseline(data)
+    if data.get("schema") != SCHEMA_VERSION:
+        raise ValueError(f"Unsupported baseline schema {data.get('schema')} (expected {SCHEMA_VERSION})")
+    return data
+
+
+def compare(baseline, current, threshold=0.10):
+    """Compare two baselines; returns rows with a status of ok, faster, slower (noisy) or regression"""
+    if baseline["profile"] != current["profile"]:
+        raise ValueError(f"Cannot compare profile '{current['profile']}' with baseline profile '{baseline['profile']}'")
+    
+    rows = []
+    for metric, base in baseline["metrics"].items():
+        new = current["metrics"].get(metric)
+        if not new:
+            rows.append({"metric": metric, "base": base["median"], "new": None, "change": None, "status": "missing"})
+            continue
+        
+        change = new["median"] / base["median"] - 1 if base["median"] else 0.0
+        separated_slower = new["ci_low"] > base["ci_high"]
+        separated_faster = new["ci_high"] < base["ci_low"]
+        if change > threshold and separated_slower:
+            status = "regression"
+        elif change > threshold:
+            status = "slower"  # beyond threshold but within noise
+        elif change < -threshold and separated_faster:
+            status = "faster"
+        else:
+            status = "ok"
+        rows.append({"metric": metric, "base": base["median"], "new": new["median"], "change": change, "status": status})
+    return rows
+
+
+def format_comparison(rows, baseline, current, threshold):
+    lines = [
+        f"Baseline: {baseline.get('commit') or '?'} ({baseline['created'][:19]}, {baseline['platform']})",
+        f"Current:  {current.get('commit') or '?'} ({current['created'][:19]}, {current['platform']})",
+        f"Threshold: {threshold:.0%} slower with non-overlapping 95% confidence intervals",
+        "",
+        f"{'Metric':<36}{'Base ms':>12}{'New ms':>12}{'Change':>10}  Status",
+    ]
+    for row in rows:
+        new = f"{row['new'] * 1000:>12.1f}" if row["new"] is not None else f"{'-':>12}"
+        change = f"{row['change']:>+10.1%}" if row["change"] is not None else f"{'-':>10}"
+        marker = "  <-- REGRESSION" if row["status"] == "regression" else ""
+        lines.append(f"{row['metric']:<36}{row['base'] * 1000:>12.1f}{new}{change}  {row['status']}{marker}")
+    
+    regressions = [r for r in rows if r["status"] == "regression"]
+    lines.append("")
+    lines.append(f"{len(regressions)} regression(s) out of {len(rows)} metrics")
+    return "\n".join(lines)
+
+
+def check_report(report, baseline_name, threshold=0.10, out=sys.stdout):
+    """Compare a fresh report with a stored baseline; returns True when nothing regressed"""
+    baseline = load_baseline(baseline_name)
+    current = build_baseline(report)
+    rows = compare(baseline, current, threshold)
+    print(format_comparison(rows, baseline, current, threshold), file=out)
+    return not any(r["status"] == "regression" for r in rows)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare two benchmark reports or baselines")
+    parser.add_argument("baseline", help="Baseline name (benchmarks/baselines/<name>.json) or JSON path")
+    parser.add_argument("current", help="Report or baseline JSON to check")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Allowed slowdown (default: 0.10 = 10%%)")
+    args = parser.parse_args(argv)
+    
+    baseline = load_baseline(args.baseline)
+    current = load_baseline(args.current)
+    rows = compare(baseline, current, args.threshold)
+    print(format_comparison(rows, baseline, current, args.threshold))
+    return 1 if any(r["status"] == "regression" for r in rows) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,488 @@
+# ------------------- Signing Benchmarks -------------------
+# Offline end-to-end benchmark for AdvancedApkSigner.
+#
+# Generates a synthetic corpus of APK-shaped ZIPs and stub jarsigner/zipalign/apksigner
+# executables, then times sign_apk, batch_sign and calculate_hash against them.
+#
+#   python benchmarks/run_benchmarks.py                 # quick corpus
+#   python benchmarks/run_benchmarks.py --profile full  # adds large APKs
+#   python benchmarks/run_benchmarks.py --json bench.json
+#   python benchmarks/run_benchmarks.py --repeat 5 --compare main   # see regression.py
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import logging
+import zipfile
+import argparse
+import datetime
+import platform
+import tempfile
+import tracemalloc
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from signkey import (
+    AdvancedApkSigner, ConfigManager, der_encode, DER_RSA_ENCRYPTION, DER_SHA256_ALGORITHM, OID_PKCS7_DATA,
+    OID_PKCS7_SIGNED_DATA,
+)
+from regression import check_report, save_baseline
+
+
+MB = 1024 * 1024
+
+CORPUS_PROFILES = {
+    "quick": [
+        {"name": "small", "size_mb": 2, "entries": 300, "deflated": 0.5, "native_libs": 1, "count": 8},
+        {"name": "medium", "size_mb": 24, "entries": 1500, "deflated": 0.7, "native_libs": 4, "count": 2},
+    ],
+    "full": [
+        {"name": "small", "size_mb": 2, "entries": 300, "deflated": 0.5, "native_libs": 1, "count": 32},
+        {"name": "medium", "size_mb": 24, "entries": 1500, "deflated": 0.7, "native_libs": 4, "count": 8},
+        {"name": "large", "size_mb": 160, "entries": 6000, "deflated": 0.8, "native_libs": 12, "count": 2},
+    ],
+}
+
+STUB_TOOL = '''#!{python}
+# Stand-in for the Android/JDK signing tools used by the benchmark suite
+import hashlib, os, shutil, sys, time, zipfile
+
+time.sleep(float(os.environ.get("APK_BENCH_JVM_STARTUP", "0")))
+tool = os.path.basename(sys.argv[0])
+args = sys.argv[1:]
+
+
+def digest_entries(path, verbose_prefix=None):
+    with zipfile.ZipFile(path) as zf:
+        for info in zf.infolist():
+            h = hashlib.sha256()
+            with zf.open(info) as f:
+                for block in iter(lambda: f.read(1 << 16), b""):
+                    h.update(block)
+            if verbose_prefix:
+                print(f"{{verbose_prefix}}: {{info.filename}}")
+
+
+def digest_file(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+if tool == "jarsigner" and "-verify" in args:
+    digest_entries(args[-1])
+    print("jar verified.")
+elif tool == "jarsigner":
+    apk = args[-2]
+    if "-signedjar" in args:
+        shutil.copyfile(apk, args[args.index("-signedjar") + 1])
+        apk = args[args.index("-signedjar") + 1]
+    digest_entries(apk, "   adding")
+    with zipfile.ZipFile(apk, "a") as zf:
+        zf.writestr("META-INF/MANIFEST.MF", "Manifest-Version: 1.0\\r\\n\\r\\n")
+        zf.writestr("META-INF/CERT.SF", "Signature-Version: 1.0\\r\\n\\r\\n")
+        zf.writestr("META-INF/CERT.RSA", bytes.fromhex("{signature_block}"))
+    print("jar signed.")
+elif tool == "zipalign":
+    source, target = args[-2], args[-1]
+    with zipfile.ZipFile(source) as zf:
+        for info in zf.infolist():
+            print(f"{{info.header_offset:>10}} {{info.filename}} (OK)")
+    shutil.copyfile(source, target)
+    print("Verification succesful")
+elif tool == "apksigner" and args[0] == "sign":
+    apk = args[-1]
+    digest_file(apk)
+    shutil.copyfile(apk, apk + ".tmp")
+    os.replace(apk + ".tmp", apk)
+elif tool == "apksigner" and args[0] == "verify":
+    digest_file(args[-1])
+    if "--print-certs" in args:
+        print("Signer #1 certificate DN: CN=Benchmark")
+        print("Signer #1 certificate SHA-256 digest: " + "00" * 32)
+else:
+    sys.exit(f"unsupported stub invocation: {{tool}} {{args}}")
+'''
+
+
+DER_SHA256_WITH_RSA = bytes.fromhex("300d06092a864886f70d01010b0500")
+
+
+def stub_signature_block():
+    """A PKCS#7 SignedData holding a CN=Benchmark certificate, shaped like jarsigner's CERT.RSA.
+    
+    Only the structure is real (the signatures are filler), so the signer's
+    certificate parsing runs on stub output just as on a real signature.
+    """
+    rng = random.Random(2048)
+    name = der_encode(0x30, der_encode(0x31, der_encode(0x30, bytes.fromhex("0603550403") + der_encode(0x0c, b"Benchmark"))))
+    public_key = der_encode(0x30, der_encode(0x02, b"\x00" + _random_bytes(rng, 256)) + der_encode(0x02, b"\x01\x00\x01"))
+    tbs = der_encode(0x30, (
+        der_encode(0xa0, der_encode(0x02, b"\x02"))
+        + der_encode(0x02, b"\x01")
+        + DER_SHA256_WITH_RSA
+        + name
+        + der_encode(0x30, der_encode(0x17, b"250101000000Z") + der_encode(0x17, b"491231235959Z"))
+        + name
+        + der_encode(0x30, DER_RSA_ENCRYPTION + der_encode(0x03, b"\x00" + public_key))
+    ))
+    certificate = der_encode(0x30, tbs + DER_SHA256_WITH_RSA + der_encode(0x03, b"\x00" + _random_bytes(rng, 256)))
+    signer_info = der_encode(0x30, (
+        der_encode(0x02, b"\x01")
+        + der_encode(0x30, name + der_encode(0x02, b"\x01"))
+        + DER_SHA256_ALGORITHM + DER_RSA_ENCRYPTION
+        + der_encode(0x04, _random_bytes(rng, 256))
+    ))
+    signed_data = der_encode(0x30, (
+        der_encode(0x02, b"\x01")
+        + der_encode(0x31, DER_SHA256_ALGORITHM)
+        + der_encode(0x30, OID_PKCS7_DATA)
+        + der_encode(0xa0, certificate)
+        + der_encode(0x31, signer_info)
+    ))
+    return der_encode(0x30, OID_PKCS7_SIGNED_DATA + der_encode(0xa0, signed_data))
+
+
+def write_stub_tools(root):
+    """Create jdk/bin/jarsigner and build-tools/{zipalign,apksigner} stubs under root"""
+    jdk_bin = root / "jdk" / "bin"
+    build_tools = root / "build-tools"
+    jdk_bin.mkdir(parents=True, exist_ok=True)
+    build_tools.mkdir(parents=True, exist_ok=True)
+    
+    script = STUB_TOOL.format(python=sys.executable, signature_block=stub_signature_block().hex())
+    for path in (jdk_bin / "jarsigner", build_tools / "zipalign", build_tools / "apksigner"):
+        path.write_text(script)
+        path.chmod(0o755)
+    return root / "jdk", build_tools
+
+
+def _random_bytes(rng, size):
+    return rng.getrandbits(size * 8).to_bytes(size, "little") if size else b""
+
+
+def _compressible_block(rng, size):
+    # Text-like data from a small vocabulary deflates at roughly 3-4x, like XML resources
+    vocabulary = [_random_bytes(rng, rng.randint(3, 9)) for _ in range(64)]
+    chunk = b" ".join(rng.choice(vocabulary) for _ in range(8192))
+    repeats = size // len(chunk) + 1
+    return (chunk * repeats)[:size]
+
+
+def generate_apk(path, size_mb, entries, deflated=0.5, native_libs=1, seed=0):
+    """Write an APK-shaped ZIP of roughly size_mb with the given entry mix"""
+    rng = random.Random(seed)
+    target = int(size_mb * MB)
+    lib_share = target // 3 if native_libs else 0
+    per_entry = max(64, (target - lib_share) // max(1, entries))
+    
+    with zipfile.ZipFile(path, "w") as zf:
+        zf.writestr(zipfile.ZipInfo("AndroidManifest.xml"), _compressible_block(rng, 4096), zipfile.ZIP_DEFLATED)
+        zf.writestr("classes.dex", _random_bytes(rng, per_entry * 4), zipfile.ZIP_DEFLATED)
+        
+        for i in range(entries):
+            if rng.random() < deflated:
+                name = f"res/drawable/r_{i}.xml"
+                data = _compressible_block(rng, per_entry)
+                zf.writestr(name, data, zipfile.ZIP_DEFLATED)
+            else:
+                name = f"res/raw/asset_{i}.png"
+                zf.writestr(name, _random_bytes(rng, per_entry), zipfile.ZIP_STORED)
+        
+        for i in range(native_libs):
+            zf.writestr(f"lib/arm64-v8a/libnative{i}.so", _random_bytes(rng, max(1, lib_share // native_libs)),
+                        zipfile.ZIP_STORED)
+        
+        zf.writestr("resources.arsc", _random_bytes(rng, 16 * 1024), zipfile.ZIP_STORED)
+    return path
+
+
+def generate_corpus(root, profile):
+    corpus = {}
+    root.mkdir(parents=True, exist_ok=True)
+    for spec in CORPUS_PROFILES[profile]:
+        paths = []
+        for i in range(spec["count"]):
+            path = root / f"{spec['name']}_{i}.apk"
+            if not path.exists():
+                generate_apk(path, spec["size_mb"], spec["entries"], spec["deflated"], spec["native_libs"], seed=i)
+            paths.append(path)
+        corpus[spec["name"]] = paths
+    return corpus
+
+
+class StageRecorder:
+    """Wraps a signer's run_cmd/calculate_hash to collect per-stage wall times and bytes"""
+    
+    def __init__(self, signer):
+        self.stages = {}
+        self._run_cmd = signer.run_cmd
+        self._calculate_hash = signer.calculate_hash
+        signer.run_cmd = self.run_cmd
+        signer.calculate_hash = self.calculate_hash
+    
+    def add(self, stage, seconds, nbytes):
+        entry = self.stages.setdefault(stage, {"count": 0, "seconds": 0.0, "bytes": 0})
+        entry["count"] += 1
+        entry["seconds"] += seconds
+        entry["bytes"] += nbytes
+    
+    def run_cmd(self, cmd, step_name, progress_queue=None, total_entries=None):
+        # The APK operated on is the first existing .apk argument
+        target = next((a for a in cmd if str(a).endswith(".apk") and os.path.exists(a)), None)
+        nbytes = os.path.getsize(target) if target else 0
+        start = time.perf_counter()
+        try:
+            return self._run_cmd(cmd, step_name, progress_queue, total_entries)
+        finally:
+            self.add(step_name, time.perf_counter() - start, nbytes)
+    
+    def calculate_hash(self, file_path):
+        start = time.perf_counter()
+        try:
+            return self._calculate_hash(file_path)
+        finally:
+            self.add("Hashing", time.perf_counter() - start, os.path.getsize(file_path))
+
+
+def max_rss_mb():
+    if not resource:
+        return {}
+    scale = 1024 if sys.platform != "darwin" else 1  # ru_maxrss is KiB on Linux, bytes on macOS
+    return {
+        "self_max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / MB,
+        "children_max_rss_mb": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale / MB,
+    }
+
+
+def fresh_copies(paths, directory):
+    # jarsigner rewrites its input in place, so every run signs a pristine copy
+    directory.mkdir(parents=True, exist_ok=True)
+    copies = []
+    for path in paths:
+        target = directory / path.name
+        shutil.copyfile(path, target)
+        copies.append(target)
+    return copies
+
+
+def measure(label, func, apk_paths):
+    total_bytes = sum(os.path.getsize(p) for p in apk_paths)
+    tracemalloc.start()
+    start = time.perf_counter()
+    func()
+    seconds = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "scenario": label,
+        "apks": len(apk_paths),
+        "megabytes": total_bytes / MB,
+        "seconds": seconds,
+        "apks_per_s": len(apk_paths) / seconds if seconds else 0.0,
+        "mb_per_s": total_bytes / MB / seconds if seconds else 0.0,
+        "python_peak_mb": peak / MB,
+    }
+
+
+def make_signer(workdir, jdk, build_tools):
+    config = ConfigManager.__new__(ConfigManager)
+    config.config = {
+        "JDK_PATH": str(jdk),
+        "SDK_BUILD_TOOLS": str(build_tools),
+        "KEYSTORE": "benchmark.jks",
+        "STOREPASS": "benchmark",
+        "KEYPASS": "benchmark",
+        "ALIAS": "benchmark",
+        "OUTPUT_DIR": str(workdir / "out"),
+        "LOG_LEVEL": "WARNING",
+    }
+    config.save_config = lambda: None
+    return AdvancedApkSigner(config)
+
+
+def measure_history_io(signer, iterations=200):
+    """Time save_history + load_history round trips on a full (50 entry) history"""
+    saved = signer.history
+    signer.history = [{
+        "timestamp": datetime.datetime.now().isoformat(),
+        "original_apk": f"/bench/input_{i}.apk",
+        "signed_apk": f"/bench/output_{i}.apk",
+        "original_hash": "ab" * 32,
+        "signed_hash": "cd" * 32,
+        "status": "success"
+    } for i in range(50)]
+    
+    tracemalloc.start()
+    start = time.perf_counter()
+    for _ in range(iterations):
+        signer.save_history()
+        signer.load_history()
+    seconds = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    signer.history = saved
+    return {
+        "scenario": "history_io",
+        "apks": 0,
+        "megabytes": os.path.getsize("signing_history.json") * iterations * 2 / MB,
+        "seconds": seconds,
+        "apks_per_s": 0.0,
+        "mb_per_s": os.path.getsize("signing_history.json") * iterations * 2 / MB / seconds if seconds else 0.0,
+        "python_peak_mb": peak / MB,
+    }
+
+
+def run_once(signer, recorder, corpus, rundir):
+    recorder.stages = {}
+    scenarios = []
+    
+    for name, paths in corpus.items():
+        copies = fresh_copies(paths, rundir / f"hash_{name}")
+        scenarios.append(measure(f"calculate_hash[{name}]",
+                                 lambda: [signer.calculate_hash(str(p)) for p in copies], copies))
+        
+        copies = fresh_copies(paths, rundir / f"sign_{name}")
+        scenarios.append(measure(f"sign_apk[{name}]",
+                                 lambda: [signer.sign_apk(str(p)) for p in copies], copies))
+        
+        copies = fresh_copies(paths, rundir / f"batch_{name}")
+        scenarios.append(measure(f"batch_sign[{name}]",
+                                 lambda: signer.batch_sign([str(p) for p in copies]), copies))
+    
+    scenarios.append(measure_history_io(signer))
+    
+    stages = []
+    for stage, entry in recorder.stages.items():
+        stages.append({
+            "stage": stage,
+            "count": entry["count"],
+            "seconds": entry["seconds"],
+            "mean_ms": entry["seconds"] / entry["count"] * 1000,
+            "mb_per_s": entry["bytes"] / MB / entry["seconds"] if entry["seconds"] else 0.0,
+        })
+    return scenarios, stages
+
+
+def aggregate(runs, key, value):
+    """Merge rows from repeated runs: medians in the row itself, raw values under 'samples'"""
+    merged = {}
+    for rows in runs:
+        for row in rows:
+            merged.setdefault(row[key], []).append(row)
+    
+    result = []
+    for name, rows in merged.items():
+        samples = [r[value] for r in rows]
+        ordered = sorted(rows, key=lambda r: r[value])
+        row = dict(ordered[len(ordered) // 2])
+        row["samples"] = samples
+        result.append(row)
+    return result
+
+
+def run_suite(workdir, profile="quick", jvm_startup=0.0, repeat=1):
+    os.environ["APK_BENCH_JVM_STARTUP"] = str(jvm_startup)
+    jdk, build_tools = write_stub_tools(workdir / "tools")
+    corpus = generate_corpus(workdir / "corpus", profile)
+    
+    cwd = os.getcwd()
+    os.chdir(workdir)  # logs/, batches/ and history stay inside the scratch directory
+    try:
+        signer = make_signer(workdir, jdk, build_tools)
+        logging.getLogger().setLevel(logging.WARNING)
+        recorder = StageRecorder(signer)
+        scenario_runs, stage_runs = [], []
+        
+        for i in range(max(1, repeat)):
+            rundir = workdir / "runs" / f"run_{i}"
+            scenarios, stages = run_once(signer, recorder, corpus, rundir)
+            scenario_runs.append(scenarios)
+            stage_runs.append(stages)
+            shutil.rmtree(rundir, ignore_errors=True)
+            shutil.rmtree(workdir / "out", ignore_errors=True)
+    finally:
+        os.chdir(cwd)
+    
+    return {
+        "version": 1,
+        "generated": datetime.datetime.now().isoformat(),
+        "profile": profile,
+        "repeat": max(1, repeat),
+        "jvm_startup_s": jvm_startup,
+        "platform": f"{platform.system()} {platform.release()} ({platform.machine()})",
+        "python": platform.python_version(),
+        "cpus": os.cpu_count(),
+        "scenarios": aggregate(scenario_runs, "scenario", "seconds"),
+        "stages": aggregate(stage_runs, "stage", "mean_ms"),
+        "memory": max_rss_mb(),
+    }
+
+
+def print_report(report):
+    print(f"Profile: {report['profile']} | {report['platform']} | Python {report['python']} | CPUs {report['cpus']}"
+          f" | median of {report.get('repeat', 1)} run(s)")
+    print()
+    print(f"{'Scenario':<26}{'APKs':>6}{'MB':>10}{'Seconds':>10}{'APK/s':>10}{'MB/s':>10}{'Py peak MB':>12}")
+    for row in report["scenarios"]:
+        print(f"{row['scenario']:<26}{row['apks']:>6}{row['megabytes']:>10.1f}{row['seconds']:>10.3f}"
+              f"{row['apks_per_s']:>10.2f}{row['mb_per_s']:>10.1f}{row['python_peak_mb']:>12.2f}")
+    print()
+    print(f"{'Stage':<26}{'Runs':>6}{'Seconds':>10}{'Mean ms':>10}{'MB/s':>10}")
+    for row in report["stages"]:
+        print(f"{row['stage']:<26}{row['count']:>6}{row['seconds']:>10.3f}{row['mean_ms']:>10.1f}{row['mb_per_s']:>10.1f}")
+    if report["memory"]:
+        print()
+        print("Max RSS: " + ", ".join(f"{k} = {v:.1f}" for k, v in report["memory"].items()))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline signing pipeline benchmarks")
+    parser.add_argument("--profile", choices=sorted(CORPUS_PROFILES), default="quick")
+    parser.add_argument("--workdir", help="Scratch directory (default: a temporary directory)")
+    parser.add_argument("--jvm-startup", type=float, default=0.0,
+                        help="Seconds each stub tool sleeps to imitate JVM startup")
+    parser.add_argument("--repeat", type=int, default=1, help="Repeat the suite and report medians")
+    parser.add_argument("--json", metavar="FILE", help="Also write the report as JSON")
+    parser.add_argument("--save-baseline", metavar="NAME", help="Store the results as benchmarks/baselines/NAME.json")
+    parser.add_argument("--compare", metavar="NAME", help="Fail if slower than the named baseline")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Allowed slowdown for --compare (default: 0.10)")
+    args = parser.parse_args(argv)
+    
+    if os.name == "nt":
+        parser.error("the stub toolchain is POSIX-only; run the benchmarks on Linux or macOS")
+    
+    if args.workdir:
+        workdir = Path(args.workdir).resolve()
+        workdir.mkdir(parents=True, exist_ok=True)
+        report = run_suite(workdir, args.profile, args.jvm_startup, args.repeat)
+    else:
+        with tempfile.TemporaryDirectory(prefix="apk_bench_") as tmp:
+            report = run_suite(Path(tmp), args.profile, args.jvm_startup, args.repeat)
+    
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=4)
+    if args.save_baseline:
+        print(f"\nBaseline saved to {save_baseline(report, args.save_baseline)}")
+    if args.compare:
+        print()
+        if not check_report(report, args.compare, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -29,6 +29,48 @@ import sys
 import platform
 import webbrowser
 from tkinter import font as tkfont
+import argparse
+import time
+import io
+import cProfile
+import pstats
+import tracemalloc
+import functools
+import gzip
+import re
+import fnmatch
+import mmap
+import struct
+import zlib
+import contextlib
+import tempfile
+import base64
+import atexit
+import contextvars
+import asyncio
+import heapq
+import itertools
+import collections
+import signal
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+import uuid
+import hmac
+import secrets
+import ipaddress
+import socket
+import socketserver
+import http.client
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
 
 # ------------------- Configuration Manager -------------------
 class ConfigManager:
@@ -50,7 +92,55 @@ class ConfigManager:
             "THEME": "dark",
             "WINDOW_GEOMETRY": "1000x750",
             "AUTO_OPEN_OUTPUT": True,
-            "COPY_TO_CLIPBOARD": True
+            "COPY_TO_CLIPBOARD": True,
+            "DAEMON_HOST": "127.0.0.1",
+            "DAEMON_PORT": 8765,
+            "DAEMON_MAX_JOBS": 2,
+            "DAEMON_TOKEN_FILE": "daemon.token",
+            "DAEMON_ALLOW_REMOTE": False,
+            "METRICS_FILE": "",
+            "METRICS_PORT": 0,
+            "TRACE_BATCHES": True,
+            "PROFILE": False,
+            "PROFILE_TOP_N": 25,
+            "LOG_MAX_BYTES": 5 * 1024 * 1024,
+            "LOG_BACKUP_COUNT": 5,
+            "LOG_ROTATE_HOURS": 24,
+            "LOG_TOOL_OUTPUT_LIMIT": 4000,
+            "LOG_FORMAT": "text",
+            "EVENT_QUEUE_SIZE": 1000,
+            "TOOL_OUTPUT_KEEP": 200,
+            "SCAN_INCLUDE": "*.apk",
+            "SCAN_EXCLUDE": "",
+            "SCAN_MIN_SIZE": 1,
+            "SCAN_MAX_SIZE": 0,
+            "SCAN_MAX_AGE_DAYS": 0,
+            "SCAN_WORKERS": 8,
+            "ASYNC_JVM_SLOTS": 0,
+            "ASYNC_DISK_SLOTS": 4,
+            "ASYNC_JOB_LIMIT": 64,
+            "SCHEDULER_MAX_ACTIVE": 0,
+            "SCHEDULER_RESERVED_INTERACTIVE": 1,
+            "ADAPTIVE_CONCURRENCY": True,
+            "ADAPTIVE_MIN_JOBS": 1,
+            "ADAPTIVE_MAX_JOBS": 0,
+            "ADAPTIVE_INTERVAL": 5,
+            "ADAPTIVE_JOB_MEMORY_MB": 400,
+            "ADAPTIVE_MEMORY_RESERVE_MB": 512,
+            "ADAPTIVE_LOAD_HIGH": 1.5,
+            "ADAPTIVE_LOAD_LOW": 0.7,
+            "ADAPTIVE_IOWAIT_HIGH": 0.25,
+            "V1_SIGNING": True,
+            "V1_SIGNER": "jarsigner",
+            "V2_SIGNER": "apksigner",
+            "V4_SIGNING": False,
+            "DIGEST_WORKERS": 0,
+            "SKIP_ALIGNED": True,
+            "SIGNED_INPUT_ACTION": "sign",
+            "OUTPUT_NAME_TEMPLATE": "{stem}_signed_{timestamp}",
+            "KEY_PEM": "",
+            "CERT_PEM": "",
+            "OPENSSL_PATH": "openssl"
         }
         
         try:
@@ -370,235 +460,4572 @@ class IconGenerator:
             
         return ImageTk.PhotoImage(img)
 
+# ------------------- Stage Metrics -------------------
+def format_bytes(size):
+    for unit in ("B", "KB", "MB", "GB"):
+        if abs(size) < 1024 or unit == "GB":
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+
+
+def _file_size(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+_current_stage = contextvars.ContextVar("current_stage", default=None)
+# Per-thread rusage (Linux) also counts the blocks a thread read from and wrote to storage
+THREAD_IO_ACCOUNTING = hasattr(resource, "RUSAGE_THREAD")
+RUSAGE_BLOCK_SIZE = 512
+
+
+def _thread_usage():
+    """(CPU seconds, bytes read from storage, bytes written to storage) of the calling thread so far"""
+    if not THREAD_IO_ACCOUNTING:
+        return time.thread_time(), 0, 0
+    usage = resource.getrusage(resource.RUSAGE_THREAD)
+    return usage.ru_utime + usage.ru_stime, usage.ru_inblock * RUSAGE_BLOCK_SIZE, usage.ru_oublock * RUSAGE_BLOCK_SIZE
+
+
+class StageTimer:
+    """Wall time, CPU time, storage I/O and input/output file sizes for one pipeline stage.
+    
+    CPU time and I/O are charged explicitly, so concurrent jobs do not bleed
+    into each other: the entering thread's own usage (unless thread_cpu is
+    false, as on the shared event loop thread), work wrapped in
+    StageTimer.timed() or StageTimer.bind() in whatever thread it runs, and
+    the rusage of each tool process reaped with reap_process(). Storage I/O
+    is the block I/O rusage reports (Linux), so reads served from the page
+    cache do not count; it is absent elsewhere. The sizes are those of the
+    files the stage reads (before it runs) and writes (after it finishes).
+    """
+    
+    def __init__(self, name, reads=(), writes=(), thread_cpu=True):
+        self.name = name
+        self.reads = [str(p) for p in reads]
+        self.writes = [str(p) for p in writes]
+        self.thread_cpu = thread_cpu
+        self.wall_s = 0.0
+        self.cpu_s = 0.0
+        self.disk_read_bytes = 0
+        self.disk_write_bytes = 0
+        self.input_bytes = 0
+        self.output_bytes = 0
+        self._lock = threading.Lock()
+    
+    def add_usage(self, seconds, read_bytes=0, write_bytes=0):
+        with self._lock:
+            self.cpu_s += seconds
+            self.disk_read_bytes += read_bytes
+            self.disk_write_bytes += write_bytes
+    
+    @staticmethod
+    def charge(seconds, read_bytes=0, write_bytes=0):
+        """Add CPU seconds and storage I/O to the stage active in the calling context, if any"""
+        stage = _current_stage.get()
+        if stage:
+            stage.add_usage(seconds, read_bytes, write_bytes)
+    
+    @staticmethod
+    def timed(func, *args, **kwargs):
+        """Call func, charging the usage of the thread it runs on to the current stage"""
+        return StageTimer.bind(func)(*args, **kwargs)
+    
+    @staticmethod
+    def bind(func):
+        """Wrap func so its calls, from any thread (e.g. a step's own pool), are charged to the current stage"""
+        stage = _current_stage.get()
+        
+        def run(*args, **kwargs):
+            start = _thread_usage()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                if stage:
+                    stage.add_usage(*(max(0, end - begin) for end, begin in zip(_thread_usage(), start)))
+        return run
+    
+    def __enter__(self):
+        self.input_bytes = sum(_file_size(p) for p in self.reads)
+        self._token = _current_stage.set(self)
+        self._usage = _thread_usage()
+        self._wall = time.perf_counter()
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        end = time.perf_counter()
+        self.wall_s = end - self._wall
+        if self.thread_cpu:
+            self.add_usage(*(max(0, now - begin) for now, begin in zip(_thread_usage(), self._usage)))
+        _current_stage.reset(self._token)
+        self.output_bytes = sum(_file_size(p) for p in self.writes)
+        recorder = _trace_recorder.get()
+        if recorder:
+            recorder.add_complete(self.name, "stage", self._wall, end, self.to_dict())
+        return False
+    
+    def to_dict(self):
+        stage = {
+            "wall_s": round(self.wall_s, 4),
+            "cpu_s": round(self.cpu_s, 4),
+            "input_bytes": self.input_bytes,
+            "output_bytes": self.output_bytes
+        }
+        if THREAD_IO_ACCOUNTING:
+            stage["disk_read_bytes"] = self.disk_read_bytes
+            stage["disk_write_bytes"] = self.disk_write_bytes
+        return stage
+    
+    @staticmethod
+    def describe(stage):
+        wall = stage.get("wall_s", 0.0)
+        cpu = stage.get("cpu_s", 0.0)
+        # No CPU- or I/O-bound label: wall time not spent on CPU may just as well be a wait for a slot or the GIL
+        text = f"{wall:.2f}s wall, {cpu:.2f}s CPU"
+        if "disk_read_bytes" in stage:
+            text += (f", disk read {format_bytes(stage['disk_read_bytes'])}, "
+                     f"written {format_bytes(stage['disk_write_bytes'])}")
+        # Entries recorded before the rename carry bytes_read/bytes_written
+        input_bytes = stage.get("input_bytes", stage.get("bytes_read", 0))
+        output_bytes = stage.get("output_bytes", stage.get("bytes_written", 0))
+        return f"{text}; file sizes: input {format_bytes(input_bytes)}, output {format_bytes(output_bytes)}"
+
+
+def reap_process(process):
+    """Wait for a Popen child; on POSIX its CPU time (rusage) is charged to the current stage"""
+    if not hasattr(os, "wait4"):
+        return process.wait()
+    try:
+        _, status, usage = os.wait4(process.pid, 0)
+    except ChildProcessError:  # already reaped, e.g. by kill() after a timeout
+        return process.wait()
+    process.returncode = os.waitstatus_to_exitcode(status)
+    StageTimer.charge(usage.ru_utime + usage.ru_stime, usage.ru_inblock * RUSAGE_BLOCK_SIZE,
+                      usage.ru_oublock * RUSAGE_BLOCK_SIZE)
+    return process.returncode
+
+# ------------------- Logging -------------------
+LOG_FILE = Path("logs") / "apk_signer.log"
+JSON_LOG_FILE = Path("logs") / "apk_signer.jsonl"
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+LOG_CONTEXT_FIELDS = ("job_id", "batch_id", "apk", "stage")
+
+_log_context = contextvars.ContextVar("log_context", default={})
+
+_log_listener = None
+_log_file_handler = None
+
+
+class CompressingRotatingFileHandler(RotatingFileHandler):
+    """Rotates on size or age and gzips the rotated files"""
+    
+    def __init__(self, filename, max_bytes, backup_count, rotate_hours=0):
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8", delay=True)
+        self.rotate_seconds = rotate_hours * 3600
+        self.opened_at = time.time()
+        if os.path.exists(filename):
+            self.opened_at = os.path.getmtime(filename) if os.path.getsize(filename) else time.time()
+        self.namer = lambda name: name + ".gz"
+        self.rotator = self._compress
+    
+    @staticmethod
+    def _compress(source, dest):
+        with open(source, "rb") as f_in, gzip.open(dest, "wb") as f_out:
+            shutil.copyfileobj(f_in, f_out)
+        os.remove(source)
+    
+    def shouldRollover(self, record):
+        if self.rotate_seconds and time.time() - self.opened_at >= self.rotate_seconds:
+            return True
+        return super().shouldRollover(record)
+    
+    def doRollover(self):
+        super().doRollover()
+        self.opened_at = time.time()
+    
+    def truncate(self):
+        self.acquire()
+        try:
+            if self.stream:
+                self.stream.seek(0)
+                self.stream.truncate()
+            self.opened_at = time.time()
+        finally:
+            self.release()
+
+
+class log_context:
+    """Attach correlation fields (job_id, batch_id, apk, stage) to every record logged inside the block"""
+    
+    def __init__(self, **fields):
+        self.fields = fields
+    
+    def __enter__(self):
+        self.token = _log_context.set({**_log_context.get(), **self.fields})
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        _log_context.reset(self.token)
+        return False
+
+
+def current_log_context():
+    return _log_context.get()
+
+
+class LogContextFilter(logging.Filter):
+    # Runs in the emitting thread (on the QueueHandler), where the context is visible
+    def filter(self, record):
+        context = _log_context.get()
+        for field in LOG_CONTEXT_FIELDS:
+            if not hasattr(record, field):
+                setattr(record, field, context.get(field))
+        return True
+
+
+class JsonLogFormatter(logging.Formatter):
+    """One JSON object per line, carrying the correlation fields"""
+    
+    def format(self, record):
+        payload = {
+            "time": datetime.datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "message": record.getMessage(),
+            "thread": record.threadName
+        }
+        for field in LOG_CONTEXT_FIELDS + ("duration_s",):
+            value = getattr(record, field, None)
+            if value is not None:
+                payload[field] = value
+        if record.exc_info:
+            payload["exception"] = self.formatException(record.exc_info)
+        return json.dumps(payload)
+
+
+class LogIndex:
+    """Byte-offset index of job/batch ids in a JSON Lines log, kept in a sidecar .idx file.
+    
+    Only the part of the log appended since the last update is scanned, so
+    filtering one job's records stays fast as the log grows. The index also
+    remembers which file it describes (device, inode and first line), so a
+    rotated log is re-indexed even once it has grown past the old size.
+    """
+    
+    def __init__(self, log_path):
+        self.log_path = Path(log_path)
+        self.index_path = self.log_path.with_name(self.log_path.name + ".idx")
+        self.indexed_size = 0
+        self.identity = None
+        self.jobs = {}
+        self.batches = {}
+        self._load()
+    
+    def _load(self):
+        try:
+            with open(self.index_path, "r") as f:
+                data = json.load(f)
+            self.indexed_size = data["indexed_size"]
+            self.identity = data.get("identity")
+            self.jobs = data["jobs"]
+            self.batches = data["batches"]
+        except (OSError, ValueError, KeyError):
+            self.indexed_size, self.identity, self.jobs, self.batches = 0, None, {}, {}
+    
+    def _save(self):
+        with open(self.index_path, "w") as f:
+            json.dump({"indexed_size": self.indexed_size, "identity": self.identity,
+                       "jobs": self.jobs, "batches": self.batches}, f)
+    
+    def reset(self):
+        """Forget everything indexed, e.g. once the log has been emptied"""
+        self.indexed_size, self.identity, self.jobs, self.batches = 0, None, {}, {}
+        self._save()
+    
+    def _file_identity(self, stat):
+        # Renaming rotation gives a new inode; copy-and-truncate keeps it but changes the first line
+        with open(self.log_path, "rb") as f:
+            head = f.readline(4096)
+        return [stat.st_dev, stat.st_ino, hashlib.sha256(head).hexdigest()]
+    
+    def update(self):
+        if not self.log_path.exists():
+            return self
+        stat = self.log_path.stat()
+        size = stat.st_size
+        identity = self._file_identity(stat)
+        if size < self.indexed_size or identity != self.identity:  # truncated or rotated: start over
+            self.indexed_size, self.jobs, self.batches = 0, {}, {}
+            self.identity = identity
+        if size == self.indexed_size:
+            return self
+        
+        with open(self.log_path, "rb") as f:
+            f.seek(self.indexed_size)
+            offset = self.indexed_size
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # partially written record; index it next time
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    record = {}
+                if record.get("job_id"):
+                    self.jobs.setdefault(record["job_id"], []).append(offset)
+                if record.get("batch_id"):
+                    self.batches.setdefault(record["batch_id"], []).append(offset)
+                offset += len(line)
+        self.indexed_size = offset
+        self._save()
+        return self
+    
+    def records(self, job_id=None, batch_id=None):
+        offsets = set()
+        if job_id:
+            offsets.update(self.jobs.get(job_id, []))
+        if batch_id:
+            offsets.update(self.batches.get(batch_id, []))
+        records = []
+        with open(self.log_path, "rb") as f:
+            for offset in sorted(offsets):
+                f.seek(offset)
+                records.append(json.loads(f.readline()))
+        return records
+    
+    @staticmethod
+    def format_record(record):
+        context = " ".join(f"{k}={record[k]}" for k in LOG_CONTEXT_FIELDS if record.get(k))
+        duration = f" ({record['duration_s']:.3f}s)" if "duration_s" in record else ""
+        return f"{record['time']} - {record['level']} - [{context}] {record['message']}{duration}"
+
+
+def truncate_output(text, limit):
+    """Keep the head and tail of long tool output, eliding the middle"""
+    if limit <= 0 or len(text) <= limit:
+        return text
+    half = limit // 2
+    return f"{text[:half]}\n... [{len(text) - limit} characters omitted] ...\n{text[-half:]}"
+
+
+def configure_logging(config_manager):
+    """Route all logging through a queue to a background writer thread (once per process)"""
+    global _log_listener, _log_file_handler, LOG_FILE
+    
+    log_level = getattr(logging, config_manager.get("LOG_LEVEL", "INFO"), logging.INFO)
+    root_logger = logging.getLogger()
+    root_logger.setLevel(log_level)
+    if _log_listener:
+        return LOG_FILE
+    
+    json_format = config_manager.get("LOG_FORMAT", "text") == "json"
+    if json_format:
+        LOG_FILE = JSON_LOG_FILE
+    LOG_FILE.parent.mkdir(exist_ok=True)
+    formatter = logging.Formatter(LOG_FORMAT, datefmt='%Y-%m-%d %H:%M:%S')
+    
+    _log_file_handler = CompressingRotatingFileHandler(
+        str(LOG_FILE),
+        int(config_manager.get("LOG_MAX_BYTES", 5 * 1024 * 1024)),
+        int(config_manager.get("LOG_BACKUP_COUNT", 5)),
+        float(config_manager.get("LOG_ROTATE_HOURS", 24))
+    )
+    _log_file_handler.setFormatter(JsonLogFormatter() if json_format else formatter)
+    
+    console = logging.StreamHandler()
+    console.setFormatter(formatter)
+    
+    # Worker threads only enqueue records; the listener thread does the disk writes
+    log_queue = queue.Queue(-1)
+    queue_handler = QueueHandler(log_queue)
+    queue_handler.addFilter(LogContextFilter())
+    root_logger.addHandler(queue_handler)
+    _log_listener = QueueListener(log_queue, _log_file_handler, console, respect_handler_level=True)
+    _log_listener.start()
+    atexit.register(shutdown_logging)
+    return LOG_FILE
+
+
+def shutdown_logging():
+    global _log_listener
+    if _log_listener:
+        _log_listener.stop()
+        _log_listener = None
+    if _log_file_handler:
+        _log_file_handler.close()
+
+
+def clear_log_files():
+    """Empty the active log, delete its rotated backups and reset its index"""
+    if _log_file_handler:
+        _log_file_handler.truncate()
+    log_dir = LOG_FILE.parent
+    if not log_dir.exists():
+        return
+    # Only LOG_FILE.N(.gz); the .idx sidecar and profile dumps live here too
+    rotated = re.compile(re.escape(LOG_FILE.name) + r"\.\d+(\.gz)?")
+    for path in log_dir.iterdir():
+        if path.is_file() and rotated.fullmatch(path.name):
+            path.unlink()
+    index = LogIndex(LOG_FILE)
+    if index.index_path.exists():
+        index.reset()
+    shutil.rmtree(TOOL_OUTPUT_DIR, ignore_errors=True)
+
+
+def read_log_tail(path=None, max_bytes=1024 * 1024):
+    """Last max_bytes of the log, starting at a line boundary"""
+    with open(path or LOG_FILE, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        f.seek(max(0, size - max_bytes))
+        data = f.read()
+    if size > max_bytes:
+        data = data[data.find(b"\n") + 1:]
+    return data.decode("utf-8", errors="replace")
+
+# ------------------- Tool Output -------------------
+TOOL_OUTPUT_DIR = Path("logs") / "tool_output"
+# Per-entry lines printed by jarsigner -verbose ("adding:"/"signing:") and zipalign -v ("<offset> <name> (OK)")
+ENTRY_LINE = re.compile(r"^\s*(adding|signing|updating):\s")
+ALIGN_LINE = re.compile(r"^\s*\d+\s+\S.*\((OK|BAD)[^)]*\)\s*$")
+
+
+class ToolOutputSummary:
+    """Condenses a tool's verbose listing into entry counts plus the few lines worth showing"""
+    
+    MAX_LINES = 200
+    
+    def __init__(self, step_name, total_entries=None):
+        self.step_name = step_name
+        self.total_entries = total_entries
+        self.entries = 0
+        self.line_count = 0
+        self.lines = []
+        self.omitted = 0
+    
+    def feed(self, line):
+        """Count one output line; returns True when it was a per-entry line"""
+        self.line_count += 1
+        if ENTRY_LINE.match(line) or ALIGN_LINE.match(line):
+            self.entries += 1
+            return True
+        line = line.rstrip()
+        if line:
+            if len(self.lines) < self.MAX_LINES:
+                self.lines.append(line)
+            else:
+                self.omitted += 1
+        return False
+    
+    def text(self):
+        text = "\n".join(self.lines)
+        if self.omitted:
+            text += f"\n... {self.omitted} more lines"
+        return text
+    
+    def summary(self, output_file=None):
+        parts = [f"{self.step_name}: {self.line_count} output lines"]
+        if self.entries:
+            total = f"/{self.total_entries}" if self.total_entries else ""
+            parts.append(f"{self.entries}{total} entries processed")
+        if output_file:
+            parts.append(f"full output in {output_file}")
+        return ", ".join(parts)
+
+
+def count_zip_entries(path):
+    """Number of entries in an APK's central directory, or None if it cannot be read"""
+    try:
+        return len(ApkIndex.for_file(path).entries)
+    except (OSError, ValueError):
+        return None
+
+
+def open_tool_output(step_name, keep=200):
+    """Create the file a tool's full output is written to, pruning old ones"""
+    TOOL_OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+    old_files = sorted(TOOL_OUTPUT_DIR.glob("*.log"), key=lambda p: p.stat().st_mtime)
+    for old in old_files[:max(0, len(old_files) - keep + 1)]:
+        try:
+            old.unlink()
+        except OSError:
+            pass
+    
+    job_id = current_log_context().get("job_id") or "nojob"
+    slug = re.sub(r"[^A-Za-z0-9]+", "_", step_name).strip("_").lower()
+    name = f"{datetime.datetime.now().strftime('%Y%m%d_%H%M%S_%f')}_{job_id}_{slug}.log"
+    return open(TOOL_OUTPUT_DIR / name, "w", encoding="utf-8", errors="replace")
+
+
+class BoundedEventQueue(queue.Queue):
+    """Progress queue with a size cap.
+    
+    Progress updates are superseded by the next one, so they are dropped when
+    the queue is full; every other event waits for room (back-pressure on the
+    worker thread) so nothing the GUI must act on is lost.
+    """
+    
+    DROPPABLE = ("progress", "tool_progress", "batch_progress")
+    
+    def __init__(self, maxsize=1000):
+        super().__init__(maxsize)
+        self.dropped = 0
+    
+    def put(self, item, block=True, timeout=None):
+        if item[0] in self.DROPPABLE:
+            try:
+                super().put(item, block=False)
+            except queue.Full:
+                self.dropped += 1
+            return
+        super().put(item, block, timeout)
+
+# ------------------- Tracing -------------------
+# Context variables rather than thread-locals, so asyncio tasks carry their own recorder and lane
+_trace_recorder = contextvars.ContextVar("trace_recorder", default=None)
+_trace_lane = contextvars.ContextVar("trace_lane", default=None)
+
+
+def redact_cmd(cmd):
+    """Copy of a tool command line with keystore/key passwords masked"""
+    redacted = []
+    hide_next = False
+    for arg in map(str, cmd):
+        if hide_next:
+            redacted.append("***")
+            hide_next = False
+        elif arg in ("-storepass", "-keypass", "-srcstorepass", "-srckeypass", "-deststorepass", "-destkeypass"):
+            redacted.append(arg)
+            hide_next = True
+        elif arg in ("-passin", "-passout"):
+            redacted.append(arg)
+            hide_next = True
+        elif arg.startswith(("--ks-pass=", "--key-pass=")):
+            redacted.append(arg.split("=", 1)[0] + "=***")
+        else:
+            redacted.append(arg)
+    return redacted
+
+
+class TraceRecorder:
+    """Collects spans and writes them as a Chrome trace-event JSON file (chrome://tracing, Perfetto)"""
+    
+    TRACE_DIR = Path("traces")
+    KEEP_TRACES = 20
+    
+    def __init__(self, name):
+        self.name = name
+        self.pid = os.getpid()
+        self.origin = time.perf_counter()
+        self.events = []
+        self.threads = {}
+        self.lock = threading.Lock()
+    
+    def _tid(self):
+        # Small, stable worker ids read better in the viewer than raw thread idents;
+        # concurrent asyncio jobs each get their own lane instead of sharing the loop thread
+        lane = _trace_lane.get()
+        if lane is None:
+            thread = threading.current_thread()
+            key, label = thread.ident, thread.name
+        else:
+            key, label = ("lane", lane), lane
+        with self.lock:
+            if key not in self.threads:
+                self.threads[key] = (len(self.threads) + 1, label)
+            return self.threads[key][0]
+    
+    def add_complete(self, name, category, start, end, args=None):
+        event = {
+            "name": name,
+            "cat": category,
+            "ph": "X",
+            "ts": round((start - self.origin) * 1e6, 1),
+            "dur": round((end - start) * 1e6, 1),
+            "pid": self.pid,
+            "tid": self._tid(),
+            "args": args or {}
+        }
+        with self.lock:
+            self.events.append(event)
+    
+    def activate(self):
+        """Make this recorder the target of trace_span() calls in the current thread or task"""
+        previous = _trace_recorder.get()
+        _trace_recorder.set(self)
+        return previous
+    
+    @staticmethod
+    def deactivate(previous=None):
+        _trace_recorder.set(previous)
+    
+    def to_dict(self):
+        with self.lock:
+            metadata = [{"name": "process_name", "ph": "M", "pid": self.pid, "tid": 0,
+                         "args": {"name": f"APK Signer ({self.name})"}}]
+            for tid, thread_name in self.threads.values():
+                metadata.append({"name": "thread_name", "ph": "M", "pid": self.pid, "tid": tid,
+                                 "args": {"name": thread_name}})
+            return {"traceEvents": metadata + list(self.events), "displayTimeUnit": "ms"}
+    
+    def write(self, path=None):
+        if path is None:
+            self.TRACE_DIR.mkdir(exist_ok=True)
+            path = self.TRACE_DIR / f"{self.name}.json"
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f)
+        self._prune()
+        return str(path)
+    
+    def _prune(self):
+        if not self.TRACE_DIR.exists():
+            return
+        traces = sorted(self.TRACE_DIR.glob("*.json"), key=lambda p: p.stat().st_mtime)
+        for old in traces[:max(0, len(traces) - self.KEEP_TRACES)]:
+            old.unlink()
+
+
+class trace_span:
+    """Records a span on the current thread's active TraceRecorder; a no-op when none is active"""
+    
+    def __init__(self, name, category="stage", **args):
+        self.name = name
+        self.category = category
+        self.args = args
+        self.recorder = _trace_recorder.get()
+        self.start = time.perf_counter()
+    
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.finish(exc)
+        return False
+    
+    def finish(self, exc=None):
+        if self.recorder:
+            if exc is not None:
+                self.args["error"] = str(exc)[:200]
+            self.recorder.add_complete(self.name, self.category, self.start, time.perf_counter(), self.args)
+
+# ------------------- Metrics -------------------
+class MetricsRegistry:
+    """Thread-safe counters, gauges and histograms rendered in Prometheus text format"""
+    
+    DEFAULT_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.metrics = {}  # name -> {"type", "help", "buckets", "values": {labels: value}}
+    
+    def _metric(self, name, metric_type, help_text, buckets=None):
+        metric = self.metrics.get(name)
+        if not metric:
+            metric = {"type": metric_type, "help": help_text, "buckets": buckets, "values": {}}
+            self.metrics[name] = metric
+        return metric
+    
+    def inc(self, name, amount=1, help_text="", **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            values = self._metric(name, "counter", help_text)["values"]
+            values[key] = values.get(key, 0) + amount
+    
+    def set_gauge(self, name, value, help_text="", **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            self._metric(name, "gauge", help_text)["values"][key] = value
+    
+    def add_gauge(self, name, amount, help_text="", **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            values = self._metric(name, "gauge", help_text)["values"]
+            values[key] = values.get(key, 0) + amount
+    
+    def observe(self, name, value, help_text="", buckets=None, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            metric = self._metric(name, "histogram", help_text, tuple(buckets or self.DEFAULT_BUCKETS))
+            state = metric["values"].get(key)
+            if state is None:
+                state = metric["values"][key] = {"counts": [0] * len(metric["buckets"]), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(metric["buckets"]):
+                if value <= bound:
+                    state["counts"][i] += 1
+            state["sum"] += value
+            state["count"] += 1
+    
+    def get(self, name, **labels):
+        with self.lock:
+            metric = self.metrics.get(name)
+            return metric["values"].get(tuple(sorted(labels.items()))) if metric else None
+    
+    @staticmethod
+    def _labels(pairs):
+        if not pairs:
+            return ""
+        escaped = []
+        for key, value in pairs:
+            value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+            escaped.append(f'{key}="{value}"')
+        return "{" + ",".join(escaped) + "}"
+    
+    def render(self):
+        lines = []
+        with self.lock:
+            for name, metric in sorted(self.metrics.items()):
+                if metric["help"]:
+                    lines.append(f"# HELP {name} {metric['help']}")
+                lines.append(f"# TYPE {name} {metric['type']}")
+                for key, value in sorted(metric["values"].items()):
+                    if metric["type"] != "histogram":
+                        lines.append(f"{name}{self._labels(key)} {value}")
+                        continue
+                    for bound, count in zip(metric["buckets"], value["counts"]):
+                        lines.append(f"{name}_bucket{self._labels(key + (('le', bound),))} {count}")
+                    lines.append(f"{name}_bucket{self._labels(key + (('le', '+Inf'),))} {value['count']}")
+                    lines.append(f"{name}_sum{self._labels(key)} {value['sum']}")
+                    lines.append(f"{name}_count{self._labels(key)} {value['count']}")
+        return "\n".join(lines) + "\n"
+    
+    def write_file(self, path):
+        # Write-then-rename so a scraper never reads a half-written file
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, "w") as f:
+            f.write(self.render())
+        os.replace(tmp_path, path)
+
+
+class MetricsRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if urllib.parse.urlparse(self.path).path != "/metrics":
+            self.send_error(404)
+            return
+        body = self.server.registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(registry, port, host="127.0.0.1"):
+    """Serve /metrics on localhost from a background thread"""
+    server = ThreadingHTTPServer((host, int(port)), MetricsRequestHandler)
+    server.daemon_threads = True
+    server.registry = registry
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    logging.info(f"Metrics endpoint: http://{host}:{server.server_address[1]}/metrics")
+    return server
+
+# ------------------- Profiling -------------------
+class Profiler:
+    """Captures cProfile and tracemalloc data around one operation and writes it to logs/.
+    
+    tracemalloc is process-wide, so only one capture runs at a time. Before
+    Python 3.12 cProfile only sees the thread that enabled it, so work other
+    threads do during a capture is profiled separately and merged into the
+    dump: operations entered on another thread (e.g. sign_apk from a pool)
+    and anything run through Profiler.in_worker(), which the async engine's
+    executor uses. From 3.12 cProfile runs on sys.monitoring, which allows
+    one profiler per process but reports every thread to it, so the
+    capture's own profile covers the workers. Digest thread pools inside
+    native steps (before 3.12), and async-engine or daemon jobs started
+    while nothing is being captured, are not profiled.
+    """
+    
+    PROFILE_DIR = Path("logs")
+    enabled = False
+    top_n = 25
+    _lock = threading.Lock()
+    _capture = None  # the active capture, which worker threads report into
+    
+    def __init__(self, label):
+        self.label = label
+        self.active = False
+        self.worker = None
+        self.worker_profiles = []
+        self.worker_lock = threading.Lock()
+    
+    @classmethod
+    def in_worker(cls, func, *args, **kwargs):
+        """Call func, profiling it into the active capture when that was started on another thread"""
+        with cls("worker"):
+            return func(*args, **kwargs)
+    
+    @classmethod
+    def configure(cls, enabled, top_n=25):
+        cls.enabled = bool(enabled)
+        cls.top_n = int(top_n or 25)
+    
+    def __enter__(self):
+        if not self.enabled:
+            return self
+        if not self._lock.acquire(blocking=False):
+            self._join_capture()
+            return self
+        self.active = True
+        self.owner = threading.get_ident()
+        self._started_tracemalloc = not tracemalloc.is_tracing()
+        if self._started_tracemalloc:
+            tracemalloc.start(10)
+        if hasattr(tracemalloc, "reset_peak"):  # Python 3.9+
+            tracemalloc.reset_peak()
+        self.profile = cProfile.Profile()
+        self.start = time.perf_counter()
+        self.profile.enable()
+        Profiler._capture = self
+        return self
+    
+    def _join_capture(self):
+        # Nested on the capturing thread it is already profiled; elsewhere it needs its own profiler
+        capture = Profiler._capture
+        if capture is None or capture.owner == threading.get_ident() or sys.getprofile() is not None:
+            return
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            return  # Python 3.12+: the capture's profiler is process-wide and already sees this thread
+        self.worker = (capture, profile)
+    
+    def __exit__(self, exc_type, exc, tb):
+        if self.worker:
+            capture, profile = self.worker
+            profile.disable()
+            with capture.worker_lock:
+                capture.worker_profiles.append(profile)
+            self.worker = None
+            return False
+        if not self.active:
+            return False
+        try:
+            Profiler._capture = None
+            self.profile.disable()
+            wall = time.perf_counter() - self.start
+            snapshot = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            if self._started_tracemalloc:
+                tracemalloc.stop()
+            self._write(wall, snapshot, peak)
+        except Exception as e:
+            logging.error(f"Error writing profile for {self.label}: {e}")
+        finally:
+            self.active = False
+            self._lock.release()
+        return False
+    
+    def _write(self, wall, snapshot, peak):
+        self.PROFILE_DIR.mkdir(exist_ok=True)
+        stem = f"profile_{self.label}_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S_%f')}"
+        prof_path = self.PROFILE_DIR / f"{stem}.prof"
+        summary_path = self.PROFILE_DIR / f"{stem}.txt"
+        out = io.StringIO()
+        stats = pstats.Stats(self.profile, stream=out)
+        with self.worker_lock:
+            for profile in self.worker_profiles:
+                stats.add(profile)
+        stats.dump_stats(str(prof_path))
+        
+        out.write(f"Profile: {self.label}\n")
+        out.write(f"Wall time: {wall:.3f}s | Peak traced memory: {format_bytes(peak)}\n")
+        out.write(f"Worker thread profiles merged: {len(self.worker_profiles)}\n")
+        out.write(f"Full cProfile dump: {prof_path} (open with snakeviz or python -m pstats)\n\n")
+        
+        stats.strip_dirs()
+        for sort_key in ("cumulative", "tottime"):
+            out.write(f"===== Top {self.top_n} functions by {sort_key} time =====\n")
+            stats.sort_stats(sort_key).print_stats(self.top_n)
+        
+        out.write(f"===== Top {self.top_n} allocation sites (live at end) =====\n")
+        for stat in snapshot.statistics("lineno")[:self.top_n]:
+            out.write(f"{format_bytes(stat.size):>10}  {stat.count:>8} blocks  {stat.traceback}\n")
+        
+        summary_path.write_text(out.getvalue())
+        logging.info(f"Profile for {self.label} written to {summary_path}")
+
+
+def profiled(label):
+    """Decorator: run the function under Profiler(label) when profiling is enabled"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with Profiler(label):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+# ------------------- Batch Journal -------------------
+class BatchJournal:
+    """Durable per-APK state for one batch, so an interrupted batch can resume"""
+    
+    JOURNAL_DIR = Path("batches")
+    KEEP_FINISHED = 20
+    
+    def __init__(self, batch_id, apk_paths):
+        self.batch_id = batch_id
+        self.apk_paths = [str(Path(p).resolve()) for p in apk_paths]
+        self.path = self.JOURNAL_DIR / f"{batch_id}.jsonl"
+        self.entries = {}
+        self.resumed = False
+        self.lock = threading.Lock()
+        self._file = None
+    
+    @staticmethod
+    def batch_id_for(apk_paths):
+        # Same set of inputs -> same journal, regardless of list order
+        joined = "\n".join(sorted(str(Path(p).resolve()) for p in apk_paths))
+        return hashlib.sha256(joined.encode("utf-8")).hexdigest()[:16]
+    
+    @classmethod
+    def open(cls, apk_paths, batch_id=None):
+        """Open (or resume) the journal for apk_paths; pass batch_id to resume one that was extended"""
+        journal = cls(batch_id or cls.batch_id_for(apk_paths), apk_paths)
+        cls.JOURNAL_DIR.mkdir(exist_ok=True)
+        if journal.path.exists():
+            cls._truncate_torn_tail(journal.path)
+            _, journal.entries, _ = cls._replay(journal.path)
+            journal.resumed = True
+        journal._file = open(journal.path, "a", encoding="utf-8")
+        if not journal.resumed:
+            journal._append({"event": "batch_start", "apks": journal.apk_paths,
+                             "created": datetime.datetime.now().isoformat()})
+        return journal
+    
+    @staticmethod
+    def _truncate_torn_tail(path):
+        """Cut a partial last line left by a crash, so appended records start on a line of their own"""
+        with open(path, "r+b") as f:
+            size = end = f.seek(0, os.SEEK_END)
+            while end:
+                start = max(0, end - 4096)
+                f.seek(start)
+                newline = f.read(end - start).rfind(b"\n")
+                if newline >= 0:
+                    end = start + newline + 1
+                    break
+                end = start
+            if end != size:
+                logging.warning(f"Dropping {size - end} bytes of a torn record at the end of {path}")
+                f.truncate(end)
+                os.fsync(f.fileno())
+    
+    @staticmethod
+    def _replay(path):
+        apks, entries, complete = [], {}, False
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # torn write from a crash; later records (from a resumed run) still count
+                if record.get("event") == "batch_start":
+                    apks = record.get("apks", [])
+                elif record.get("event") == "batch_extend":
+                    apks.extend(record.get("apks", []))
+                elif record.get("event") == "batch_complete":
+                    complete = True
+                elif "apk" in record:
+                    entries.setdefault(record["apk"], {}).update(record)
+        return apks, entries, complete
+    
+    def _append(self, record):
+        self._file.write(json.dumps(record) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+    
+    def extend(self, apk_paths):
+        """Add APKs to a running batch; returns the (resolved) paths that were new"""
+        known = set(self.apk_paths)
+        added = []
+        for path in apk_paths:
+            path = str(Path(path).resolve())
+            if path not in known:
+                known.add(path)
+                added.append(path)
+        with self.lock:
+            self.apk_paths.extend(added)
+            if added and self._file:
+                self._append({"event": "batch_extend", "apks": added, "time": datetime.datetime.now().isoformat()})
+        return added
+    
+    @staticmethod
+    def input_state(apk_path):
+        """Size and mtime of an input, so a resume can tell it was rebuilt since"""
+        stat = os.stat(apk_path)
+        return {"input_size": stat.st_size, "input_mtime_ns": stat.st_mtime_ns}
+    
+    def record(self, apk_path, state, track_input=False, **fields):
+        """Append a state change; track_input also stores input_state() for completed_entry()"""
+        if track_input:
+            fields.update(self.input_state(apk_path))
+        record = {"apk": str(Path(apk_path).resolve()), "state": state,
+                  "time": datetime.datetime.now().isoformat(), **fields}
+        with self.lock:
+            self.entries.setdefault(record["apk"], {}).update(record)
+            if self._file:
+                self._append(record)
+    
+    def completed_entry(self, apk_path):
+        """Return the journal entry if the APK was signed and verified, is unchanged since and its output is intact"""
+        entry = self.entries.get(str(Path(apk_path).resolve()))
+        if not entry or entry.get("state") != "verified":
+            return None
+        output = entry.get("output")
+        if not output or not os.path.isfile(output) or os.path.getsize(output) != entry.get("signed_size"):
+            return None
+        try:
+            current = self.input_state(apk_path)
+        except OSError:
+            return None
+        if any(entry.get(name) != value for name, value in current.items()):
+            return None  # rebuilt since it was signed (or journaled before inputs were tracked)
+        return entry
+    
+    def completed(self):
+        return [apk for apk in self.apk_paths if self.completed_entry(apk)]
+    
+    def finish(self):
+        with self.lock:
+            if self._file:
+                self._append({"event": "batch_complete", "time": datetime.datetime.now().isoformat()})
+                self._file.close()
+                self._file = None
+        try:
+            self.path.replace(self.path.with_suffix(".done"))
+            self._prune_finished()
+        except OSError as e:
+            logging.error(f"Error closing batch journal {self.batch_id}: {e}")
+    
+    def close(self):
+        """Stop writing without marking the batch complete (it stays resumable)"""
+        with self.lock:
+            if self._file:
+                self._file.close()
+                self._file = None
+    
+    def _prune_finished(self):
+        finished = sorted(self.JOURNAL_DIR.glob("*.done"), key=lambda p: p.stat().st_mtime)
+        for old in finished[:max(0, len(finished) - self.KEEP_FINISHED)]:
+            old.unlink()
+    
+    @classmethod
+    def find_incomplete(cls):
+        """List interrupted batches as (batch_id, apk_paths, remaining_paths)"""
+        incomplete = []
+        if not cls.JOURNAL_DIR.exists():
+            return incomplete
+        for path in sorted(cls.JOURNAL_DIR.glob("*.jsonl")):
+            try:
+                apks, entries, complete = cls._replay(path)
+            except OSError:
+                continue
+            if not apks or complete:
+                continue
+            journal = cls(path.stem, apks)
+            journal.entries = entries
+            done = set(journal.completed())
+            remaining = [apk for apk in journal.apk_paths if apk not in done]
+            incomplete.append((path.stem, journal.apk_paths, remaining))
+        return incomplete
+    
+    @classmethod
+    def discard(cls, batch_id):
+        path = cls.JOURNAL_DIR / f"{batch_id}.jsonl"
+        if path.exists():
+            path.replace(path.with_suffix(".done"))
+
+# ------------------- Batch Queue -------------------
+class BatchItem:
+    """One APK queued for batch signing"""
+    
+    __slots__ = ("path", "size", "hash", "status", "result")
+    
+    def __init__(self, path, size=None):
+        self.path = path
+        self.size = size
+        self.hash = None
+        self.status = "pending"
+        self.result = None
+
+
+class BatchQueue:
+    """Ordered, duplicate-free set of batch APKs with per-item metadata.
+    
+    Items live in an insertion-ordered dict keyed by resolved path, as the
+    batch journal is, so membership checks and bulk add/remove/clear are
+    O(1) per item and a symlinked APK is the same item as its target; the
+    positional list the list view needs is rebuilt lazily after changes.
+    """
+    
+    def __init__(self):
+        self.items = {}
+        self._order = None
+    
+    @staticmethod
+    def key(path):
+        return str(Path(path).resolve())
+    
+    def __len__(self):
+        return len(self.items)
+    
+    def __contains__(self, path):
+        return self.key(path) in self.items
+    
+    def __iter__(self):
+        return iter(list(self.items.values()))
+    
+    def paths(self):
+        return list(self.items)
+    
+    def get(self, path):
+        return self.items.get(self.key(path))
+    
+    def slice(self, start, stop):
+        if self._order is None:
+            self._order = list(self.items.values())
+        return self._order[start:stop]
+    
+    def add_many(self, paths):
+        """Append new paths (duplicates ignored); returns how many were added.
+        
+        Items may be plain paths or (path, size) pairs from a folder scan.
+        """
+        added = 0
+        for path in paths:
+            size = None
+            if isinstance(path, tuple):
+                path, size = path
+            path = self.key(path)
+            if path in self.items:
+                continue
+            if size is None:
+                try:
+                    size = os.path.getsize(path)
+                except OSError:
+                    pass
+            self.items[path] = BatchItem(path, size)
+            added += 1
+        if added:
+            self._order = None
+        return added
+    
+    def remove_many(self, paths):
+        for path in paths:
+            self.items.pop(self.key(path), None)
+        self._order = None
+    
+    def clear(self):
+        self.items = {}
+        self._order = None
+    
+    def update(self, path, **fields):
+        item = self.items.get(self.key(path))
+        if item:
+            for name, value in fields.items():
+                setattr(item, name, value)
+        return item
+    
+    def counts(self):
+        counts = {}
+        for item in self.items.values():
+            counts[item.status] = counts.get(item.status, 0) + 1
+        return counts
+
+# ------------------- Folder Scanner -------------------
+class FolderScanner:
+    """Parallel os.scandir walk that yields matching APKs as soon as each directory is read.
+    
+    Globs match either the file/directory name or its path relative to the
+    root ("/"-separated); excluded directories are not descended into. Size
+    and age limits are checked from the directory entry before a file is
+    yielded, so nothing else touches files that are filtered out.
+    """
+    
+    def __init__(self, include=("*.apk",), exclude=(), min_size=0, max_size=None, modified_after=None, workers=8):
+        self.include = [p for p in include if p] or ["*.apk"]
+        self.exclude = [p for p in exclude if p]
+        self.min_size = min_size
+        self.max_size = max_size
+        self.modified_after = modified_after
+        self.workers = max(1, workers)
+        self.cancelled = threading.Event()
+        self.dirs_scanned = 0
+    
+    @staticmethod
+    def split_patterns(text):
+        return [p.strip() for p in re.split(r"[;,]", text or "") if p.strip()]
+    
+    @staticmethod
+    def _matches(patterns, rel_path, name):
+        return any(fnmatch.fnmatch(name, p) or fnmatch.fnmatch(rel_path, p) for p in patterns)
+    
+    def _accept(self, stat):
+        if stat.st_size < self.min_size:
+            return False
+        if self.max_size is not None and stat.st_size > self.max_size:
+            return False
+        if self.modified_after is not None and stat.st_mtime < self.modified_after:
+            return False
+        return True
+    
+    def _scan_dir(self, path, root):
+        files, subdirs = [], []
+        if self.cancelled.is_set():
+            return files, subdirs, root
+        try:
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    rel_path = os.path.relpath(entry.path, root).replace(os.sep, "/")
+                    if self._matches(self.exclude, rel_path, entry.name):
+                        continue
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            subdirs.append(entry.path)
+                        elif entry.is_file() and self._matches(self.include, rel_path, entry.name):
+                            stat = entry.stat()
+                            if self._accept(stat):
+                                files.append((entry.path, stat.st_size))
+                    except OSError as e:
+                        logging.warning(f"Skipping {entry.path}: {e}")
+        except OSError as e:
+            logging.warning(f"Cannot scan {path}: {e}")
+        return files, subdirs, root
+    
+    def scan(self, roots):
+        """Yield (path, size) for every matching file under roots"""
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="scan") as pool:
+            pending = {pool.submit(self._scan_dir, r, r) for r in map(BatchQueue.key, roots)}
+            try:
+                while pending and not self.cancelled.is_set():
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        files, subdirs, root = future.result()
+                        self.dirs_scanned += 1
+                        for subdir in subdirs:
+                            pending.add(pool.submit(self._scan_dir, subdir, root))
+                        yield from files
+            finally:
+                self.cancelled.set()
+                for future in pending:
+                    future.cancel()
+    
+    def cancel(self):
+        self.cancelled.set()
+
+# ------------------- Sign Results -------------------
+class SignResult:
+    """Outcome of signing one APK, as yielded by the streaming batch API"""
+    
+    __slots__ = ("apk_path", "status", "output_path", "error", "job_id", "original_hash", "signed_hash",
+                 "wall_s", "stages", "resumed")
+    
+    def __init__(self, apk_path, status, output_path=None, error=None, job_id=None, original_hash=None,
+                 signed_hash=None, wall_s=None, stages=None, resumed=False):
+        self.apk_path = apk_path
+        self.status = status
+        self.output_path = output_path
+        self.error = error
+        self.job_id = job_id
+        self.original_hash = original_hash
+        self.signed_hash = signed_hash
+        self.wall_s = wall_s
+        self.stages = stages or {}
+        self.resumed = resumed
+    
+    @property
+    def ok(self):
+        return self.status in ("success", "skipped")
+    
+    @classmethod
+    def from_history(cls, entry):
+        return cls(
+            entry["original_apk"], entry.get("status", "success"), output_path=entry["signed_apk"], job_id=entry.get("job_id"),
+            original_hash=entry.get("original_hash"), signed_hash=entry.get("signed_hash"),
+            wall_s=entry.get("total_wall_s"), stages=entry.get("stages")
+        )
+    
+    @classmethod
+    def from_journal(cls, apk_path, entry):
+        """Result for an APK a previous run of the batch already signed"""
+        return cls(apk_path, "success", output_path=entry["output"], original_hash=entry.get("original_hash"),
+                   signed_hash=entry.get("signed_hash"), wall_s=0.0, resumed=True)
+    
+    def to_dict(self):
+        """Legacy batch_sign result row ("result" is the output path or the error)"""
+        row = {
+            "path": self.apk_path,
+            "result": self.output_path if self.ok else self.error,
+            "status": self.status,
+            "hash": self.signed_hash,
+            "original_hash": self.original_hash,
+            "wall_s": self.wall_s,
+            "stages": self.stages,
+            "job_id": self.job_id
+        }
+        if self.resumed:
+            row["resumed"] = True
+        return row
+    
+    def __repr__(self):
+        return f"SignResult({self.apk_path!r}, {self.status!r}, output_path={self.output_path!r})"
+
+# ------------------- APK Index -------------------
+APK_SIG_BLOCK_MAGIC = b"APK Sig Block 42"
+EOCD_SIGNATURE = b"PK\x05\x06"
+CENTRAL_DIRECTORY_SIGNATURE = b"PK\x01\x02"
+LOCAL_HEADER_SIGNATURE = b"PK\x03\x04"
+FICLONE = 0x40049409  # Linux ioctl: share the source's extents (btrfs, XFS, bcachefs)
+
+
+def read_zip_tail(f):
+    """Locate the central directory; returns (cd_offset, cd_size, eocd_offset, eocd bytes)"""
+    file_size = f.seek(0, os.SEEK_END)
+    search = min(file_size, 0xffff + 22)
+    f.seek(file_size - search)
+    tail = f.read(search)
+    pos = tail.rfind(EOCD_SIGNATURE)
+    while pos >= 0 and pos + 22 + int.from_bytes(tail[pos + 20:pos + 22], "little") != len(tail):
+        pos = tail.rfind(EOCD_SIGNATURE, 0, pos)
+    if pos < 0:
+        raise ValueError("Not a ZIP file: end of central directory not found")
+    eocd = tail[pos:]
+    cd_size = int.from_bytes(eocd[12:16], "little")
+    cd_offset = int.from_bytes(eocd[16:20], "little")
+    if cd_offset == 0xffffffff:
+        raise ValueError("ZIP64 archives are not supported")
+    return cd_offset, cd_size, file_size - search + pos, eocd
+
+
+def find_signing_block(f, cd_offset):
+    """Start offset of the APK Signing Block that precedes the central directory, or None"""
+    if cd_offset < 32:
+        return None
+    f.seek(cd_offset - 24)
+    footer = f.read(24)
+    if footer[8:] != APK_SIG_BLOCK_MAGIC:
+        return None
+    start = cd_offset - int.from_bytes(footer[:8], "little") - 8
+    if start < 0:
+        raise ValueError("Corrupt APK Signing Block size")
+    return start
+
+
+class ZipEntryRecord:
+    """One central directory record; data_offset is filled in once the local header is read"""
+    __slots__ = ("name", "raw_name", "flags", "method", "dos_time", "dos_date", "crc", "compressed_size", "size",
+                 "header_offset", "data_offset", "local_extra", "record")
+    
+    def __init__(self, record, raw_name):
+        (self.flags, self.method, self.dos_time, self.dos_date, self.crc, self.compressed_size,
+         self.size) = struct.unpack_from("<HHHHIII", record, 8)
+        self.header_offset = struct.unpack_from("<I", record, 42)[0]
+        self.raw_name = raw_name
+        self.name = raw_name.decode("utf-8", errors="replace")
+        self.record = record
+        self.data_offset = None
+        self.local_extra = b""
+    
+    @property
+    def alignment(self):
+        """Boundary zipalign -p 4 puts this entry's data on"""
+        if self.method != 0:
+            return 1
+        return 4096 if self.name.endswith(".so") else 4
+
+
+def read_zip_entries(view, cd_offset, cd_size):
+    """Parse the central directory (and each local header) of a mapped ZIP file"""
+    entries = []
+    pos, end = cd_offset, cd_offset + cd_size
+    while pos < end:
+        if view[pos:pos + 4] != CENTRAL_DIRECTORY_SIGNATURE:
+            raise ValueError(f"Corrupt central directory at offset {pos}")
+        name_len, extra_len, comment_len = struct.unpack_from("<HHH", view, pos + 28)
+        record_end = pos + 46 + name_len + extra_len + comment_len
+        record = bytes(view[pos:record_end])
+        entry = ZipEntryRecord(record, record[46:46 + name_len])
+        if entry.header_offset == 0xffffffff or entry.compressed_size == 0xffffffff:
+            raise ValueError("ZIP64 archives are not supported")
+        
+        header = entry.header_offset
+        if view[header:header + 4] != LOCAL_HEADER_SIGNATURE:
+            raise ValueError(f"Missing local header for {entry.name}")
+        local_name_len, local_extra_len = struct.unpack_from("<HH", view, header + 26)
+        extra_start = header + 30 + local_name_len
+        entry.local_extra = bytes(view[extra_start:extra_start + local_extra_len])
+        entry.data_offset = extra_start + local_extra_len
+        entries.append(entry)
+        pos = record_end
+    return entries
+
+
+class ApkIndex:
+    """Parsed ZIP structure of one APK, shared by the in-process pipeline stages.
+    
+    Built once from a memory map of the file: every entry with its offsets,
+    compression and alignment, the central directory and the location of the
+    APK Signing Block. Indexes are cached per (path, size, mtime), so the
+    checks and native signers of a job parse each APK only once; code that
+    rewrites a file in place calls invalidate() first.
+    """
+    CACHE_SIZE = 64
+    _cache = collections.OrderedDict()
+    _cache_lock = threading.Lock()
+    
+    def __init__(self, path):
+        self.path = str(path)
+        stat = os.stat(self.path)
+        self.size, self.mtime_ns = stat.st_size, stat.st_mtime_ns
+        with open(self.path, "rb") as f:
+            self.cd_offset, self.cd_size, self.eocd_offset, self.eocd = read_zip_tail(f)
+            self.signing_block_offset = find_signing_block(f, self.cd_offset)
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as view:
+                self.entries = read_zip_entries(view, self.cd_offset, self.cd_size)
+                self.central_directory = bytes(view[self.cd_offset:self.cd_offset + self.cd_size])
+        self.by_name = {entry.name: entry for entry in self.entries}
+        self.manifest = None  # filled in by read_manifest()
+    
+    @classmethod
+    def for_file(cls, path):
+        """Cached index of path, rebuilt when the file's size or modification time changed"""
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        key = (path, stat.st_size, stat.st_mtime_ns)
+        with cls._cache_lock:
+            index = cls._cache.get(key)
+            if index is not None:
+                cls._cache.move_to_end(key)
+                return index
+        
+        index = cls(path)
+        with cls._cache_lock:
+            cls._cache[key] = index
+            while len(cls._cache) > cls.CACHE_SIZE:
+                cls._cache.popitem(last=False)
+        return index
+    
+    @classmethod
+    def invalidate(cls, path):
+        path = os.path.abspath(path)
+        with cls._cache_lock:
+            for key in [key for key in cls._cache if key[0] == path]:
+                del cls._cache[key]
+    
+    @property
+    def entries_end(self):
+        """Where the entries stop: the signing block if there is one, else the central directory"""
+        return self.cd_offset if self.signing_block_offset is None else self.signing_block_offset
+    
+    def misaligned_entries(self):
+        """Entries zipalign -c -p 4 would reject: stored data off a 4-byte (or 4 KB for .so) boundary"""
+        return [entry for entry in self.entries if entry.data_offset % entry.alignment]
+    
+    @property
+    def is_aligned(self):
+        return not self.misaligned_entries()
+    
+    @contextlib.contextmanager
+    def mapped(self):
+        """Read-only memory map of the whole file"""
+        with open(self.path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as view:
+            yield view
+    
+    def signing_block_pairs(self):
+        """{block id: value} for the APK Signing Block's ID-value pairs; empty when there is none"""
+        if self.signing_block_offset is None:
+            return {}
+        with open(self.path, "rb") as f:
+            f.seek(self.signing_block_offset + 8)
+            data = f.read(self.cd_offset - 24 - self.signing_block_offset - 8)
+        pairs, pos = {}, 0
+        while pos + 12 <= len(data):
+            size = int.from_bytes(data[pos:pos + 8], "little")
+            pairs[int.from_bytes(data[pos + 8:pos + 12], "little")] = data[pos + 12:pos + 8 + size]
+            pos += 8 + size
+        return pairs
+    
+    def read(self, name):
+        """Uncompressed contents of one entry"""
+        entry = self.by_name[name]
+        with open(self.path, "rb") as f:
+            f.seek(entry.data_offset)
+            data = f.read(entry.compressed_size)
+        if entry.method == 0:
+            return data
+        if entry.method == 8:
+            return zlib.decompress(data, -15)
+        raise ValueError(f"Unsupported compression method {entry.method} for {name}")
+
+def clone_file(src, dst):
+    """Copy src to dst as a reflink where the filesystem supports it; returns "reflink" or "copy" """
+    if fcntl is not None:
+        try:
+            with open(src, "rb") as source, open(dst, "wb") as target:
+                fcntl.ioctl(target.fileno(), FICLONE, source.fileno())
+            return "reflink"
+        except OSError:
+            pass  # not supported here (ext4, tmpfs, cross-device); fall back to a copy
+    shutil.copyfile(src, dst)
+    return "copy"
+
+# ------------------- Manifest -------------------
+RES_XML_TYPE = 0x0003
+RES_STRING_POOL_TYPE = 0x0001
+RES_XML_RESOURCE_MAP_TYPE = 0x0180
+RES_XML_START_ELEMENT_TYPE = 0x0102
+TYPE_REFERENCE, TYPE_STRING, TYPE_INT_DEC, TYPE_INT_HEX = 0x01, 0x03, 0x10, 0x11
+# android:* attribute resource ids; names can be stripped by obfuscators, ids cannot
+MANIFEST_ATTRIBUTES = {
+    0x0101021b: "versionCode",
+    0x0101021c: "versionName",
+    0x0101020c: "minSdkVersion",
+    0x01010270: "targetSdkVersion",
+}
+
+
+class BinaryXmlStrings:
+    """Lazily decoded string pool of a binary XML (AXML) document"""
+    
+    def __init__(self, data, offset):
+        header_size, _ = struct.unpack_from("<HI", data, offset + 2)
+        count, _, flags, strings_start, _ = struct.unpack_from("<IIIII", data, offset + 8)
+        self.data = data
+        self.offsets = struct.unpack_from(f"<{count}I", data, offset + header_size)
+        self.base = offset + strings_start
+        self.utf8 = bool(flags & 0x100)
+        self._decoded = {}
+    
+    def __getitem__(self, index):
+        if index == 0xffffffff or index >= len(self.offsets):
+            return None
+        if index not in self._decoded:
+            self._decoded[index] = self._decode(self.base + self.offsets[index])
+        return self._decoded[index]
+    
+    def _decode(self, pos):
+        data = self.data
+        if self.utf8:
+            # UTF-16 length, then UTF-8 byte length; each 1 or 2 bytes
+            pos += 2 if data[pos] & 0x80 else 1
+            length = data[pos]
+            if length & 0x80:
+                length = ((length & 0x7f) << 8) | data[pos + 1]
+                pos += 1
+            return data[pos + 1:pos + 1 + length].decode("utf-8", errors="replace")
+        length = struct.unpack_from("<H", data, pos)[0]
+        if length & 0x8000:
+            length = ((length & 0x7fff) << 16) | struct.unpack_from("<H", data, pos + 2)[0]
+            pos += 2
+        return data[pos + 2:pos + 2 + length * 2].decode("utf-16-le", errors="replace")
+
+
+def parse_binary_manifest(data):
+    """Package, version and SDK levels from a compiled AndroidManifest.xml.
+    
+    Walks the AXML chunks once and only decodes the strings it needs; stops
+    at <application>, which follows everything of interest in practice.
+    Values that are resource references (e.g. versionName="@string/...")
+    come back as "@0x7f..." since resolving them needs resources.arsc.
+    """
+    if len(data) < 8 or struct.unpack_from("<H", data, 0)[0] != RES_XML_TYPE:
+        raise ValueError("Not a binary XML document")
+    info = {"package": None, "version_code": None, "version_name": None, "min_sdk": None, "target_sdk": None}
+    strings, resource_ids = None, ()
+    pos = struct.unpack_from("<H", data, 2)[0]
+    while pos + 8 <= len(data):
+        chunk_type, header_size, chunk_size = struct.unpack_from("<HHI", data, pos)
+        if chunk_size < 8:
+            break
+        if chunk_type == RES_STRING_POOL_TYPE:
+            strings = BinaryXmlStrings(data, pos)
+        elif chunk_type == RES_XML_RESOURCE_MAP_TYPE:
+            resource_ids = struct.unpack_from(f"<{(chunk_size - header_size) // 4}I", data, pos + header_size)
+        elif chunk_type == RES_XML_START_ELEMENT_TYPE and strings is not None:
+            ext = pos + header_size
+            name = strings[struct.unpack_from("<I", data, ext + 4)[0]]
+            if name == "application":
+                break
+            if name in ("manifest", "uses-sdk"):
+                attr_start, attr_size, attr_count = struct.unpack_from("<HHH", data, ext + 8)
+                for i in range(attr_count):
+                    attr = ext + attr_start + i * attr_size
+                    name_index, raw_value = struct.unpack_from("<II", data, attr + 4)
+                    value_type, value = struct.unpack_from("<BI", data, attr + 15)
+                    attr_name = (MANIFEST_ATTRIBUTES.get(resource_ids[name_index]) if name_index < len(resource_ids)
+                                 else None) or strings[name_index]
+                    if value_type == TYPE_STRING:
+                        value = strings[raw_value if raw_value != 0xffffffff else value]
+                    elif value_type == TYPE_REFERENCE:
+                        value = f"@0x{value:08x}"
+                    elif value_type not in (TYPE_INT_DEC, TYPE_INT_HEX):
+                        continue
+                    key = {"package": "package", "versionCode": "version_code", "versionName": "version_name",
+                           "minSdkVersion": "min_sdk", "targetSdkVersion": "target_sdk"}.get(attr_name)
+                    if key and (name == "uses-sdk") == (key in ("min_sdk", "target_sdk")):
+                        info[key] = value
+        pos += chunk_size
+    
+    # Codename previews ("S") stay strings; plain numbers become ints
+    for key in ("version_code", "min_sdk", "target_sdk"):
+        if isinstance(info[key], str) and info[key].isdigit():
+            info[key] = int(info[key])
+    if info["min_sdk"] is None:
+        info["min_sdk"] = 1  # the platform default when <uses-sdk> omits it
+    if info["target_sdk"] is None:
+        info["target_sdk"] = info["min_sdk"]
+    return info
+
+
+def read_manifest(path):
+    """parse_binary_manifest() of an APK's AndroidManifest.xml, cached on its ApkIndex; None if unavailable"""
+    try:
+        index = ApkIndex.for_file(path)
+        if index.manifest is None:
+            index.manifest = parse_binary_manifest(index.read("AndroidManifest.xml"))
+        return index.manifest
+    except (OSError, ValueError, KeyError, struct.error, zlib.error) as e:
+        logging.debug(f"No manifest metadata for {Path(path).name}: {e}")
+        return None
+
+# ------------------- Native Signing -------------------
+APK_SIGNATURE_SCHEME_V2_BLOCK_ID = 0x7109871a
+APK_SIGNATURE_SCHEME_V3_BLOCK_ID = 0xf05368c0
+APK_SIGNATURE_SCHEME_V31_BLOCK_ID = 0x1b93ad61
+VERITY_PADDING_BLOCK_ID = 0x42726577  # only pads the signing block to 4 KB
+SIGNATURE_RSA_PKCS1_SHA256 = 0x0103
+V2_CHUNK_SIZE = 1024 * 1024
+# Where older versions cached keys exported from the keystore; any leftovers are deleted
+KEY_CACHE_DIR = Path("keys")
+EXPORTED_KEY_FILE = re.compile(r"^[0-9a-f]{16}\.(pem|p12\.tmp)$")
+# DER DigestInfo prefix for SHA-256 (PKCS#1 v1.5 signature padding)
+SHA256_DIGEST_INFO = bytes.fromhex("3031300d060960864801650304020105000420")
+# Hash OIDs (content bytes) for checking PKCS#1 v1.5 signatures, and the v2/v3 algorithm ids using them
+PKCS1_HASH_OIDS = {
+    "sha1": bytes.fromhex("2b0e03021a"),
+    "sha256": bytes.fromhex("608648016503040201"),
+    "sha384": bytes.fromhex("608648016503040202"),
+    "sha512": bytes.fromhex("608648016503040203"),
+}
+BLOCK_RSA_PKCS1_HASHES = {0x0103: "sha256", 0x0104: "sha512"}
+OID_PKCS9_MESSAGE_DIGEST = bytes.fromhex("2a864886f70d010904")
+
+
+def der_read(data, offset=0):
+    """Parse the DER element at offset; returns (tag, content start, content end)"""
+    tag, length = data[offset], data[offset + 1]
+    offset += 2
+    if length & 0x80:
+        count = length & 0x7f
+        length = int.from_bytes(data[offset:offset + count], "big")
+        offset += count
+    return tag, offset, offset + length
+
+
+def der_children(data, start, end):
+    """Elements inside a constructed DER value as (tag, element start, content start, content end)"""
+    children = []
+    while start < end:
+        tag, content_start, content_end = der_read(data, start)
+        children.append((tag, start, content_start, content_end))
+        start = content_end
+    return children
+
+
+def pem_blocks(text):
+    """{label: [DER bytes, ...]} for every PEM block in text"""
+    blocks = {}
+    for label, body in re.findall(r"-----BEGIN ([A-Z0-9 ]+)-----(.*?)-----END \1-----", text, re.S):
+        blocks.setdefault(label, []).append(base64.b64decode("".join(body.split())))
+    return blocks
+
+
+def certificate_public_key(cert):
+    """SubjectPublicKeyInfo of an X.509 certificate, as DER"""
+    _, start, end = der_read(cert)
+    _, _, tbs_start, tbs_end = der_children(cert, start, end)[0]
+    fields = der_children(cert, tbs_start, tbs_end)
+    index = 6 if fields[0][0] == 0xa0 else 5  # [0] version is optional
+    _, element_start, _, element_end = fields[index]
+    return cert[element_start:element_end]
+
+
+def rsa_pkcs1_verify(cert, data, signature, hash_name="sha256"):
+    """Check an RSASSA-PKCS1-v1_5 signature over data against the certificate's RSA public key"""
+    spki = certificate_public_key(cert)
+    _, start, end = der_read(spki)
+    (_, algorithm_start, _, algorithm_end), (_, _, bits_start, bits_end) = der_children(spki, start, end)[:2]
+    if spki[algorithm_start:algorithm_end] != DER_RSA_ENCRYPTION or hash_name not in PKCS1_HASH_OIDS:
+        return False
+    key = spki[bits_start + 1:bits_end]  # BIT STRING content starts with the unused-bits count
+    _, key_start, key_end = der_read(key)
+    modulus, exponent = (int.from_bytes(key[cs:ce], "big") for _, _, cs, ce in der_children(key, key_start, key_end)[:2])
+    size = (modulus.bit_length() + 7) // 8
+    value = int.from_bytes(signature, "big")
+    if len(signature) != size or value >= modulus:
+        return False
+    digest_info = der_encode(0x30, der_encode(0x30, der_encode(0x06, PKCS1_HASH_OIDS[hash_name]) + b"\x05\x00")
+                             + der_encode(0x04, hashlib.new(hash_name, data).digest()))
+    expected = b"\x00\x01" + b"\xff" * (size - len(digest_info) - 3) + b"\x00" + digest_info
+    return hmac.compare_digest(pow(value, exponent, modulus).to_bytes(size, "big"), expected)
+
+
+class SigningKey:
+    """RSA private key plus its X.509 certificate, for the in-process signers"""
+    
+    def __init__(self, modulus, private_exponent, prime1, prime2, certificate):
+        self.modulus = modulus
+        self.private_exponent = private_exponent
+        self.prime1 = prime1
+        self.prime2 = prime2
+        self.certificate = certificate
+        self.size = (modulus.bit_length() + 7) // 8
+    
+    @classmethod
+    def from_pem(cls, text):
+        blocks = pem_blocks(text)
+        if "ENCRYPTED PRIVATE KEY" in blocks:
+            raise ValueError("Encrypted private keys are not supported; export the key without a passphrase")
+        if "CERTIFICATE" not in blocks:
+            raise ValueError("No certificate found in the PEM data")
+        if "RSA PRIVATE KEY" in blocks:
+            der = blocks["RSA PRIVATE KEY"][0]
+        elif "PRIVATE KEY" in blocks:
+            # PKCS#8: SEQUENCE { version, AlgorithmIdentifier, OCTET STRING { RSAPrivateKey } }
+            pkcs8 = blocks["PRIVATE KEY"][0]
+            _, start, end = der_read(pkcs8)
+            _, _, content_start, content_end = der_children(pkcs8, start, end)[2]
+            der = pkcs8[content_start:content_end]
+        else:
+            raise ValueError("No RSA private key found in the PEM data")
+        
+        # RSAPrivateKey: SEQUENCE { version, n, e, d, p, q, dp, dq, qinv }
+        _, start, end = der_read(der)
+        values = [int.from_bytes(der[cs:ce], "big") for _, _, cs, ce in der_children(der, start, end)]
+        if len(values) < 6:
+            raise ValueError("Malformed RSA private key")
+        return cls(values[1], values[3], values[4], values[5], blocks["CERTIFICATE"][0])
+    
+    @property
+    def public_key_der(self):
+        """SubjectPublicKeyInfo from the certificate, as DER"""
+        return certificate_public_key(self.certificate)
+    
+    def sign_sha256(self, data):
+        """RSASSA-PKCS1-v1_5 signature over SHA-256(data)"""
+        encoded = SHA256_DIGEST_INFO + hashlib.sha256(data).digest()
+        padded = b"\x00\x01" + b"\xff" * (self.size - len(encoded) - 3) + b"\x00" + encoded
+        message = int.from_bytes(padded, "big")
+        # Chinese remainder theorem: two half-size exponentiations instead of one full one
+        p, q, d = self.prime1, self.prime2, self.private_exponent
+        m1, m2 = pow(message, d % (p - 1), p), pow(message, d % (q - 1), q)
+        h = (pow(q, -1, p) * (m1 - m2)) % p
+        return (m2 + h * q).to_bytes(self.size, "big")
+
+
+def _chunk_digest(view, start, end):
+    digest = hashlib.sha256(b"\xa5" + (end - start).to_bytes(4, "little"))
+    digest.update(view[start:end])
+    return digest.digest()
+
+
+def v2_content_digest(path, entries_end, central_directory, eocd, workers=None):
+    """APK v2 content digest: 1 MB chunk digests over entries, central directory and EOCD.
+    
+    The EOCD must already point its central directory offset at the signing
+    block. Chunks are hashed on a thread pool straight from a memory map.
+    """
+    sections = []
+    with open(path, "rb") as f:
+        if entries_end:
+            with mmap.mmap(f.fileno(), entries_end, access=mmap.ACCESS_READ) as view:
+                spans = [(start, min(start + V2_CHUNK_SIZE, entries_end))
+                         for start in range(0, entries_end, V2_CHUNK_SIZE)]
+                with ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 2) as pool:
+                    sections.extend(pool.map(StageTimer.bind(lambda span: _chunk_digest(view, *span)), spans))
+    for data in (central_directory, eocd):
+        view = memoryview(data)
+        sections.extend(_chunk_digest(view, start, min(start + V2_CHUNK_SIZE, len(data)))
+                        for start in range(0, len(data), V2_CHUNK_SIZE))
+    return hashlib.sha256(b"\x5a" + len(sections).to_bytes(4, "little") + b"".join(sections)).digest()
+
+
+def apk_content_digest(index, workers=None):
+    """v2/v3 content digest of an indexed APK, whether or not it is signed yet"""
+    # The digest sees the EOCD as pointing at the signing block
+    eocd = index.eocd[:16] + index.entries_end.to_bytes(4, "little") + index.eocd[20:]
+    return v2_content_digest(index.path, index.entries_end, index.central_directory, eocd, workers)
+
+
+def _length_prefixed(data):
+    return len(data).to_bytes(4, "little") + data
+
+
+def build_signing_block(pairs):
+    """APK Signing Block from (block id, value) pairs"""
+    body = b"".join((4 + len(value)).to_bytes(8, "little") + block_id.to_bytes(4, "little") + value
+                    for block_id, value in pairs)
+    size = (len(body) + 8 + len(APK_SIG_BLOCK_MAGIC)).to_bytes(8, "little")
+    return size + body + size + APK_SIG_BLOCK_MAGIC
+
+
+def build_v2_signing_block(content_digest, key, other_pairs=()):
+    """APK Signing Block holding one v2 signer (RSA PKCS#1 v1.5 with SHA-256) plus any other pairs given"""
+    algorithm = SIGNATURE_RSA_PKCS1_SHA256.to_bytes(4, "little")
+    signed_data = (
+        _length_prefixed(_length_prefixed(algorithm + _length_prefixed(content_digest)))
+        + _length_prefixed(_length_prefixed(key.certificate))
+        + _length_prefixed(b"")  # no additional attributes
+    )
+    signatures = _length_prefixed(_length_prefixed(algorithm + _length_prefixed(key.sign_sha256(signed_data))))
+    signer = _length_prefixed(signed_data) + signatures + _length_prefixed(key.public_key_der)
+    value = _length_prefixed(_length_prefixed(signer))
+    return build_signing_block([(APK_SIGNATURE_SCHEME_V2_BLOCK_ID, value), *other_pairs])
+
+
+def sign_v2_in_place(path, key, workers=None):
+    """Add (or replace) the v2 signature of an aligned APK by rewriting only its tail.
+    
+    Entries stay where they are; the file is cut where the old signing block
+    or central directory began and the new block, central directory and EOCD
+    are written after it. Other pairs of an existing signing block are kept,
+    but APKs with a v3 signature are refused: replacing only the v2 signer
+    would leave a v3 signer (and key rotation lineage) that no longer matches.
+    Returns the size of the signing block.
+    """
+    index = ApkIndex.for_file(path)
+    if index.cd_offset + index.cd_size != index.eocd_offset:
+        raise ValueError("Unexpected data between the central directory and its end record")
+    pairs = index.signing_block_pairs()
+    if APK_SIGNATURE_SCHEME_V3_BLOCK_ID in pairs or APK_SIGNATURE_SCHEME_V31_BLOCK_ID in pairs:
+        raise ValueError("APK already has a v3 signature; re-sign it with apksigner (V2_SIGNER=apksigner)")
+    other_pairs = [(block_id, value) for block_id, value in pairs.items()
+                   if block_id not in (APK_SIGNATURE_SCHEME_V2_BLOCK_ID, VERITY_PADDING_BLOCK_ID)]
+    entries_end, central_directory, eocd = index.entries_end, index.central_directory, index.eocd
+    
+    block = build_v2_signing_block(apk_content_digest(index, workers), key, other_pairs)
+    new_eocd = eocd[:16] + (entries_end + len(block)).to_bytes(4, "little") + eocd[20:]
+    ApkIndex.invalidate(path)
+    with open(path, "r+b") as f:
+        f.truncate(entries_end)
+        f.seek(entries_end)
+        f.write(block + central_directory + new_eocd)
+    return len(block)
+
+# JAR (v1) signing
+ALIGNMENT_EXTRA_ID = 0xd935  # the extra field zipalign/apksigner use for padding
+V1_SIGNATURE_FILE = re.compile(r"^META-INF/([^/]+\.(SF|RSA|DSA|EC)|SIG-[^/]*|MANIFEST\.MF)$", re.I)
+SIGNER_NAME = "APK Super Signer"
+DER_SHA256_ALGORITHM = bytes.fromhex("300d06096086480165030402010500")
+DER_RSA_ENCRYPTION = bytes.fromhex("300d06092a864886f70d0101010500")
+OID_PKCS7_DATA = bytes.fromhex("06092a864886f70d010701")
+OID_PKCS7_SIGNED_DATA = bytes.fromhex("06092a864886f70d010702")
+
+
+def _entry_digest(view, entry):
+    """SHA-256 of an entry's uncompressed data, straight from the mapped archive"""
+    data = view[entry.data_offset:entry.data_offset + entry.compressed_size]
+    digest = hashlib.sha256()
+    if entry.method == 0:
+        digest.update(data)
+    elif entry.method == 8:
+        inflater = zlib.decompressobj(-15)
+        for start in range(0, len(data), V2_CHUNK_SIZE):
+            digest.update(inflater.decompress(data[start:start + V2_CHUNK_SIZE]))
+        digest.update(inflater.flush())
+    else:
+        raise ValueError(f"Unsupported compression method {entry.method} for {entry.name}")
+    return base64.b64encode(digest.digest()).decode()
+
+
+def _manifest_header(name, value):
+    """One manifest attribute, wrapped at 72 bytes per line as the JAR spec requires"""
+    line = f"{name}: {value}".encode("utf-8")
+    parts = [line[:72]] + [b" " + line[start:start + 71] for start in range(72, len(line), 71)]
+    return b"".join(part + b"\r\n" for part in parts)
+
+
+def der_encode(tag, content):
+    length = len(content)
+    if length < 0x80:
+        return bytes([tag, length]) + content
+    size = length.to_bytes((length.bit_length() + 7) // 8, "big")
+    return bytes([tag, 0x80 | len(size)]) + size + content
+
+
+def build_pkcs7_signature(data, key):
+    """Detached PKCS#7 SignedData over data, as jarsigner writes to META-INF/*.RSA"""
+    cert = key.certificate
+    _, start, end = der_read(cert)
+    _, _, tbs_start, tbs_end = der_children(cert, start, end)[0]
+    fields = der_children(cert, tbs_start, tbs_end)
+    first = 1 if fields[0][0] == 0xa0 else 0  # [0] version is optional
+    serial, issuer = fields[first], fields[first + 2]
+    
+    issuer_and_serial = der_encode(0x30, cert[issuer[1]:issuer[3]] + cert[serial[1]:serial[3]])
+    signer_info = der_encode(0x30, (
+        der_encode(0x02, b"\x01") + issuer_and_serial + DER_SHA256_ALGORITHM + DER_RSA_ENCRYPTION
+        + der_encode(0x04, key.sign_sha256(data))
+    ))
+    signed_data = der_encode(0x30, (
+        der_encode(0x02, b"\x01")
+        + der_encode(0x31, DER_SHA256_ALGORITHM)
+        + der_encode(0x30, OID_PKCS7_DATA)
+        + der_encode(0xa0, cert)
+        + der_encode(0x31, signer_info)
+    ))
+    return der_encode(0x30, OID_PKCS7_SIGNED_DATA + der_encode(0xa0, signed_data))
+
+
+def build_v1_signature_files(digests, key, signer_name="CERT", v2_signed=True):
+    """MANIFEST.MF, the .SF file and the signature block for {entry name: base64 SHA-256}"""
+    main = _manifest_header("Manifest-Version", "1.0") + _manifest_header("Created-By", SIGNER_NAME) + b"\r\n"
+    sections = [(name, _manifest_header("Name", name) + _manifest_header("SHA-256-Digest", digest) + b"\r\n")
+                for name, digest in digests.items()]
+    manifest = main + b"".join(section for _, section in sections)
+    
+    def b64sha256(data):
+        return base64.b64encode(hashlib.sha256(data).digest()).decode()
+    
+    signature_file = (
+        _manifest_header("Signature-Version", "1.0")
+        + _manifest_header("Created-By", SIGNER_NAME)
+        + _manifest_header("SHA-256-Digest-Manifest", b64sha256(manifest))
+        + _manifest_header("SHA-256-Digest-Manifest-Main-Attributes", b64sha256(main))
+        # Tells Android to reject the APK if its v2 signature was stripped
+        + (_manifest_header("X-Android-APK-Signed", "2") if v2_signed else b"")
+        + b"\r\n"
+        + b"".join(_manifest_header("Name", name) + _manifest_header("SHA-256-Digest", b64sha256(section)) + b"\r\n"
+                   for name, section in sections)
+    )
+    return [
+        ("META-INF/MANIFEST.MF", manifest),
+        (f"META-INF/{signer_name}.SF", signature_file),
+        (f"META-INF/{signer_name}.RSA", build_pkcs7_signature(signature_file, key)),
+    ]
+
+
+def _strip_alignment(extra):
+    """Drop zipalign padding (alignment fields or trailing zeros) from a local extra field"""
+    kept, pos = b"", 0
+    while pos + 4 <= len(extra):
+        field_id, size = struct.unpack_from("<HH", extra, pos)
+        if field_id == 0 or pos + 4 + size > len(extra):
+            break  # zero padding from older zipalign versions
+        if field_id != ALIGNMENT_EXTRA_ID:
+            kept += extra[pos:pos + 4 + size]
+        pos += 4 + size
+    return kept
+
+
+def _dos_datetime(moment=None):
+    moment = moment or datetime.datetime.now()
+    return ((moment.hour << 11) | (moment.minute << 5) | (moment.second // 2),
+            ((moment.year - 1980) << 9) | (moment.month << 5) | moment.day)
+
+
+def sign_v1(src, dst, key, signer_name="CERT", v2_signed=True, workers=None):
+    """JAR-sign src into a new, zipaligned archive at dst; src is left untouched.
+    
+    Entry digests are computed on a thread pool over a memory map of src
+    (hashlib and zlib release the GIL), the signature files are written
+    first and every other entry is copied raw, aligned like zipalign -p 4.
+    Returns the number of entries digested.
+    """
+    index = ApkIndex.for_file(src)
+    ApkIndex.invalidate(dst)
+    with index.mapped() as view:
+        # Old signature files are replaced; any APK Signing Block is dropped with them
+        kept = [e for e in index.entries if not V1_SIGNATURE_FILE.match(e.name)]
+        files = [e for e in kept if not e.name.endswith("/")]
+        with ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 2) as pool:
+            digests = dict(zip((e.name for e in files), pool.map(StageTimer.bind(lambda e: _entry_digest(view, e)), files)))
+        signature_files = build_v1_signature_files(digests, key, signer_name, v2_signed)
+        
+        dos_time, dos_date = _dos_datetime()
+        directory = []
+        with open(dst, "wb") as out:
+            for name, data in signature_files:
+                encoded = name.encode("utf-8")
+                deflater = zlib.compressobj(9, zlib.DEFLATED, -15)
+                packed = deflater.compress(data) + deflater.flush()
+                offset = out.tell()
+                fields = struct.pack("<HHHHHIIIHH", 20, 0x0800, 8, dos_time, dos_date, zlib.crc32(data),
+                                     len(packed), len(data), len(encoded), 0)
+                out.write(LOCAL_HEADER_SIGNATURE + fields + encoded + packed)
+                directory.append(CENTRAL_DIRECTORY_SIGNATURE + struct.pack("<H", 20) + fields
+                                 + struct.pack("<HHHII", 0, 0, 0, 0, offset) + encoded)
+            
+            for entry in kept:
+                encoded = entry.raw_name
+                extra = _strip_alignment(entry.local_extra)
+                offset = out.tell()
+                padding = (-(offset + 30 + len(encoded) + len(extra))) % entry.alignment
+                while padding and padding < 6:
+                    padding += entry.alignment
+                if padding:
+                    extra += struct.pack("<HHH", ALIGNMENT_EXTRA_ID, padding - 4, entry.alignment)
+                    extra += b"\x00" * (padding - 6)
+                # Sizes are known, so the data descriptor (bit 3) is not carried over
+                flags = entry.flags & ~0x08
+                out.write(LOCAL_HEADER_SIGNATURE + struct.pack(
+                    "<HHHHHIIIHH", struct.unpack_from("<H", entry.record, 6)[0], flags, entry.method,
+                    entry.dos_time, entry.dos_date, entry.crc, entry.compressed_size, entry.size,
+                    len(encoded), len(extra)
+                ) + encoded + extra)
+                out.write(view[entry.data_offset:entry.data_offset + entry.compressed_size])
+                directory.append(entry.record[:8] + struct.pack("<H", flags) + entry.record[10:42]
+                                 + struct.pack("<I", offset) + entry.record[46:])
+            
+            cd_start = out.tell()
+            central_directory = b"".join(directory)
+            out.write(central_directory)
+            count = len(directory)
+            eocd = index.eocd
+            out.write(eocd[:8] + struct.pack("<HHII", count, count, len(central_directory), cd_start) + eocd[20:])
+    return len(digests)
+
+# v4 (incremental install) signing
+VERITY_BLOCK_SIZE = 4096
+VERITY_LOG2_BLOCK_SIZE = 12
+V4_HASH_ALGORITHM_SHA256 = 1
+V4_SIGNATURE_VERSION = 2
+# v2 signature algorithms whose content digest is the chunked SHA-256 one
+CHUNKED_SHA256_ALGORITHMS = (0x0103, 0x0201, 0x0301)
+
+
+def _length_prefixed_items(data, limit=None):
+    """Split a sequence of u32 length-prefixed values (only the first limit of them if given)"""
+    items, pos = [], 0
+    while pos < len(data) and (limit is None or len(items) < limit):
+        size = int.from_bytes(data[pos:pos + 4], "little")
+        items.append(data[pos + 4:pos + 4 + size])
+        pos += 4 + size
+    return items
+
+
+def read_v2_content_digest(path):
+    """The SHA-256 content digest from an APK's v2 signature, which v4 signatures reference"""
+    digests = signed_content_digests(ApkIndex.for_file(path))
+    if not digests:
+        raise ValueError("APK has no v2 signature with a SHA-256 content digest; v4 signing needs one")
+    return digests[0]
+
+
+def _hash_blocks(view, start, end):
+    """Concatenated SHA-256 digests of the 4 KB blocks in [start, end); the last block is zero-padded"""
+    digests = []
+    for offset in range(start, end, VERITY_BLOCK_SIZE):
+        block = view[offset:min(offset + VERITY_BLOCK_SIZE, end)]
+        digest = hashlib.sha256(block)
+        if len(block) < VERITY_BLOCK_SIZE:
+            digest.update(bytes(VERITY_BLOCK_SIZE - len(block)))
+        digests.append(digest.digest())
+    return b"".join(digests)
+
+
+def _pad_level(level_file):
+    """Zero-pad a tree level to a whole number of blocks; returns its size"""
+    size = level_file.seek(0, os.SEEK_END)
+    if size % VERITY_BLOCK_SIZE:
+        level_file.write(bytes(VERITY_BLOCK_SIZE - size % VERITY_BLOCK_SIZE))
+    return level_file.tell()
+
+
+def build_verity_tree(path, workers=None):
+    """fs-verity Merkle tree (SHA-256, 4 KB blocks, no salt) over a whole file.
+    
+    Leaf hashes are computed on a thread pool from a memory map, 1 MB of
+    input per task; every level is spooled to its own temporary file so only
+    one span is held in memory at a time. Returns (root hash, level files),
+    the levels ordered root first as they appear in the tree. The caller
+    closes the files.
+    """
+    size = os.path.getsize(path)
+    if size == 0:
+        return bytes(32), []
+    leaves = tempfile.TemporaryFile()
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as view:
+        if size <= VERITY_BLOCK_SIZE:
+            # A single block needs no tree: its hash is the root
+            leaves.close()
+            return _hash_blocks(view, 0, size), []
+        spans = [(start, min(start + V2_CHUNK_SIZE, size)) for start in range(0, size, V2_CHUNK_SIZE)]
+        with ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 2) as pool:
+            for digests in pool.map(StageTimer.bind(lambda span: _hash_blocks(view, *span)), spans):
+                leaves.write(digests)
+    
+    levels = [leaves]
+    while _pad_level(levels[-1]) > VERITY_BLOCK_SIZE:
+        below, level = levels[-1], tempfile.TemporaryFile()
+        below.seek(0)
+        for span in iter(lambda: below.read(V2_CHUNK_SIZE), b""):
+            level.write(_hash_blocks(span, 0, len(span)))
+        levels.append(level)
+    levels[-1].seek(0)
+    root = hashlib.sha256(levels[-1].read()).digest()
+    return root, levels[::-1]
+
+
+def write_v4_signature(apk_path, key, idsig_path=None, workers=None):
+    """Write the v4 signature (.idsig) for a v2-signed APK; returns its path"""
+    idsig_path = idsig_path or f"{apk_path}.idsig"
+    apk_digest = read_v2_content_digest(apk_path)
+    root, levels = build_verity_tree(apk_path, workers)
+    try:
+        public_key = key.public_key_der
+        hashing_info = (V4_HASH_ALGORITHM_SHA256.to_bytes(4, "little") + bytes([VERITY_LOG2_BLOCK_SIZE])
+                        + _length_prefixed(b"") + _length_prefixed(root))
+        # The signature covers the file size, the tree parameters and the v2 digest
+        signed = (os.path.getsize(apk_path).to_bytes(8, "little") + hashing_info
+                  + _length_prefixed(apk_digest) + _length_prefixed(key.certificate) + _length_prefixed(b""))
+        signed = (4 + len(signed)).to_bytes(4, "little") + signed
+        # Version 2 stores the first SigningInfo's fields directly in signingInfos
+        signing_info = (
+            _length_prefixed(apk_digest) + _length_prefixed(key.certificate) + _length_prefixed(b"")
+            + _length_prefixed(public_key) + SIGNATURE_RSA_PKCS1_SHA256.to_bytes(4, "little")
+            + _length_prefixed(key.sign_sha256(signed))
+        )
+        tree_size = sum(level.seek(0, os.SEEK_END) for level in levels)
+        with open(idsig_path, "wb") as out:
+            out.write(V4_SIGNATURE_VERSION.to_bytes(4, "little") + _length_prefixed(hashing_info)
+                      + _length_prefixed(signing_info) + tree_size.to_bytes(4, "little"))
+            for level in levels:
+                level.seek(0)
+                shutil.copyfileobj(level, out)
+    finally:
+        for level in levels:
+            level.close()
+    return idsig_path
+
+# Signature inspection
+V1_SIGNATURE_BLOCK = re.compile(r"^META-INF/[^/]+\.(RSA|DSA|EC)$", re.I)
+
+
+def pkcs7_certificates(der):
+    """Certificates (DER) embedded in a PKCS#7 SignedData structure such as META-INF/CERT.RSA"""
+    _, start, end = der_read(der)
+    _, _, content_start, _ = der_children(der, start, end)[1]  # [0] EXPLICIT content
+    _, signed_start, signed_end = der_read(der, content_start)
+    for tag, _, cert_start, cert_end in der_children(der, signed_start, signed_end):
+        if tag == 0xa0:  # [0] IMPLICIT certificates
+            return [der[element_start:element_end] for _, element_start, _, element_end
+                    in der_children(der, cert_start, cert_end)]
+    return []
+
+
+def pkcs7_signs(der, data, cert):
+    """True when a SignerInfo in the PKCS#7 SignedData der holds a valid signature by cert over data"""
+    _, start, end = der_read(der)
+    _, _, content_start, _ = der_children(der, start, end)[1]  # [0] EXPLICIT content
+    _, signed_start, signed_end = der_read(der, content_start)
+    _, _, infos_start, infos_end = der_children(der, signed_start, signed_end)[-1]  # signerInfos come last
+    for _, _, info_start, info_end in der_children(der, infos_start, infos_end):
+        # SignerInfo: version, issuerAndSerial, digestAlgorithm, [0] signed attributes?, encryption algorithm, signature
+        fields = der_children(der, info_start, info_end)
+        _, oid_start, oid_end = der_read(der, fields[2][2])
+        hash_name = next((name for name, oid in PKCS1_HASH_OIDS.items() if oid == der[oid_start:oid_end]), None)
+        attributes = next((field for field in fields[3:] if field[0] == 0xa0), None)
+        signature = next((der[cs:ce] for tag, _, cs, ce in fields[3:] if tag == 0x04), b"")
+        if hash_name is None:
+            continue
+        signed = data
+        if attributes:
+            # The signature then covers the attributes (re-tagged as a SET), which carry data's digest
+            message_digest = None
+            for _, _, attribute_start, attribute_end in der_children(der, attributes[2], attributes[3]):
+                (_, _, oid_start, oid_end), values = der_children(der, attribute_start, attribute_end)[:2]
+                if der[oid_start:oid_end] == OID_PKCS9_MESSAGE_DIGEST:
+                    _, value_start, value_end = der_read(der, values[2])
+                    message_digest = der[value_start:value_end]
+            if message_digest != hashlib.new(hash_name, data).digest():
+                continue
+            signed = b"\x31" + der[attributes[1] + 1:attributes[3]]
+        if rsa_pkcs1_verify(cert, signed, signature, hash_name):
+            return True
+    return False
+
+
+def block_signers(index):
+    """(scheme, signed data, signatures) for each v3 and v2 signer in the APK Signing Block"""
+    pairs = index.signing_block_pairs()
+    for scheme, block_id in (("v3", APK_SIGNATURE_SCHEME_V3_BLOCK_ID), ("v2", APK_SIGNATURE_SCHEME_V2_BLOCK_ID)):
+        if block_id in pairs:
+            for signer in _length_prefixed_items(_length_prefixed_items(pairs[block_id])[0]):
+                signed_data = _length_prefixed_items(signer, 1)[0]
+                # v3 signers carry their SDK bounds (two u32s) between signed data and signatures
+                rest = signer[4 + len(signed_data) + (8 if scheme == "v3" else 0):]
+                yield scheme, signed_data, _length_prefixed_items(rest, 1)[0]
+
+
+def signer_certificates(path):
+    """{scheme: [certificate DER, ...]} for the v3, v2 and v1 signatures an APK carries"""
+    index = ApkIndex.for_file(path)
+    certificates = {}
+    for scheme, signed_data, _ in block_signers(index):
+        certificates.setdefault(scheme, []).extend(_length_prefixed_items(_length_prefixed_items(signed_data, 2)[1]))
+    for entry in index.entries:
+        if V1_SIGNATURE_BLOCK.match(entry.name):
+            certificates.setdefault("v1", []).extend(pkcs7_certificates(index.read(entry.name)))
+    return certificates
+
+
+def signed_content_digests(index):
+    """Chunked SHA-256 content digests recorded by the v3/v2 signers"""
+    digests = []
+    for _, signed_data, _ in block_signers(index):
+        for digest in _length_prefixed_items(_length_prefixed_items(signed_data, 1)[0]):
+            if int.from_bytes(digest[:4], "little") in CHUNKED_SHA256_ALGORITHMS:
+                digests.append(_length_prefixed_items(digest[4:])[0])
+    return digests
+
+
+def content_digest_intact(path, workers=None):
+    """True when the APK's current contents still match the digest its v2/v3 signature recorded"""
+    index = ApkIndex.for_file(path)
+    recorded = signed_content_digests(index)
+    if not recorded:
+        return False
+    return apk_content_digest(index, workers) in recorded
+
+
+def block_signature_intact(path, cert, workers=None):
+    """True when a v3/v2 signer with cert has a valid RSA signature and its content digest still matches"""
+    index = ApkIndex.for_file(path)
+    current = None
+    for _, signed_data, signatures in block_signers(index):
+        digests, certificates = _length_prefixed_items(signed_data, 2)
+        if cert not in _length_prefixed_items(certificates):
+            continue
+        if not any(rsa_pkcs1_verify(cert, signed_data, _length_prefixed_items(signature[4:])[0],
+                                    BLOCK_RSA_PKCS1_HASHES.get(int.from_bytes(signature[:4], "little")))
+                   for signature in _length_prefixed_items(signatures)):
+            continue
+        recorded = [_length_prefixed_items(digest[4:])[0] for digest in _length_prefixed_items(digests)
+                    if int.from_bytes(digest[:4], "little") in CHUNKED_SHA256_ALGORITHMS]
+        if recorded:
+            current = current or apk_content_digest(index, workers)
+            if current in recorded:
+                return True
+    return False
+
+
+def manifest_sections(data):
+    """Attribute dicts for each section of a JAR manifest or .SF file, continuation lines joined"""
+    sections, current, last = [], {}, None
+    for line in re.split(rb"\r\n|\r|\n", data):
+        if line.startswith(b" ") and last:
+            current[last] += line[1:]
+        elif line:
+            last, _, value = line.partition(b": ")
+            current[last] = value
+        elif current:
+            sections.append(current)
+            current, last = {}, None
+    if current:
+        sections.append(current)
+    return [{name.decode("utf-8"): value.decode("utf-8") for name, value in section.items()} for section in sections]
+
+
+def v1_signature_intact(path, certificate, workers=None):
+    """True when a JAR signature by certificate is valid and still matches the archive's contents.
+    
+    The signature block must hold a valid signature by certificate over its
+    .SF, the .SF the SHA-256 digest of the current MANIFEST.MF, and the
+    manifest a matching SHA-256 digest for every entry outside the signature
+    files, so forged signatures and edited or added entries fail.
+    """
+    index = ApkIndex.for_file(path)
+    if "META-INF/MANIFEST.MF" not in index.by_name:
+        return False
+    manifest = index.read("META-INF/MANIFEST.MF")
+    expected = base64.b64encode(hashlib.sha256(manifest).digest()).decode()
+    for entry in index.entries:
+        signature_file = entry.name.rsplit(".", 1)[0] + ".SF"
+        if not (V1_SIGNATURE_BLOCK.match(entry.name) and signature_file in index.by_name):
+            continue
+        block, signed = index.read(entry.name), index.read(signature_file)
+        if certificate in pkcs7_certificates(block) and pkcs7_signs(block, signed, certificate):
+            main = manifest_sections(signed)[:1] or [{}]
+            if main[0].get("SHA-256-Digest-Manifest") == expected:
+                break
+    else:
+        return False
+    
+    recorded = {section["Name"]: section.get("SHA-256-Digest") for section in manifest_sections(manifest)[1:]
+                if "Name" in section}
+    files = [e for e in index.entries if not V1_SIGNATURE_FILE.match(e.name) and not e.name.endswith("/")]
+    if any(recorded.get(e.name) is None for e in files):
+        return False
+    with index.mapped() as view, ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 2) as pool:
+        digests = pool.map(StageTimer.bind(lambda e: _entry_digest(view, e)), files)
+        return all(digest == recorded[e.name] for e, digest in zip(files, digests))
+
+
+def der_oid(content):
+    """Dotted form of a DER OBJECT IDENTIFIER's content bytes"""
+    head = min(content[0] // 40, 2)
+    parts, value = [head, content[0] - 40 * head], 0
+    for byte in content[1:]:
+        value = (value << 7) | (byte & 0x7f)
+        if not byte & 0x80:
+            parts.append(value)
+            value = 0
+    return ".".join(str(part) for part in parts)
+
+
+X509_NAME_ATTRIBUTES = {
+    "2.5.4.3": "CN", "2.5.4.11": "OU", "2.5.4.10": "O", "2.5.4.7": "L", "2.5.4.8": "ST", "2.5.4.6": "C",
+    "2.5.4.5": "SERIALNUMBER", "1.2.840.113549.1.9.1": "EMAILADDRESS", "0.9.2342.19200300.100.1.25": "DC",
+}
+
+
+def _der_string(tag, content):
+    if tag == 0x1e:  # BMPString
+        return content.decode("utf-16-be", errors="replace")
+    if tag == 0x1c:  # UniversalString
+        return content.decode("utf-32-be", errors="replace")
+    if tag == 0x14:  # T61String, in practice Latin-1
+        return content.decode("latin-1")
+    return content.decode("utf-8", errors="replace")
+
+
+def x509_name(der, start, end):
+    """A Name as text, most specific attribute first like keytool and apksigner print it"""
+    parts = []
+    for _, _, set_start, set_end in der_children(der, start, end):
+        for _, _, atv_start, atv_end in der_children(der, set_start, set_end):
+            (_, _, oid_start, oid_end), (tag, _, value_start, value_end) = der_children(der, atv_start, atv_end)[:2]
+            oid = der_oid(der[oid_start:oid_end])
+            parts.append(f"{X509_NAME_ATTRIBUTES.get(oid, oid)}={_der_string(tag, der[value_start:value_end])}")
+    return ", ".join(reversed(parts))
+
+
+def _der_time(tag, content):
+    text = content.decode("ascii").rstrip("Z")
+    if tag == 0x17:  # UTCTime: two-digit years, 1950-2049
+        text = ("19" if int(text[:2]) >= 50 else "20") + text
+    text = text.ljust(14, "0")[:14]  # seconds are optional
+    return datetime.datetime.strptime(text, "%Y%m%d%H%M%S").replace(tzinfo=datetime.timezone.utc).isoformat()
+
+
+def describe_certificate(der):
+    """Subject, issuer, serial, validity and fingerprints of an X.509 certificate"""
+    _, start, end = der_read(der)
+    _, _, tbs_start, tbs_end = der_children(der, start, end)[0]
+    fields = der_children(der, tbs_start, tbs_end)
+    first = 1 if fields[0][0] == 0xa0 else 0  # [0] version is optional
+    serial, issuer, validity, subject = fields[first], fields[first + 2], fields[first + 3], fields[first + 4]
+    not_before, not_after = der_children(der, validity[2], validity[3])[:2]
+    return {
+        "subject": x509_name(der, subject[2], subject[3]),
+        "issuer": x509_name(der, issuer[2], issuer[3]),
+        "serial": format(int.from_bytes(der[serial[2]:serial[3]], "big"), "x"),
+        "not_before": _der_time(not_before[0], der[not_before[2]:not_before[3]]),
+        "not_after": _der_time(not_after[0], der[not_after[2]:not_after[3]]),
+        "sha256": hashlib.sha256(der).hexdigest(),
+        "sha1": hashlib.sha1(der).hexdigest(),
+    }
+
+
+def signer_certificate_details(path):
+    """describe_certificate() for each distinct certificate an APK is signed with, plus the schemes carrying it"""
+    details = {}
+    for scheme, certificates in signer_certificates(path).items():
+        for der in certificates:
+            fingerprint = hashlib.sha256(der).hexdigest()
+            if fingerprint not in details:
+                details[fingerprint] = dict(describe_certificate(der), schemes=[])
+            if scheme not in details[fingerprint]["schemes"]:
+                details[fingerprint]["schemes"].append(scheme)
+    return list(details.values())
+
+
+def format_certificates(certificates):
+    """Text in the style of apksigner verify --print-certs"""
+    lines = []
+    for i, cert in enumerate(certificates, 1):
+        lines += [
+            f"Signer #{i} certificate DN: {cert['subject']}",
+            f"Signer #{i} certificate issuer: {cert['issuer']}",
+            f"Signer #{i} certificate valid: {cert['not_before'][:10]} to {cert['not_after'][:10]}",
+            f"Signer #{i} certificate SHA-256 digest: {cert['sha256']}",
+            f"Signer #{i} certificate SHA-1 digest: {cert['sha1']}",
+            f"Signer #{i} signature schemes: {', '.join(cert['schemes'])}",
+        ]
+    return "\n".join(lines)
+
 # ------------------- Advanced APK Signer -------------------
 class AdvancedApkSigner:
+    # Steps after which the output carries its final signature (journalled as "signed")
+    SIGNED_STEPS = ("Apksigner Signing", "Native v2 Signing")
+    CERT_CACHE_SIZE = 256
+    
     def __init__(self, config_manager):
         self.config_manager = config_manager
+        self.history_lock = threading.Lock()
+        self._tools_cache = None
+        self._key_cache = None
+        self._key_lock = threading.Lock()
+        self._cert_cache = collections.OrderedDict()
+        self._cert_lock = threading.Lock()
         self.setup_logging()
+        Profiler.configure(
+            Profiler.enabled or self.config_manager.get("PROFILE", False),
+            self.config_manager.get("PROFILE_TOP_N", 25)
+        )
         self.history = self.load_history()
+        self.metrics = MetricsRegistry()
+        self.metrics_server = None
+        if self.config_manager.get("METRICS_PORT"):
+            try:
+                self.metrics_server = start_metrics_server(self.metrics, self.config_manager.get("METRICS_PORT"))
+            except OSError as e:
+                logging.error(f"Could not start metrics endpoint: {e}")
+    
+    def publish_metrics(self):
+        metrics_file = self.config_manager.get("METRICS_FILE")
+        if metrics_file:
+            try:
+                self.metrics.write_file(metrics_file)
+            except OSError as e:
+                logging.error(f"Error writing metrics file: {e}")
+    
+    def _job_started(self, action):
+        self.metrics.inc("apk_signer_jobs_started_total", help_text="Signing/verification jobs started", action=action)
+        self.metrics.add_gauge("apk_signer_active_jobs", 1, help_text="Jobs currently running", action=action)
+    
+    def _job_finished(self, action, succeeded, seconds):
+        name = "apk_signer_jobs_succeeded_total" if succeeded else "apk_signer_jobs_failed_total"
+        self.metrics.inc(name, help_text=f"Jobs that {'succeeded' if succeeded else 'failed'}", action=action)
+        self.metrics.add_gauge("apk_signer_active_jobs", -1, help_text="Jobs currently running", action=action)
+        self.metrics.observe("apk_signer_job_duration_seconds", seconds, help_text="End-to-end job latency",
+                             action=action)
+        self.publish_metrics()
+    
+    def _record_stage(self, timer):
+        self.metrics.observe("apk_signer_stage_duration_seconds", timer.wall_s,
+                             help_text="Per-stage latency", stage=timer.name)
+        self.metrics.inc("apk_signer_bytes_processed_total", timer.input_bytes,
+                         help_text="Sizes of the files pipeline stages read and wrote", direction="read")
+        self.metrics.inc("apk_signer_bytes_processed_total", timer.output_bytes,
+                         help_text="Sizes of the files pipeline stages read and wrote", direction="written")
+        if THREAD_IO_ACCOUNTING:
+            self.metrics.inc("apk_signer_disk_bytes_total", timer.disk_read_bytes,
+                             help_text="Block I/O pipeline stages did against storage", direction="read")
+            self.metrics.inc("apk_signer_disk_bytes_total", timer.disk_write_bytes,
+                             help_text="Block I/O pipeline stages did against storage", direction="written")
+    
+    def setup_logging(self):
+        log_file = configure_logging(self.config_manager)
+        logging.info(f"APK Signer started. Log file: {log_file}")
+    
+    @profiled("load_history")
+    def load_history(self):
+        history_file = Path("signing_history.json")
+        try:
+            if history_file.exists():
+                with open(history_file, 'r') as f:
+                    return json.load(f)
+        except Exception as e:
+            logging.error(f"Error loading history: {e}")
+        return []
+    
+    def save_history(self):
+        history_file = Path("signing_history.json")
+        try:
+            with open(history_file, 'w') as f:
+                json.dump(self.history[-50:], f, indent=4)  # Keep last 50 entries
+        except Exception as e:
+            logging.error(f"Error saving history: {e}")
+    
+    def run_cmd(self, cmd, step_name, progress_queue=None, total_entries=None):
+        """Run a tool, streaming its output to disk; returns the non-listing output lines"""
+        display_cmd = " ".join(redact_cmd(cmd))
+        logging.info(f"Step: {step_name} | Command: {display_cmd}")
+        if progress_queue:
+            progress_queue.put(("log", f"Running: {display_cmd}"))
+        
+        cmd_start = time.perf_counter()
+        summary = ToolOutputSummary(step_name, total_entries)
+        with trace_span(step_name, "cmd", cmd=display_cmd):
+            try:
+                with open_tool_output(step_name, int(self.config_manager.get("TOOL_OUTPUT_KEEP", 200))) as output_file:
+                    process = subprocess.Popen(
+                        cmd, 
+                        stdout=subprocess.PIPE, 
+                        stderr=subprocess.STDOUT, 
+                        text=True, 
+                        errors="replace", 
+                        shell=os.name == "nt"  # needed to launch .bat wrappers
+                    )
+                    timed_out = threading.Event()
+                    timer = threading.Timer(300, lambda: (timed_out.set(), process.kill()))  # 5 minutes timeout
+                    timer.start()
+                    try:
+                        last_update = 0.0
+                        for line in process.stdout:
+                            output_file.write(line)
+                            if summary.feed(line) and progress_queue:
+                                now = time.perf_counter()
+                                if now - last_update >= 0.1:
+                                    last_update = now
+                                    progress_queue.put(("tool_progress", step_name, summary.entries, total_entries))
+                        returncode = reap_process(process)
+                    finally:
+                        timer.cancel()
+                
+                if timed_out.is_set():
+                    raise subprocess.TimeoutExpired(cmd, 300)
+                return self._finish_cmd(step_name, summary, returncode, output_file.name, cmd_start, progress_queue)
+            except subprocess.TimeoutExpired:
+                error_msg = f"Timeout in {step_name}"
+                logging.error(error_msg)
+                if progress_queue:
+                    progress_queue.put(("error", error_msg))
+                raise RuntimeError(error_msg)
+            except Exception as e:
+                error_msg = f"Exception in {step_name}: {str(e)}"
+                logging.error(error_msg)
+                if progress_queue:
+                    progress_queue.put(("error", error_msg))
+                raise
+    
+    def _finish_cmd(self, step_name, summary, returncode, output_file, cmd_start, progress_queue):
+        """Report a finished tool run; returns its non-listing output or raises on a non-zero exit"""
+        output = summary.text()
+        if returncode != 0:
+            error_msg = "\n".join(summary.lines[-20:]) or f"exit code {returncode}"
+            logging.error(f"Error in {step_name}: {error_msg}")
+            if progress_queue:
+                progress_queue.put(("error", error_msg))
+            raise RuntimeError(error_msg)
+        
+        # Full listings (jarsigner -verbose) stay on disk; only the summary is logged and shown
+        logging.info(summary.summary(output_file),
+                     extra={"duration_s": round(time.perf_counter() - cmd_start, 4)})
+        if output and logging.getLogger().isEnabledFor(logging.DEBUG):
+            logging.debug(f"Output: {truncate_output(output, int(self.config_manager.get('LOG_TOOL_OUTPUT_LIMIT', 4000)))}")
+        if progress_queue:
+            if summary.entries:
+                progress_queue.put(("tool_progress", step_name, summary.entries, summary.total_entries))
+            progress_queue.put(("log", summary.summary()))
+            if output:
+                progress_queue.put(("log", output))
+        return output
+    
+    def run_native(self, func, step_name, progress_queue=None):
+        """Run an in-process pipeline step with the same logging and error reporting as run_cmd"""
+        logging.info(f"Step: {step_name} | In-process")
+        if progress_queue:
+            progress_queue.put(("log", f"Running: {step_name} (in-process)"))
+        
+        cmd_start = time.perf_counter()
+        with trace_span(step_name, "native"):
+            try:
+                result = func()
+            except Exception as e:
+                error_msg = f"Exception in {step_name}: {str(e)}"
+                logging.error(error_msg)
+                if progress_queue:
+                    progress_queue.put(("error", error_msg))
+                raise
+        
+        elapsed = time.perf_counter() - cmd_start
+        logging.info(f"{step_name}: done in {elapsed:.2f}s", extra={"duration_s": round(elapsed, 4)})
+        if progress_queue:
+            progress_queue.put(("log", f"{step_name}: done in {elapsed:.2f}s"))
+        return result
+    
+    def load_signing_key(self):
+        """The configured key and certificate as a SigningKey for the in-process signers.
+        
+        KEY_PEM/CERT_PEM are used when set. Otherwise the keystore entry is
+        exported through keytool and openssl and kept in memory only, until
+        the keystore file changes.
+        """
+        keystore = self.config_manager.get("KEYSTORE")
+        key_pem, cert_pem = self.config_manager.get("KEY_PEM"), self.config_manager.get("CERT_PEM")
+        keystore_mtime = None if key_pem or not keystore else os.path.getmtime(keystore)
+        cache_key = (keystore, keystore_mtime, self.config_manager.get("ALIAS"), key_pem, cert_pem)
+        with self._key_lock:
+            if self._key_cache and self._key_cache[0] == cache_key:
+                return self._key_cache[1]
+            
+            if key_pem:
+                with open(key_pem, "r") as f:
+                    text = f.read()
+                if cert_pem:
+                    with open(cert_pem, "r") as f:
+                        text += "\n" + f.read()
+            else:
+                text = self._export_keystore_pem()
+            key = SigningKey.from_pem(text)
+            self._key_cache = (cache_key, key)
+            return key
+    
+    def certificate_info(self, apk_path, file_digest=None):
+        """Signer certificate details of an APK, parsed in-process and cached.
+        
+        The cache key is the file digest when the caller already has one, and
+        otherwise the file's identity (device, inode, size, mtime), so the
+        file is never hashed just for this.
+        """
+        if not file_digest:
+            try:
+                stat = os.stat(apk_path)
+                file_digest = (stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns)
+            except OSError:
+                return []
+        with self._cert_lock:
+            if file_digest in self._cert_cache:
+                self._cert_cache.move_to_end(file_digest)
+                return self._cert_cache[file_digest]
+        try:
+            details = signer_certificate_details(apk_path)
+        except (OSError, ValueError, KeyError, IndexError, OverflowError, struct.error, zlib.error) as e:
+            # Informational only (history and reports); signing and verification do not depend on it
+            logging.debug(f"Could not read the signer certificates of {Path(apk_path).name}: {e}")
+            details = []
+        with self._cert_lock:
+            self._cert_cache[file_digest] = details
+            while len(self._cert_cache) > self.CERT_CACHE_SIZE:
+                self._cert_cache.popitem(last=False)
+        return details
+    
+    def v1_needed(self, apk_path):
+        """Whether the APK gets a JAR signature: V1_SIGNING true/false, or "auto" for minSdk < 24"""
+        setting = self.config_manager.get("V1_SIGNING", True)
+        if setting != "auto":
+            return bool(setting)
+        manifest = read_manifest(apk_path)
+        min_sdk = manifest["min_sdk"] if manifest else None
+        # Android 7.0 (API 24) verifies v2 signatures; older releases only check v1
+        needed = not isinstance(min_sdk, int) or min_sdk < 24
+        logging.info(f"{Path(apk_path).name}: minSdk {min_sdk}, v1 signature {'needed' if needed else 'skipped'}")
+        return needed
+    
+    def _already_aligned(self, apk_path):
+        if not self.config_manager.get("SKIP_ALIGNED", True):
+            return False
+        try:
+            return ApkIndex.for_file(apk_path).is_aligned
+        except (OSError, ValueError) as e:
+            logging.warning(f"Alignment check failed for {Path(apk_path).name}, running zipalign: {e}")
+            return False
+    
+    def v1_signer_name(self):
+        """Base name of the .SF/.RSA files, derived from the key alias like jarsigner does"""
+        name = re.sub(r"[^A-Z0-9_-]", "_", str(self.config_manager.get("ALIAS") or "").upper())[:8]
+        return name or "CERT"
+    
+    @staticmethod
+    def _remove_exported_keys():
+        """Delete unencrypted keys that older versions cached under keys/"""
+        if not KEY_CACHE_DIR.is_dir():
+            return
+        for path in KEY_CACHE_DIR.iterdir():
+            if EXPORTED_KEY_FILE.match(path.name):
+                try:
+                    path.unlink()
+                    logging.info(f"Removed cached private key export {path}")
+                except OSError as e:
+                    logging.warning(f"Could not remove cached private key export {path}: {e}")
+    
+    def _export_keystore_pem(self):
+        """PEM key and certificate of the keystore entry; never written to disk unencrypted"""
+        self._remove_exported_keys()
+        keystore = self.config_manager.get("KEYSTORE")
+        alias = self.config_manager.get("ALIAS")
+        exe = ".exe" if os.name == "nt" else ""
+        keytool = os.path.join(self.config_manager.get("JDK_PATH"), "bin", f"keytool{exe}")
+        storepass = self.config_manager.get("STOREPASS")
+        # keytool needs a file to export into; the PKCS#12 copy is password-protected and deleted right away
+        with tempfile.TemporaryDirectory(prefix="apk-signer-key-") as folder:
+            p12 = Path(folder) / "export.p12"
+            self.run_cmd([
+                keytool, "-importkeystore", "-noprompt", "-srckeystore", keystore,
+                "-srcstorepass", storepass, "-srcalias", alias,
+                "-srckeypass", self.config_manager.get("KEYPASS"),
+                "-destkeystore", str(p12), "-deststoretype", "PKCS12",
+                "-deststorepass", storepass, "-destkeypass", storepass
+            ], "Export Signing Key")
+            result = subprocess.run(
+                [self.config_manager.get("OPENSSL_PATH", "openssl"), "pkcs12", "-in", str(p12), "-nodes",
+                 "-passin", f"pass:{storepass}"],
+                capture_output=True, text=True, timeout=60
+            )
+        if result.returncode != 0:
+            raise RuntimeError(f"openssl could not read the exported key: {result.stderr.strip()}")
+        return result.stdout
+    
+    def verify_tools(self):
+        # Reuse the last successful lookup while the configured paths are unchanged
+        cache_key = (self.config_manager.get("JDK_PATH"), self.config_manager.get("SDK_BUILD_TOOLS"))
+        if self._tools_cache and self._tools_cache[0] == cache_key:
+            self.metrics.inc("apk_signer_cache_requests_total", help_text="Cache lookups", cache="toolchain", result="hit")
+            return dict(self._tools_cache[1])
+        self.metrics.inc("apk_signer_cache_requests_total", help_text="Cache lookups", cache="toolchain", result="miss")
+        
+        # Windows ships .exe/.bat wrappers; other platforms use bare executables
+        exe, bat = (".exe", ".bat") if os.name == "nt" else ("", "")
+        tools = {
+            "jarsigner": os.path.join(self.config_manager.get("JDK_PATH"), "bin", f"jarsigner{exe}"),
+            "zipalign": os.path.join(self.config_manager.get("SDK_BUILD_TOOLS"), f"zipalign{exe}"),
+            "apksigner": os.path.join(self.config_manager.get("SDK_BUILD_TOOLS"), f"apksigner{bat}")
+        }
+        
+        missing = []
+        for name, path in tools.items():
+            if not os.path.exists(path):
+                missing.append(f"{name}: {path}")
+        
+        if missing:
+            raise RuntimeError(f"Missing required tools:\n" + "\n".join(missing))
+        
+        self._tools_cache = (cache_key, dict(tools))
+        return tools
+    
+    def sign_apk(self, apk_path, progress_queue=None, journal=None):
+        """Sign one APK; returns the signed APK path and raises on failure"""
+        return self._sign_job(apk_path, progress_queue, journal)["signed_apk"]
+    
+    def sign(self, apk_path, progress_queue=None, journal=None):
+        """Sign one APK; returns a SignResult (failures included) instead of raising"""
+        job_start = time.perf_counter()
+        job_id = current_log_context().get("job_id") or uuid.uuid4().hex[:12]
+        with log_context(job_id=job_id):
+            try:
+                return SignResult.from_history(self._sign_job(apk_path, progress_queue, journal))
+            except Exception as e:
+                return SignResult(str(Path(apk_path).resolve()), "failed", error=str(e), job_id=job_id,
+                                  wall_s=round(time.perf_counter() - job_start, 4))
+    
+    @profiled("sign_apk")
+    def _sign_job(self, apk_path, progress_queue, journal):
+        apk_path = str(Path(apk_path).resolve())
+        # Reuse the caller's job id (e.g. a daemon job) so its records correlate
+        job_id = current_log_context().get("job_id") or uuid.uuid4().hex[:12]
+        with log_context(job_id=job_id, apk=Path(apk_path).name):
+            return self._sign_apk(apk_path, job_id, progress_queue, journal)
+    
+    def _sign_apk(self, apk_path, job_id, progress_queue, journal):
+        job_start = time.perf_counter()
+        self._job_started("sign")
+        span = trace_span(f"sign {Path(apk_path).name}", "job", apk=apk_path)
+        try:
+            tools = self.verify_tools()
+            output_path = self._output_path_for(apk_path)
+            skipped = self._skip_signed_input(apk_path, job_id, output_path, job_start, journal, progress_queue)
+            if skipped:
+                span.finish()
+                return skipped
+            stages = []
+            
+            # Calculate original APK hash
+            with log_context(stage="Hash Original"), StageTimer("Hash Original", reads=[apk_path]) as timer:
+                original_hash = self.calculate_hash(apk_path)
+            stages.append(timer)
+            entry_count = count_zip_entries(apk_path)
+            if journal:
+                journal.record(apk_path, "signing", track_input=True, output=str(output_path), original_hash=original_hash)
+            
+            steps = self._sign_steps(tools, apk_path, output_path)
+            for i, (step_name, cmd, reads, writes) in enumerate(steps, 1):
+                if progress_queue:
+                    progress_queue.put(("progress", i / len(steps), step_name))
+                with log_context(stage=step_name), StageTimer(step_name, reads, writes) as timer:
+                    if callable(cmd):
+                        self.run_native(cmd, step_name, progress_queue)
+                    else:
+                        self.run_cmd(cmd, step_name, progress_queue, entry_count)
+                stages.append(timer)
+                if journal and step_name in self.SIGNED_STEPS:
+                    journal.record(apk_path, "signed", output=str(output_path))
+            
+            # Calculate signed APK hash
+            with log_context(stage="Hash Signed"), StageTimer("Hash Signed", reads=[output_path]) as timer:
+                signed_hash = self.calculate_hash(str(output_path))
+            stages.append(timer)
+            
+            history_entry = self._record_signed(apk_path, job_id, output_path, original_hash, signed_hash,
+                                                stages, job_start, journal)
+            span.finish()
+            if progress_queue:
+                progress_queue.put(("complete", str(output_path)))
+            return history_entry
+        
+        except Exception as e:
+            span.finish(e)
+            self._record_sign_failure(apk_path, e, job_start, journal, progress_queue)
+            raise
     
-    def setup_logging(self):
-        log_dir = Path("logs")
-        log_dir.mkdir(exist_ok=True)
+    def already_signed(self, apk_path):
+        """True when apk_path is signed with the configured certificate and unchanged since.
+        
+        APKs need a v3/v2 signer with that certificate whose signature checks
+        out against its public key and whose recorded content digest still
+        matches; bundles only have v1 signatures, so for them the JAR
+        signature and its manifest and entry digests are checked instead.
+        """
+        try:
+            certificate = self.load_signing_key().certificate
+            ours = hashlib.sha256(certificate).digest()
+            certificates = signer_certificates(apk_path)
+            schemes = ("v1",) if apk_path.lower().endswith(".aab") else ("v3", "v2")
+            if not any(hashlib.sha256(cert).digest() == ours
+                       for scheme in schemes for cert in certificates.get(scheme, [])):
+                return False
+            workers = int(self.config_manager.get("DIGEST_WORKERS", 0)) or None
+            if schemes == ("v1",):
+                return v1_signature_intact(apk_path, certificate, workers)
+            return block_signature_intact(apk_path, certificate, workers)
+        except (OSError, ValueError, RuntimeError, IndexError) as e:
+            logging.warning(f"Could not check the existing signature of {Path(apk_path).name}: {e}")
+            return False
+    
+    def _skip_signed_input(self, apk_path, job_id, output_path, job_start, journal, progress_queue):
+        """Handle an input that is already signed with our key per SIGNED_INPUT_ACTION.
+        
+        Returns a "skipped" history entry, or None when the APK should be signed.
+        "skip" leaves the input where it is; "pass_through" copies it to the
+        output directory unchanged.
+        """
+        action = self.config_manager.get("SIGNED_INPUT_ACTION", "sign")
+        if action not in ("skip", "pass_through"):
+            return None
+        with log_context(stage="Signature Check"), StageTimer("Signature Check", reads=[apk_path]) as timer:
+            signed = self.already_signed(apk_path)
+        if not signed:
+            return None
+        
+        stages = [timer]
+        result_path = apk_path
+        if action == "pass_through":
+            with log_context(stage="Copy Signed APK"), \
+                    StageTimer("Copy Signed APK", [apk_path], [output_path]) as timer:
+                clone_file(apk_path, str(output_path))
+            stages.append(timer)
+            result_path = str(output_path)
+        message = f"{Path(apk_path).name} is already signed with the configured certificate; skipped"
+        logging.info(message)
+        if journal:
+            journal.record(apk_path, "verified", track_input=True, output=result_path,
+                           signed_size=os.path.getsize(result_path))
+        
+        history_entry = {
+            "timestamp": datetime.datetime.now().isoformat(),
+            "job_id": job_id,
+            "original_apk": apk_path,
+            "signed_apk": result_path,
+            "original_hash": None,
+            "signed_hash": None,
+            "status": "skipped",
+            "total_wall_s": round(time.perf_counter() - job_start, 4),
+            "stages": {timer.name: timer.to_dict() for timer in stages}
+        }
+        manifest = read_manifest(apk_path)
+        if manifest:
+            history_entry["manifest"] = manifest
+        history_entry["certificates"] = self.certificate_info(apk_path)
+        with self.history_lock:
+            self.history.append(history_entry)
+            self.save_history()
+        for timer in stages:
+            self._record_stage(timer)
+        self.metrics.inc("apk_signer_jobs_skipped_total", help_text="Inputs already signed with the configured key")
+        self._job_finished("sign", True, time.perf_counter() - job_start)
+        if progress_queue:
+            progress_queue.put(("log", message))
+            progress_queue.put(("skipped", result_path))
+        return history_entry
+    
+    def _output_path_for(self, apk_path):
+        # Create output directory if not exists
+        output_dir = Path(self.config_manager.get("OUTPUT_DIR"))
+        output_dir.mkdir(parents=True, exist_ok=True)
+        
+        # Generate output filename from OUTPUT_NAME_TEMPLATE
+        template = self.config_manager.get("OUTPUT_NAME_TEMPLATE") or "{stem}_signed_{timestamp}"
+        fields = {
+            "stem": Path(apk_path).stem,
+            "timestamp": datetime.datetime.now().strftime("%Y%m%d_%H%M%S"),
+            "package": None, "version_code": None, "version_name": None, "min_sdk": None, "target_sdk": None
+        }
+        if any(f"{{{key}" in template for key in ("package", "version_code", "version_name", "min_sdk", "target_sdk")):
+            fields.update(read_manifest(apk_path) or {})
+        try:
+            name = template.format(**{key: "unknown" if value is None else value for key, value in fields.items()})
+        except (KeyError, IndexError, ValueError) as e:
+            logging.warning(f"Invalid OUTPUT_NAME_TEMPLATE {template!r} ({e}); using the default name")
+            name = "{stem}_signed_{timestamp}".format(**fields)
+        name = re.sub(r"[^\w.-]", "_", name)
+        suffix = Path(apk_path).suffix or ".apk"
+        # Templates without {stem} can map several inputs to one name within the same second
+        output_path, n = output_dir / f"{name}{suffix}", 1
+        while output_path.exists():
+            output_path, n = output_dir / f"{name}_{n}{suffix}", n + 1
+        return output_path
+    
+    def _sign_steps(self, tools, apk_path, output_path):
+        """Pipeline steps for one APK as (step name, command, files read, files written).
+        
+        A command is either an argument list for run_cmd or, for in-process
+        steps, a callable taking no arguments.
+        """
+        steps = []
+        bundle = apk_path.lower().endswith(".aab")  # app bundles only carry a JAR signature
+        native_v1 = self.config_manager.get("V1_SIGNER", "jarsigner") == "native"
+        v1 = self.v1_needed(apk_path)
+        jarsigner = [
+            tools["jarsigner"], "-verbose", "-sigalg", "SHA256withRSA", 
+            "-digestalg", "SHA-256", "-keystore", self.config_manager.get("KEYSTORE"), 
+            "-storepass", self.config_manager.get("STOREPASS"), 
+            "-keypass", self.config_manager.get("KEYPASS")
+        ]
+        if native_v1 and (bundle or v1):
+            # Writes a new, already aligned archive, so zipalign is not needed afterwards
+            steps.append(("Native v1 Signing", functools.partial(
+                sign_v1, apk_path, str(output_path), self.load_signing_key(), self.v1_signer_name(),
+                v2_signed=not bundle, workers=int(self.config_manager.get("DIGEST_WORKERS", 0)) or None
+            ), [apk_path], [output_path]))
+        elif bundle:
+            steps.append(("Jarsigner Signing", jarsigner + [
+                "-signedjar", str(output_path), apk_path, self.config_manager.get("ALIAS")
+            ], [apk_path], [output_path]))
+        elif v1:
+            steps.append(("Jarsigner Signing", jarsigner + [
+                apk_path, self.config_manager.get("ALIAS")
+            ], [apk_path], [apk_path]))
+        
+        if bundle:
+            steps.append(("Verify Bundle", [
+                tools["jarsigner"], "-verify", str(output_path)
+            ], [output_path], []))
+            return steps
+        if not steps and self._already_aligned(apk_path):
+            # Nothing rewrites the input before this point, so zipalign would only copy it
+            steps.append(("Copy Aligned APK", functools.partial(clone_file, apk_path, str(output_path)),
+                          [apk_path], [output_path]))
+        elif not steps or steps[0][0] != "Native v1 Signing":
+            steps.append(("Zipalign APK", [
+                tools["zipalign"], "-v", "-p", "4", apk_path, str(output_path)
+            ], [apk_path], [output_path]))
+        
+        if self.config_manager.get("V2_SIGNER", "apksigner") == "native":
+            # Only the tail after the aligned entries is rewritten; no JVM, no second copy
+            steps.append(("Native v2 Signing", functools.partial(
+                sign_v2_in_place, str(output_path), self.load_signing_key(),
+                workers=int(self.config_manager.get("DIGEST_WORKERS", 0)) or None
+            ), [output_path], [output_path]))
+        else:
+            cmd = [
+                tools["apksigner"], "sign", "--ks", self.config_manager.get("KEYSTORE"), 
+                f"--ks-pass=pass:{self.config_manager.get('STOREPASS')}", 
+                f"--key-pass=pass:{self.config_manager.get('KEYPASS')}", 
+                "--ks-key-alias", self.config_manager.get("ALIAS")
+            ]
+            if not v1 or native_v1:
+                # With the native v1 step apksigner must keep its JAR signature instead of regenerating it
+                cmd += ["--v1-signing-enabled", "false"]
+            if self.config_manager.get("V4_SIGNING", False):
+                cmd += ["--v4-signing-enabled", "false"]  # written by the native step below
+            steps.append(("Apksigner Signing", cmd + [str(output_path)], [output_path], [output_path]))
+        
+        if self.config_manager.get("V4_SIGNING", False):
+            # The .idsig covers the final bytes of the APK, so it comes after every change to it
+            idsig_path = f"{output_path}.idsig"
+            steps.append(("Native v4 Signing", functools.partial(
+                write_v4_signature, str(output_path), self.load_signing_key(), idsig_path,
+                workers=int(self.config_manager.get("DIGEST_WORKERS", 0)) or None
+            ), [output_path], [idsig_path]))
+        
+        steps.append(("Verify APK", [
+            tools["apksigner"], "verify", str(output_path)
+        ], [output_path], []))
+        return steps
+    
+    def _record_signed(self, apk_path, job_id, output_path, original_hash, signed_hash, stages, job_start, journal):
+        """Journal, history and metrics bookkeeping for a successful signing job"""
+        if journal:
+            journal.record(
+                apk_path, "verified", output=str(output_path), signed_hash=signed_hash,
+                signed_size=os.path.getsize(output_path)
+            )
+        
+        # Add to history
+        history_entry = {
+            "timestamp": datetime.datetime.now().isoformat(),
+            "job_id": job_id,
+            "original_apk": apk_path,
+            "signed_apk": str(output_path),
+            "original_hash": original_hash,
+            "signed_hash": signed_hash,
+            "status": "success",
+            "total_wall_s": round(time.perf_counter() - job_start, 4),
+            "stages": {timer.name: timer.to_dict() for timer in stages}
+        }
+        manifest = read_manifest(output_path)
+        if manifest:
+            history_entry["manifest"] = manifest
+        history_entry["certificates"] = self.certificate_info(output_path, signed_hash)
+        if "Native v4 Signing" in history_entry["stages"]:
+            history_entry["idsig"] = f"{output_path}.idsig"
+        with self.history_lock:
+            self.history.append(history_entry)
+            self.save_history()
+        
+        for timer in stages:
+            self._record_stage(timer)
+        logging.info(f"Signed {Path(apk_path).name} -> {output_path}",
+                     extra={"duration_s": history_entry["total_wall_s"]})
+        self._job_finished("sign", True, time.perf_counter() - job_start)
+        return history_entry
+    
+    def _record_sign_failure(self, apk_path, error, job_start, journal, progress_queue):
+        logging.error(f"Signing {Path(apk_path).name} failed: {error}",
+                      extra={"duration_s": round(time.perf_counter() - job_start, 4)})
+        self._job_finished("sign", False, time.perf_counter() - job_start)
+        if journal:
+            journal.record(apk_path, "failed", error=str(error))
+        if progress_queue:
+            progress_queue.put(("failed", str(error)))
+    
+    def calculate_hash(self, file_path):
+        sha256_hash = hashlib.sha256()
+        with open(file_path, "rb") as f:
+            for byte_block in iter(lambda: f.read(4096), b""):
+                sha256_hash.update(byte_block)
+        return sha256_hash.hexdigest()
+    
+    @profiled("batch_sign")
+    def batch_sign(self, apk_paths, progress_queue=None):
+        results = [result.to_dict() for result in self.iter_batch_sign(apk_paths, progress_queue)]
+        if progress_queue:
+            progress_queue.put(("batch_complete", results))
+        return results
+    
+    def iter_batch_sign(self, apk_paths, progress_queue=None):
+        """Sign a batch, yielding a SignResult as each APK finishes.
+        
+        Resumes an interrupted batch from its journal. If the caller stops
+        iterating early the journal stays open, so the rest of the batch can
+        be resumed later.
+        """
+        apk_paths = list(apk_paths)
+        total = len(apk_paths)
+        journal = BatchJournal.open(apk_paths)
+        with log_context(batch_id=journal.batch_id):
+            if journal.resumed:
+                logging.info(f"Resuming batch {journal.batch_id}: {len(journal.completed())}/{total} already done")
+        
+        tracer = None
+        if self.config_manager.get("TRACE_BATCHES", True):
+            tracer = TraceRecorder(f"batch_{journal.batch_id}_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}")
+            # The span binds to the recorder active when it is created
+            previous_tracer = tracer.activate()
+            batch_span = trace_span(f"batch of {total}", "batch", batch_id=journal.batch_id, apks=total)
+            TraceRecorder.deactivate(previous_tracer)
+        
+        finished = False
+        try:
+            for i, apk_path in enumerate(apk_paths, 1):
+                self.metrics.set_gauge("apk_signer_queue_depth", total - i + 1,
+                                       help_text="APKs waiting to be processed", queue="batch")
+                # The trace and log context are only active while this batch's work runs, not between yields
+                previous_tracer = tracer.activate() if tracer else None
+                try:
+                    with log_context(batch_id=journal.batch_id):
+                        result = self._batch_item(apk_path, i, total, journal, progress_queue)
+                finally:
+                    if tracer:
+                        TraceRecorder.deactivate(previous_tracer)
+                yield result
+            finished = True
+        finally:
+            if finished:
+                journal.finish()
+            else:
+                journal.close()
+            if tracer:
+                previous_tracer = tracer.activate()
+                batch_span.finish()
+                TraceRecorder.deactivate(previous_tracer)
+                try:
+                    logging.info(f"Batch trace written to {tracer.write()}")
+                except OSError as e:
+                    logging.error(f"Error writing batch trace: {e}")
+            self.metrics.set_gauge("apk_signer_queue_depth", 0, help_text="APKs waiting to be processed", queue="batch")
+            if finished:
+                self.metrics.inc("apk_signer_batches_total", help_text="Batches completed")
+            self.publish_metrics()
+    
+    async def abatch_sign(self, apk_paths, progress_queue=None):
+        """Async iterator over iter_batch_sign; the signing itself runs in a worker thread"""
+        results = self.iter_batch_sign(apk_paths, progress_queue)
+        pending = None
+        try:
+            while True:
+                # Shielded, so a cancelled consumer leaves the worker's next() running to completion
+                pending = asyncio.ensure_future(asyncio.to_thread(next, results, None))
+                result = await asyncio.shield(pending)
+                if result is None:
+                    break
+                yield result
+        finally:
+            if pending is not None and not pending.done():
+                # close() raises "generator already executing" while next() is still inside it
+                await asyncio.wait([pending])
+                if not pending.cancelled():
+                    pending.exception()  # the consumer is gone; retrieve it so it is not reported as unhandled
+            await asyncio.to_thread(results.close)
+    
+    def _batch_item(self, apk_path, i, total, journal, progress_queue):
+        done = journal.completed_entry(apk_path)
+        if done:
+            if progress_queue:
+                progress_queue.put(("batch_progress", i / total, f"Already signed {Path(apk_path).name}"))
+                progress_queue.put(("batch_item", apk_path, "resumed", done.get("signed_hash")))
+            return SignResult.from_journal(apk_path, done)
         
-        log_file = log_dir / f"apk_signer_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.log"
+        if progress_queue:
+            progress_queue.put(("batch_progress", i / total, f"Processing {Path(apk_path).name}"))
+            progress_queue.put(("batch_item", apk_path, "signing", None))
         
-        # Get log level with default
-        log_level_name = self.config_manager.get("LOG_LEVEL", "INFO")
-        log_level = getattr(logging, log_level_name, logging.INFO)
+        result = self.sign(apk_path, progress_queue, journal)
+        result.apk_path = apk_path  # report the path as the caller gave it
+        if progress_queue:
+            progress_queue.put(("batch_item", apk_path, result.status, result.signed_hash))
+        return result
+    
+    def verify_apk(self, apk_path, progress_queue=None):
+        job_start = time.perf_counter()
+        self._job_started("verify")
+        try:
+            tools = self.verify_tools()
+            apk_path = str(Path(apk_path).resolve())
+            
+            if progress_queue:
+                progress_queue.put(("log", f"Verifying APK: {apk_path}"))
+            
+            # Verify APK signature
+            cmd = [tools["apksigner"], "verify", apk_path]
+            self.run_cmd(cmd, "Verify APK", progress_queue)
+            
+            # Signer certificates are parsed in-process; apksigner only if that finds none
+            output = format_certificates(self.certificate_info(apk_path))
+            if not output:
+                cmd = [tools["apksigner"], "verify", "--print-certs", apk_path]
+                output = self.run_cmd(cmd, "Get APK Info", progress_queue)
+            
+            if progress_queue:
+                progress_queue.put(("verify_complete", output))
+            
+            self._job_finished("verify", True, time.perf_counter() - job_start)
+            return True
+        except Exception as e:
+            self._job_finished("verify", False, time.perf_counter() - job_start)
+            if progress_queue:
+                progress_queue.put(("verify_failed", str(e)))
+            return False
+
+# ------------------- Async Engine -------------------
+class LoopEventBuffer:
+    """Progress queue wrapper that never blocks the event loop thread.
+    
+    Events go straight to the target when it has room; otherwise they wait,
+    in order, in a buffer that a task on the loop flushes as room frees up.
+    Executor threads may block as before, but queue behind buffered events.
+    """
+    
+    DRAIN_INTERVAL = 0.05
+    
+    def __init__(self, target):
+        self.target = target
+        self.loop = asyncio.get_running_loop()
+        self.loop_thread = threading.get_ident()
+        self.pending = collections.deque()
+        self.drainer = None
+    
+    def put(self, event, block=True, timeout=None):
+        if threading.get_ident() != self.loop_thread:
+            if self.pending:
+                self.loop.call_soon_threadsafe(self.put, event)
+            else:
+                self.target.put(event, block, timeout)
+            return
+        if not self.pending:
+            try:
+                self.target.put(event, block=False)
+                return
+            except queue.Full:
+                pass
+        self.pending.append(event)
+        if self.drainer is None or self.drainer.done():
+            self.drainer = self.loop.create_task(self._drain())
+    
+    async def _drain(self):
+        while self.pending:
+            try:
+                self.target.put(self.pending[0], block=False)
+            except queue.Full:
+                await asyncio.sleep(self.DRAIN_INTERVAL)
+                continue
+            self.pending.popleft()
+    
+    async def flush(self):
+        """Wait until every buffered event reached the target"""
+        if self.drainer:
+            await self.drainer
+
+
+class BatchFeed:
+    """Paths added to a running batch from another thread (e.g. a folder scan still in progress).
+    
+    Iterating yields each chunk handed to put() until close() is called.
+    """
+    
+    def __init__(self, loop):
+        self.loop = loop
+        self.chunks = asyncio.Queue()
+        self.closed = False
+    
+    def put(self, paths):
+        if paths and not self.closed:
+            self.loop.call_soon_threadsafe(self.chunks.put_nowait, list(paths))
+    
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.loop.call_soon_threadsafe(self.chunks.put_nowait, None)
+    
+    def __aiter__(self):
+        return self
+    
+    async def __anext__(self):
+        chunk = await self.chunks.get()
+        if chunk is None:
+            raise StopAsyncIteration
+        return chunk
+
+
+class ReapedProcess:
+    """asyncio view of a Popen child that is reaped with os.wait4 (POSIX).
+    
+    asyncio's own subprocess support reaps children in its watcher, which
+    discards their rusage; reaping here lets the tool's CPU time and block
+    I/O be charged to the stage that ran it. The exit is noticed through a
+    pidfd on the event loop (Linux 5.3+), or else by one blocking wait4 on
+    a thread of its own, so nothing polls and the shared executor is not used.
+    """
+    
+    def __init__(self, popen, stdout, transport):
+        self.popen = popen
+        self.pid = popen.pid
+        self.stdout = stdout
+        self.transport = transport
+        self._exited = None
+        self._charged = False
+    
+    @classmethod
+    async def start(cls, cmd):
+        popen = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        reader = asyncio.StreamReader()
+        transport, _ = await asyncio.get_running_loop().connect_read_pipe(
+            lambda: asyncio.StreamReaderProtocol(reader), popen.stdout
+        )
+        return cls(popen, reader, transport)
+    
+    def kill(self):
+        if self.popen.returncode is None:
+            os.kill(self.pid, signal.SIGKILL)  # Popen.kill() would poll, and so reap, first
+    
+    def _reaped(self, status, usage):
+        # Set at once, so kill() never signals a pid that may already have been reused
+        self.popen.returncode = os.waitstatus_to_exitcode(status)
+        if not self._exited.done():
+            self._exited.set_result(usage)
+    
+    def _watch_exit(self, loop):
+        self._exited = loop.create_future()
+        try:
+            pidfd = os.pidfd_open(self.pid)
+        except (AttributeError, OSError):  # not Linux, Linux before 5.3, or Python before 3.9
+            pidfd = None
+        if pidfd is not None:
+            def readable():
+                loop.remove_reader(pidfd)
+                os.close(pidfd)
+                _, status, usage = os.wait4(self.pid, 0)  # the pidfd is readable once the child exited
+                self._reaped(status, usage)
+            loop.add_reader(pidfd, readable)
+            return
         
-        logging.basicConfig(
-            filename=log_file,
-            level=log_level,
-            format='%(asctime)s - %(levelname)s - %(message)s',
-            datefmt='%Y-%m-%d %H:%M:%S'
+        def reap():
+            _, status, usage = os.wait4(self.pid, 0)
+            loop.call_soon_threadsafe(self._reaped, status, usage)
+        threading.Thread(target=reap, name=f"reap-{self.pid}", daemon=True).start()
+    
+    async def wait(self):
+        if self._exited is None:
+            self._watch_exit(asyncio.get_running_loop())
+        # Shielded: a cancelled wait (e.g. a timeout) must not lose the exit for the next one
+        usage = await asyncio.shield(self._exited)
+        if not self._charged:
+            self._charged = True
+            StageTimer.charge(usage.ru_utime + usage.ru_stime, usage.ru_inblock * RUSAGE_BLOCK_SIZE,
+                              usage.ru_oublock * RUSAGE_BLOCK_SIZE)
+        self.transport.close()
+        return self.popen.returncode
+
+
+class AsyncSigningEngine:
+    """asyncio driver for AdvancedApkSigner.
+    
+    Tools run as asyncio subprocesses and hashing runs in a small thread pool,
+    so one event loop can keep hundreds of jobs in flight. Each step holds a
+    slot of the resource it mostly uses: "jvm" for jarsigner/apksigner,
+    "disk" for zipalign and hashing. Results, history, journal and progress
+    events are the same as the threaded code path.
+    """
+    
+    CMD_TIMEOUT = 300
+    DISK_STEPS = ("Zipalign APK", "Copy Aligned APK")
+    
+    def __init__(self, signer, jvm_slots=None, disk_slots=None, job_limit=None):
+        config = signer.config_manager
+        self.signer = signer
+        self.limits = {
+            "jvm": jvm_slots or int(config.get("ASYNC_JVM_SLOTS", 0)) or os.cpu_count() or 2,
+            "disk": disk_slots or int(config.get("ASYNC_DISK_SLOTS", 4))
+        }
+        self.job_limit = job_limit or int(config.get("ASYNC_JOB_LIMIT", 64))
+        self.scheduler = None  # set to a JobScheduler to route batch jobs through it
+        self.executor = ThreadPoolExecutor(max_workers=self.limits["disk"] + 2, thread_name_prefix="async-io")
+        self._loop = None
+        self._semaphores = {}
+    
+    def _slot(self, resource):
+        # asyncio primitives belong to one loop; rebuild them if the engine moves to another
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._loop = loop
+            self._semaphores = {name: asyncio.Semaphore(limit) for name, limit in self.limits.items()}
+        return self._semaphores[resource]
+    
+    async def _offload(self, func, *args, **kwargs):
+        """Run blocking bookkeeping (fsync, history writes) off the event loop.
+        
+        run_in_executor does not carry context variables over, so the call
+        runs in a copy of the caller's context: log lines keep their job and
+        batch ids, and stage timers and traces stay attached.
+        """
+        return await asyncio.get_running_loop().run_in_executor(
+            self.executor, functools.partial(contextvars.copy_context().run, Profiler.in_worker, func, *args, **kwargs)
         )
+    
+    @staticmethod
+    def _events(progress_queue):
+        # A full GUI queue would block put() and with it every job on the loop; other sinks never block
+        if not isinstance(progress_queue, queue.Queue):
+            return progress_queue
+        return LoopEventBuffer(progress_queue)
+    
+    async def _offload_timed(self, func, *args):
+        """_offload for stage work: the worker thread's CPU time and I/O are charged to the current stage"""
+        return await self._offload(StageTimer.timed, func, *args)
+    
+    async def hash_file(self, path):
+        async with self._slot("disk"):
+            return await self._offload_timed(self.signer.calculate_hash, str(path))
+    
+    async def run_cmd(self, cmd, step_name, progress_queue=None, total_entries=None, resource="jvm"):
+        display_cmd = " ".join(redact_cmd(cmd))
+        logging.info(f"Step: {step_name} | Command: {display_cmd}")
+        if progress_queue:
+            progress_queue.put(("log", f"Running: {display_cmd}"))
+        
+        summary = ToolOutputSummary(step_name, total_entries)
+        async with self._slot(resource):
+            cmd_start = time.perf_counter()
+            with trace_span(step_name, "cmd", cmd=display_cmd):
+                try:
+                    if os.name == "nt":  # .bat wrappers need the shell
+                        process = await asyncio.create_subprocess_shell(
+                            subprocess.list2cmdline([str(c) for c in cmd]),
+                            stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT
+                        )
+                    else:
+                        process = await ReapedProcess.start([str(c) for c in cmd])
+                    with open_tool_output(step_name, int(self.signer.config_manager.get("TOOL_OUTPUT_KEEP", 200))) as output_file:
+                        try:
+                            returncode = await asyncio.wait_for(
+                                self._pump(process, output_file, summary, step_name, progress_queue), self.CMD_TIMEOUT
+                            )
+                        except asyncio.TimeoutError:
+                            process.kill()
+                            await process.wait()
+                            raise subprocess.TimeoutExpired(cmd, self.CMD_TIMEOUT)
+                    return self.signer._finish_cmd(step_name, summary, returncode, output_file.name, cmd_start, progress_queue)
+                except subprocess.TimeoutExpired:
+                    error_msg = f"Timeout in {step_name}"
+                    logging.error(error_msg)
+                    if progress_queue:
+                        progress_queue.put(("error", error_msg))
+                    raise RuntimeError(error_msg)
+                except Exception as e:
+                    error_msg = f"Exception in {step_name}: {str(e)}"
+                    logging.error(error_msg)
+                    if progress_queue:
+                        progress_queue.put(("error", error_msg))
+                    raise
+    
+    async def _pump(self, process, output_file, summary, step_name, progress_queue):
+        last_update = 0.0
+        while True:
+            raw = await process.stdout.readline()
+            if not raw:
+                break
+            line = raw.decode("utf-8", errors="replace")
+            output_file.write(line)
+            if summary.feed(line) and progress_queue:
+                now = time.perf_counter()
+                if now - last_update >= 0.1:
+                    last_update = now
+                    progress_queue.put(("tool_progress", step_name, summary.entries, summary.total_entries))
+        return await process.wait()
+    
+    async def sign(self, apk_path, progress_queue=None, journal=None):
+        """Sign one APK; returns a SignResult, like AdvancedApkSigner.sign"""
+        apk_path = str(Path(apk_path).resolve())
+        progress_queue = self._events(progress_queue)
+        job_id = current_log_context().get("job_id") or uuid.uuid4().hex[:12]
+        with log_context(job_id=job_id, apk=Path(apk_path).name):
+            _trace_lane.set(f"job {job_id}")  # task-local: this job gets its own trace row
+            job_start = time.perf_counter()
+            try:
+                entry = await self._sign(apk_path, job_id, job_start, progress_queue, journal)
+                return SignResult.from_history(entry)
+            except Exception as e:
+                await self._offload(self.signer._record_sign_failure, apk_path, e, job_start, journal, progress_queue)
+                return SignResult(apk_path, "failed", error=str(e), job_id=job_id,
+                                  wall_s=round(time.perf_counter() - job_start, 4))
+    
+    async def _sign(self, apk_path, job_id, job_start, progress_queue, journal):
+        signer = self.signer
+        signer._job_started("sign")
+        with trace_span(f"sign {Path(apk_path).name}", "job", apk=apk_path):
+            # Toolchain lookup, output naming and step planning touch the disk (and may export
+            # the key through keytool/openssl), so none of it runs on the loop thread
+            tools = await self._offload(signer.verify_tools)
+            output_path = await self._offload(signer._output_path_for, apk_path)
+            async with self._slot("disk"):
+                skipped = await self._offload(signer._skip_signed_input, apk_path,
+                                              job_id, output_path, job_start, journal, progress_queue)
+            if skipped:
+                return skipped
+            stages = []
+            
+            # The loop thread is shared by every job, so only offloaded work and tools count as stage CPU
+            with log_context(stage="Hash Original"), \
+                    StageTimer("Hash Original", reads=[apk_path], thread_cpu=False) as timer:
+                original_hash = await self.hash_file(apk_path)
+            stages.append(timer)
+            entry_count = await self._offload(count_zip_entries, apk_path)
+            if journal:
+                await self._offload(journal.record, apk_path, "signing", track_input=True, output=str(output_path),
+                                    original_hash=original_hash)
+            
+            steps = await self._offload(signer._sign_steps, tools, apk_path, output_path)
+            for i, (step_name, cmd, reads, writes) in enumerate(steps, 1):
+                if progress_queue:
+                    progress_queue.put(("progress", i / len(steps), step_name))
+                resource = "disk" if step_name in self.DISK_STEPS else "jvm"
+                with log_context(stage=step_name), StageTimer(step_name, reads, writes, thread_cpu=False) as timer:
+                    if callable(cmd):
+                        # In-process steps are I/O and hashing bound; the copied context carries logging and tracing
+                        async with self._slot("disk"):
+                            await self._offload_timed(signer.run_native, cmd, step_name, progress_queue)
+                    else:
+                        await self.run_cmd(cmd, step_name, progress_queue, entry_count, resource)
+                stages.append(timer)
+                if journal and step_name in signer.SIGNED_STEPS:
+                    await self._offload(journal.record, apk_path, "signed", output=str(output_path))
+            
+            with log_context(stage="Hash Signed"), \
+                    StageTimer("Hash Signed", reads=[output_path], thread_cpu=False) as timer:
+                signed_hash = await self.hash_file(output_path)
+            stages.append(timer)
+            
+            history_entry = await self._offload(signer._record_signed, apk_path, job_id, output_path, original_hash,
+                                                signed_hash, stages, job_start, journal)
+        if progress_queue:
+            progress_queue.put(("complete", str(output_path)))
+        return history_entry
+    
+    async def verify(self, apk_path, progress_queue=None):
+        """Async counterpart of AdvancedApkSigner.verify_apk"""
+        job_start = time.perf_counter()
+        progress_queue = self._events(progress_queue)
+        self.signer._job_started("verify")
+        try:
+            tools = await self._offload(self.signer.verify_tools)
+            apk_path = str(Path(apk_path).resolve())
+            
+            if progress_queue:
+                progress_queue.put(("log", f"Verifying APK: {apk_path}"))
+            
+            await self.run_cmd([tools["apksigner"], "verify", apk_path], "Verify APK", progress_queue)
+            async with self._slot("disk"):
+                output = format_certificates(await self._offload(self.signer.certificate_info, apk_path))
+            if not output:
+                output = await self.run_cmd([tools["apksigner"], "verify", "--print-certs", apk_path], "Get APK Info", progress_queue)
+            
+            if progress_queue:
+                progress_queue.put(("verify_complete", output))
+            
+            self.signer._job_finished("verify", True, time.perf_counter() - job_start)
+            return True
+        except Exception as e:
+            self.signer._job_finished("verify", False, time.perf_counter() - job_start)
+            if progress_queue:
+                progress_queue.put(("verify_failed", str(e)))
+            return False
+    
+    async def _pool(self, items, handler, priority="bulk", group=None, more=None):
+        """Run handler over items with at most job_limit in flight; yields results as they finish.
+        
+        With a scheduler attached, every item is queued there instead (largest file first).
+        more, if given, is an async iterable of further item lists; the pool
+        keeps going until it is exhausted and every item has finished.
+        """
+        results = asyncio.Queue()
+        feed_done = object()
+        submitted = 0
+        futures = []
+        pending = asyncio.Queue()
+        
+        async def run_one(i, item):
+            try:
+                result = await handler(i, item)
+            except Exception as e:
+                result = e
+            await results.put(result)
+        
+        def add(batch):
+            nonlocal submitted
+            for item in batch:
+                submitted += 1
+                if not self.scheduler:
+                    pending.put_nowait((submitted, item))
+                    continue
+                try:
+                    weight = os.path.getsize(item)
+                except (OSError, TypeError):
+                    weight = 0
+                futures.append(self.scheduler.submit(functools.partial(run_one, submitted, item),
+                                                     priority, group, weight, str(item)))
+        
+        async def worker():
+            while True:
+                i, item = await pending.get()
+                await run_one(i, item)
         
-        # Add console handler
-        console = logging.StreamHandler()
-        console.setLevel(log_level)
-        formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
-        console.setFormatter(formatter)
-        logging.getLogger().addHandler(console)
+        async def feed():
+            try:
+                async for batch in more:
+                    add(batch)
+            except Exception as e:
+                await results.put(e)
+            await results.put(feed_done)
+        
+        add(items)
+        tasks = []
+        if not self.scheduler:
+            tasks = [asyncio.create_task(worker()) for _ in range(self.job_limit if more else min(self.job_limit, submitted))]
+        if more is not None:
+            tasks.append(asyncio.create_task(feed()))
+        feeding, received = more is not None, 0
+        try:
+            while feeding or received < submitted:
+                result = await results.get()
+                if result is feed_done:
+                    feeding = False
+                    continue
+                if isinstance(result, Exception):
+                    raise result
+                received += 1
+                yield result
+        finally:
+            for task in tasks:
+                task.cancel()
+            for future in futures:
+                future.cancel()
+    
+    async def sign_many(self, apk_paths, progress_queue=None, feed=None, batch_id=None):
+        """Sign a batch concurrently, yielding SignResults in completion order (resumable like iter_batch_sign).
         
-        logging.info(f"APK Signer started. Log file: {log_file}")
+        feed (a BatchFeed) adds APKs while the batch runs; they are journaled
+        under the same batch, which batch_id resumes later.
+        """
+        apk_paths = list(apk_paths)
+        total = len(apk_paths)
+        progress_queue = self._events(progress_queue)
+        journal = await self._offload(BatchJournal.open, apk_paths, batch_id)
+        tracer = None
+        if self.signer.config_manager.get("TRACE_BATCHES", True):
+            tracer = TraceRecorder(f"batch_{journal.batch_id}_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}")
+            previous_tracer = tracer.activate()
+            batch_span = trace_span(f"batch of {total}", "batch", batch_id=journal.batch_id, apks=total)
+            TraceRecorder.deactivate(previous_tracer)
+        done_count = 0
+        
+        async def handle(i, apk_path):
+            nonlocal done_count
+            with log_context(batch_id=journal.batch_id):
+                if tracer:
+                    tracer.activate()  # task-local
+                entry = journal.completed_entry(apk_path)
+                if entry:
+                    result = SignResult.from_journal(apk_path, entry)
+                else:
+                    if progress_queue:
+                        progress_queue.put(("batch_item", apk_path, "signing", None))
+                    result = await self.sign(apk_path, progress_queue, journal)
+                    result.apk_path = apk_path
+            done_count += 1
+            self.signer.metrics.set_gauge("apk_signer_queue_depth", total - done_count,
+                                          help_text="APKs waiting to be processed", queue="batch")
+            if progress_queue:
+                status = "resumed" if result.resumed else result.status
+                progress_queue.put(("batch_progress", done_count / total, f"{status}: {Path(apk_path).name}"))
+                progress_queue.put(("batch_item", apk_path, status, result.signed_hash))
+            return result
+        
+        async def added_paths():
+            nonlocal total
+            async for chunk in feed:
+                added = await self._offload(journal.extend, chunk)
+                total += len(added)
+                if added:
+                    yield added
+        
+        finished = False
+        try:
+            async for result in self._pool(apk_paths, handle, "bulk", journal.batch_id, feed and added_paths()):
+                yield result
+            finished = True
+        finally:
+            await self._offload(journal.finish if finished else journal.close)
+            if tracer:
+                batch_span.finish()
+                try:
+                    logging.info(f"Batch trace written to {await self._offload(tracer.write)}")
+                except OSError as e:
+                    logging.error(f"Error writing batch trace: {e}")
+            self.signer.metrics.set_gauge("apk_signer_queue_depth", 0, help_text="APKs waiting to be processed", queue="batch")
+            if finished:
+                self.signer.metrics.inc("apk_signer_batches_total", help_text="Batches completed")
+            await self._offload(self.signer.publish_metrics)
+    
+    async def sign_batch(self, apk_paths, progress_queue=None, feed=None, batch_id=None):
+        """Concurrent batch_sign: list of result dicts plus the batch_complete event"""
+        progress_queue = self._events(progress_queue)
+        results = [result.to_dict() async for result in self.sign_many(apk_paths, progress_queue, feed, batch_id)]
+        if progress_queue:
+            progress_queue.put(("batch_complete", results))
+            await progress_queue.flush()
+        return results
+    
+    async def verify_many(self, apk_paths, progress_queue=None):
+        """Verify APKs concurrently, yielding (path, ok) as each finishes"""
+        progress_queue = self._events(progress_queue)
+        
+        async def handle(i, apk_path):
+            return apk_path, await self.verify(apk_path, progress_queue)
+        
+        async for result in self._pool(apk_paths, handle, "verify"):
+            yield result
+
+
+class AsyncBridge:
+    """Event loop on a background thread that Tk callbacks and other sync code submit coroutines to"""
+    
+    def __init__(self, name="async-engine"):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self.thread.start()
+    
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+    
+    def submit(self, coro):
+        """Schedule coro on the loop; returns a concurrent.futures.Future"""
+        future = asyncio.run_coroutine_threadsafe(coro, self.loop)
+        future.add_done_callback(self._log_failure)
+        return future
+    
+    @staticmethod
+    def _log_failure(future):
+        if not future.cancelled() and future.exception():
+            logging.error(f"Async job failed: {future.exception()}")
+    
+    def stop(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+# ------------------- Job Scheduler -------------------
+class JobScheduler:
+    """Priority scheduler for signing jobs on the async engine's loop.
+    
+    Jobs belong to a priority class (interactive > verify > bulk) and an
+    optional group (a batch). Within a class, groups take turns so two
+    batches share the slots fairly; within a group the largest APK starts
+    first, so the long jobs do not end up at the tail of a batch. Slots
+    beyond `reserved_interactive` are the only ones non-interactive jobs may
+    fill, so a one-off signing never waits behind a full batch.
+    
+    submit() must be called on the loop; other threads use set_max_active().
+    """
+    
+    PRIORITIES = ("interactive", "verify", "bulk")
+    
+    def __init__(self, max_active=2, reserved_interactive=1, metrics=None):
+        self.max_active = max(1, int(max_active))
+        self.reserved_interactive = max(0, int(reserved_interactive))
+        self.metrics = metrics
+        self.queues = {priority: {} for priority in self.PRIORITIES}
+        self.rotation = {priority: collections.deque() for priority in self.PRIORITIES}
+        self.running = {priority: 0 for priority in self.PRIORITIES}
+        self.waiting = 0  # plain counter, safe to read from other threads
+        self._seq = itertools.count()
+        self._loop = None
+    
+    def submit(self, factory, priority="bulk", group=None, weight=0, label=None):
+        """Queue factory (a coroutine function); returns a future for its result"""
+        if priority not in self.PRIORITIES:
+            raise ValueError(f"Unknown priority: {priority}")
+        self._loop = asyncio.get_running_loop()
+        future = self._loop.create_future()
+        seq = next(self._seq)
+        if group is None:
+            group, weight = "", 0  # ungrouped jobs run first come, first served
+        heapq.heappush(self.queues[priority].setdefault(group, []), (-weight, seq, factory, future, label))
+        self.waiting += 1
+        if group not in self.rotation[priority]:
+            self.rotation[priority].append(group)
+        self._dispatch()
+        return future
+    
+    async def run(self, factory, priority="bulk", group=None, weight=0, label=None):
+        return await self.submit(factory, priority, group, weight, label)
+    
+    def set_max_active(self, max_active):
+        """Change the number of concurrent jobs (safe to call from any thread)"""
+        def apply():
+            self.max_active = max(1, int(max_active))
+            self._dispatch()
+        if self._loop and self._loop.is_running():
+            self._loop.call_soon_threadsafe(apply)
+        else:
+            self.max_active = max(1, int(max_active))
+    
+    def active(self):
+        return sum(self.running.values())
+    
+    def queued(self, priority=None):
+        priorities = [priority] if priority else self.PRIORITIES
+        return sum(len(heap) for p in priorities for heap in self.queues[p].values())
+    
+    def stats(self):
+        return {
+            "max_active": self.max_active,
+            "running": dict(self.running),
+            "queued": {priority: self.queued(priority) for priority in self.PRIORITIES}
+        }
+    
+    def _limit_for(self, priority):
+        if priority == "interactive" or self.max_active <= self.reserved_interactive:
+            return self.max_active
+        return self.max_active - self.reserved_interactive
+    
+    def _next_job(self):
+        for priority in self.PRIORITIES:
+            if self.active() >= self._limit_for(priority):
+                continue
+            groups, rotation = self.queues[priority], self.rotation[priority]
+            while rotation:
+                group = rotation.popleft()
+                heap = groups[group]
+                while heap and heap[0][3].cancelled():
+                    heapq.heappop(heap)
+                    self.waiting -= 1
+                if not heap:
+                    del groups[group]
+                    continue
+                entry = heapq.heappop(heap)
+                self.waiting -= 1
+                if heap:
+                    rotation.append(group)  # back of the line: the next group goes first
+                else:
+                    del groups[group]
+                return priority, entry
+        return None
+    
+    def _dispatch(self):
+        while self.active() < self.max_active:
+            job = self._next_job()
+            if job is None:
+                break
+            priority, entry = job
+            self.running[priority] += 1
+            asyncio.ensure_future(self._run(priority, entry))
+        self._update_metrics()
+    
+    async def _run(self, priority, entry):
+        _, _, factory, future, label = entry
+        try:
+            result = await factory()
+            if not future.done():
+                future.set_result(result)
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+            else:
+                logging.error(f"Scheduled job {label or ''} failed: {e}")
+        finally:
+            self.running[priority] -= 1
+            self._dispatch()
+    
+    def _update_metrics(self):
+        if not self.metrics:
+            return
+        for priority in self.PRIORITIES:
+            self.metrics.set_gauge("apk_signer_queue_depth", self.queued(priority),
+                                   help_text="APKs waiting to be processed", queue=priority)
+            self.metrics.set_gauge("apk_signer_jobs_running", self.running[priority],
+                                   help_text="Jobs currently running", priority=priority)
+
+# ------------------- Adaptive Concurrency -------------------
+class SystemSampler:
+    """Load average, available memory and I/O wait from /proc (Linux only)"""
+    
+    def __init__(self):
+        self.available = os.path.exists("/proc/loadavg") and os.path.exists("/proc/meminfo")
+        self._last_cpu = None
+    
+    @staticmethod
+    def _read_meminfo():
+        values = {}
+        with open("/proc/meminfo", "r") as f:
+            for line in f:
+                name, _, rest = line.partition(":")
+                values[name] = int(rest.split()[0]) // 1024  # kB -> MB
+        return values
+    
+    def _iowait_fraction(self):
+        # Share of CPU time spent waiting on I/O since the previous sample
+        with open("/proc/stat", "r") as f:
+            fields = [int(v) for v in f.readline().split()[1:]]
+        total, iowait = sum(fields), fields[4] if len(fields) > 4 else 0
+        last, self._last_cpu = self._last_cpu, (total, iowait)
+        if not last or total <= last[0]:
+            return 0.0
+        return (iowait - last[1]) / (total - last[0])
+    
+    def sample(self):
+        with open("/proc/loadavg", "r") as f:
+            load1 = float(f.read().split()[0])
+        meminfo = self._read_meminfo()
+        cpus = os.cpu_count() or 1
+        return {
+            "load1": load1,
+            "cpus": cpus,
+            "load_per_cpu": load1 / cpus,
+            "mem_available_mb": meminfo.get("MemAvailable", meminfo.get("MemFree", 0)),
+            "mem_total_mb": meminfo.get("MemTotal", 0),
+            "iowait": self._iowait_fraction()
+        }
+
+
+class ConcurrencyController:
+    """Grows or shrinks a JobScheduler's active-job limit from system load.
+    
+    Every interval it takes one step at most: down when the CPUs are
+    overloaded, I/O wait is high or there is no memory for another JVM; up
+    when the machine is idle enough and jobs are waiting. Decisions are
+    logged and kept in `decisions` for tuning.
+    """
+    
+    def __init__(self, scheduler, config_manager, metrics=None, max_jobs=None):
+        self.scheduler = scheduler
+        self.metrics = metrics
+        self.sampler = SystemSampler()
+        cpus = os.cpu_count() or 1
+        self.min_jobs = max(1, int(config_manager.get("ADAPTIVE_MIN_JOBS", 1)))
+        self.max_jobs = max(self.min_jobs, max_jobs or int(config_manager.get("ADAPTIVE_MAX_JOBS", 0)) or 2 * cpus)
+        self.interval = float(config_manager.get("ADAPTIVE_INTERVAL", 5))
+        self.job_memory_mb = int(config_manager.get("ADAPTIVE_JOB_MEMORY_MB", 400))
+        self.memory_reserve_mb = int(config_manager.get("ADAPTIVE_MEMORY_RESERVE_MB", 512))
+        self.load_high = float(config_manager.get("ADAPTIVE_LOAD_HIGH", 1.5))
+        self.load_low = float(config_manager.get("ADAPTIVE_LOAD_LOW", 0.7))
+        self.iowait_high = float(config_manager.get("ADAPTIVE_IOWAIT_HIGH", 0.25))
+        self.decisions = collections.deque(maxlen=50)
+        self._stop = threading.Event()
+        self._thread = None
+    
+    def decide(self, current, sample, waiting):
+        """Return (new limit, reason) for one sample"""
+        spare_jobs = (sample["mem_available_mb"] - self.memory_reserve_mb) // max(1, self.job_memory_mb)
+        if sample["load_per_cpu"] > self.load_high:
+            target, reason = current - 1, f"load/cpu {sample['load_per_cpu']:.2f} > {self.load_high}"
+        elif sample["iowait"] > self.iowait_high:
+            target, reason = current - 1, f"iowait {sample['iowait']:.0%} > {self.iowait_high:.0%}"
+        elif spare_jobs < 0:
+            target, reason = current - 1, f"only {sample['mem_available_mb']} MB available"
+        elif (waiting and spare_jobs >= 1 and sample["load_per_cpu"] < self.load_low
+              and sample["iowait"] < self.iowait_high / 2):
+            target, reason = current + 1, f"{waiting} jobs waiting, load/cpu {sample['load_per_cpu']:.2f}"
+        else:
+            target, reason = current, "steady"
+        return max(self.min_jobs, min(self.max_jobs, target)), reason
+    
+    def step(self):
+        sample = self.sampler.sample()
+        current = self.scheduler.max_active
+        target, reason = self.decide(current, sample, self.scheduler.waiting)
+        summary = (f"load/cpu {sample['load_per_cpu']:.2f}, {sample['mem_available_mb']} MB free, "
+                   f"iowait {sample['iowait']:.0%}, {self.scheduler.waiting} waiting")
+        if target != current:
+            self.scheduler.set_max_active(target)
+            logging.info(f"Concurrency {current} -> {target}: {reason} ({summary})")
+            self.decisions.append({"time": datetime.datetime.now().isoformat(), "from": current, "to": target,
+                                   "reason": reason, **sample})
+        else:
+            logging.debug(f"Concurrency stays at {current}: {reason} ({summary})")
+        if self.metrics:
+            self.metrics.set_gauge("apk_signer_concurrency_limit", target, help_text="Adaptive active-job limit")
+        return target
+    
+    def _run(self):
+        self.sampler.sample()  # prime the I/O wait counters
+        while not self._stop.wait(self.interval):
+            try:
+                self.step()
+            except (OSError, ValueError) as e:
+                logging.warning(f"Concurrency controller sample failed: {e}")
+    
+    def start(self):
+        if not self.sampler.available:
+            logging.info("Adaptive concurrency disabled: /proc is not available on this platform")
+            return self
+        self.scheduler.set_max_active(max(self.min_jobs, min(self.max_jobs, self.scheduler.max_active)))
+        logging.info(f"Adaptive concurrency between {self.min_jobs} and {self.max_jobs} jobs, every {self.interval:g}s")
+        self._thread = threading.Thread(target=self._run, name="concurrency-controller", daemon=True)
+        self._thread.start()
+        return self
+    
+    def stop(self):
+        self._stop.set()
+
+# ------------------- Signing Daemon -------------------
+def load_daemon_token(path, create=False):
+    """Shared secret for the daemon's Authorization header, kept in an owner-only file"""
+    path = Path(path)
+    if path.exists():
+        if os.name == "posix" and path.stat().st_mode & 0o077:
+            os.chmod(path, 0o600)
+        token = path.read_text().strip()
+        if token:
+            return token
+    if not create:
+        raise RuntimeError(f"No daemon token in {path}; start the daemon first or pass --token-file")
+    token = secrets.token_urlsafe(32)
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w") as f:
+        f.write(token + "\n")
+    return token
+
+
+def is_loopback_host(host):
+    if host.lower() == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host.strip("[]")).is_loopback
+    except ValueError:
+        return False
+
+
+class JobEventSink:
+    """Collects progress events for one daemon job (stands in for a progress queue)"""
+    
+    def __init__(self, job):
+        self.job = job
+    
+    def put(self, event):
+        msg_type, *data = event
+        with self.job.condition:
+            self.job.events.append({"type": msg_type, "data": data})
+            self.job.condition.notify_all()
+
+
+class SigningJob:
+    FINISHED_STATES = ("success", "failed")
+    
+    def __init__(self, action, apk_path):
+        self.job_id = uuid.uuid4().hex[:12]
+        self.action = action
+        self.apk_path = apk_path
+        self.status = "queued"
+        self.result = None
+        self.error = None
+        self.output_path = None
+        self.events = []
+        self.created = datetime.datetime.now().isoformat()
+        self.started = None
+        self.finished = None
+        self.condition = threading.Condition()
+        self.priority = None
+    
+    def is_finished(self):
+        return self.status in self.FINISHED_STATES
+    
+    def set_status(self, status):
+        with self.condition:
+            self.status = status
+            if status == "running":
+                self.started = datetime.datetime.now().isoformat()
+            elif status in self.FINISHED_STATES:
+                self.finished = datetime.datetime.now().isoformat()
+            self.condition.notify_all()
+    
+    def to_dict(self):
+        return {
+            "id": self.job_id,
+            "action": self.action,
+            "apk": self.apk_path,
+            "priority": self.priority,
+            "status": self.status,
+            "result": self.result,
+            "error": self.error,
+            "output": self.output_path,
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished,
+            "events": len(self.events)
+        }
+
+
+class SigningDaemon:
+    """Long-running signing service that keeps one warm AdvancedApkSigner in memory"""
+    
+    ACTIONS = ("sign", "verify")
+    MAX_FINISHED_JOBS = 200
+    
+    LOCAL_HOSTS = ("127.0.0.1", "localhost", "::1")
+    
+    def __init__(self, signer, max_jobs=2, token=None):
+        self.signer = signer
+        self.max_jobs = max(1, int(max_jobs))
+        self.token = token
+        self.allowed_hosts = set(self.LOCAL_HOSTS)
+        self.jobs = {}
+        self.jobs_lock = threading.Lock()
+        self.engine = AsyncSigningEngine(signer)
+        self.scheduler = JobScheduler(self.max_jobs, int(signer.config_manager.get("SCHEDULER_RESERVED_INTERACTIVE", 1)),
+                                      signer.metrics)
+        self.engine.scheduler = self.scheduler
+        self.bridge = AsyncBridge("daemon-loop")
+        self.controller = None
+        if signer.config_manager.get("ADAPTIVE_CONCURRENCY", True):
+            # --max-jobs is the ceiling; the controller backs off below it under load
+            self.controller = ConcurrencyController(self.scheduler, signer.config_manager, signer.metrics,
+                                                    max_jobs=self.max_jobs).start()
+        self.server = None
+    
+    def submit(self, action, apk_path, priority=None):
+        if action not in self.ACTIONS:
+            raise ValueError(f"Unknown action: {action}")
+        if not apk_path or not os.path.isabs(apk_path):
+            raise ValueError(f"APK path must be absolute (the daemon's working directory is not the client's): {apk_path}")
+        if not os.path.isfile(apk_path):
+            raise ValueError(f"APK file not found: {apk_path}")
+        # A single request is treated like the GUI's Sign tab unless the client says otherwise
+        priority = priority or ("verify" if action == "verify" else "interactive")
+        if priority not in JobScheduler.PRIORITIES:
+            raise ValueError(f"Unknown priority: {priority}")
+        
+        job = SigningJob(action, str(Path(apk_path).resolve()))
+        job.priority = priority
+        with self.jobs_lock:
+            self.jobs[job.job_id] = job
+            self._prune_jobs()
+        
+        logging.info(f"Daemon: queued {action} job {job.job_id} ({priority}) for {job.apk_path}")
+        self.bridge.submit(self.scheduler.run(functools.partial(self._run_job, job), priority, label=job.job_id))
+        self._update_queue_metrics()
+        return job
+    
+    def get_job(self, job_id):
+        with self.jobs_lock:
+            return self.jobs.get(job_id)
+    
+    def list_jobs(self):
+        with self.jobs_lock:
+            return list(self.jobs.values())
+    
+    def queue_depth(self):
+        return sum(1 for job in self.list_jobs() if job.status == "queued")
+    
+    def _prune_jobs(self):
+        finished = [job for job in self.jobs.values() if job.is_finished()]
+        for job in finished[:max(0, len(finished) - self.MAX_FINISHED_JOBS)]:
+            del self.jobs[job.job_id]
+    
+    def _update_queue_metrics(self):
+        self.signer.metrics.set_gauge("apk_signer_queue_depth", self.queue_depth(),
+                                      help_text="APKs waiting to be processed", queue="daemon")
     
-    def load_history(self):
-        history_file = Path("signing_history.json")
+    async def _run_job(self, job):
+        with log_context(job_id=job.job_id, apk=Path(job.apk_path).name):
+            await self._execute_job(job)
+    
+    async def _execute_job(self, job):
+        job.set_status("running")
+        self._update_queue_metrics()
+        sink = JobEventSink(job)
         try:
-            if history_file.exists():
-                with open(history_file, 'r') as f:
-                    return json.load(f)
+            if job.action == "sign":
+                result = await self.engine.sign(job.apk_path, sink)
+                if not result.ok:
+                    raise RuntimeError(result.error)
+                job.output_path = result.output_path
+                job.result = job.output_path
+                job.set_status("success")
+            else:
+                if await self.engine.verify(job.apk_path, sink):
+                    job.result = True
+                    job.set_status("success")
+                else:
+                    job.result = False
+                    job.error = next((e["data"][0] for e in reversed(job.events) if e["type"] == "verify_failed"), None)
+                    job.set_status("failed")
         except Exception as e:
-            logging.error(f"Error loading history: {e}")
-        return []
+            job.error = str(e)
+            job.set_status("failed")
+        logging.info(f"Daemon: job {job.job_id} finished with status {job.status}")
     
-    def save_history(self):
-        history_file = Path("signing_history.json")
+    def serve(self, host="127.0.0.1", port=8765, socket_path=None, allow_remote=False):
+        # Anyone who can reach the port can sign with the release key, so stay on loopback by default
+        if not socket_path and not is_loopback_host(host) and not allow_remote:
+            raise ValueError(f"Refusing to listen on non-loopback host {host}; "
+                             "set DAEMON_ALLOW_REMOTE or pass --allow-remote to do so")
+        if self.token is None:
+            self.token = load_daemon_token(self.signer.config_manager.get("DAEMON_TOKEN_FILE", "daemon.token"),
+                                           create=True)
+        if socket_path or is_loopback_host(host):
+            self.allowed_hosts.add(host.lower())
+        else:
+            self.allowed_hosts = None  # remote clients use whatever name reaches this machine; the token still applies
+        if socket_path:
+            if os.path.exists(socket_path):
+                os.remove(socket_path)
+            self.server = UnixHTTPServer(socket_path, DaemonRequestHandler)
+            address = socket_path
+        else:
+            self.server = ThreadingHTTPServer((host, int(port)), DaemonRequestHandler)
+            address = f"http://{host}:{self.server.server_address[1]}"
+        self.server.signing_daemon = self
+        logging.info(f"Signing daemon listening on {address} (max jobs: {self.max_jobs})")
+        return self.server
+    
+    def serve_forever(self, host="127.0.0.1", port=8765, socket_path=None, allow_remote=False):
+        server = self.serve(host, port, socket_path, allow_remote)
         try:
-            with open(history_file, 'w') as f:
-                json.dump(self.history[-50:], f, indent=4)  # Keep last 50 entries
-        except Exception as e:
-            logging.error(f"Error saving history: {e}")
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.shutdown()
     
-    def run_cmd(self, cmd, step_name, progress_queue=None):
-        logging.info(f"Step: {step_name} | Command: {' '.join(cmd)}")
-        if progress_queue:
-            progress_queue.put(("log", f"Running: {' '.join(cmd)}"))
+    def shutdown(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            if isinstance(self.server, UnixHTTPServer) and os.path.exists(self.server.server_address):
+                os.remove(self.server.server_address)
+            self.server = None
+        if self.controller:
+            self.controller.stop()
+        self.bridge.stop()
+
+
+if hasattr(socket, "AF_UNIX"):
+    class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+        daemon_threads = True
+else:
+    class UnixHTTPServer:
+        def __init__(self, *args, **kwargs):
+            raise RuntimeError("Unix sockets are not supported on this platform")
+
+
+class DaemonRequestHandler(BaseHTTPRequestHandler):
+    server_version = "ApkSignerDaemon/1.0"
+    
+    @property
+    def daemon(self):
+        return self.server.signing_daemon
+    
+    def address_string(self):
+        # Unix socket peers have no host/port pair
+        return self.client_address[0] if isinstance(self.client_address, tuple) else "local"
+    
+    def log_message(self, format, *args):
+        logging.debug(f"Daemon request from {self.address_string()}: {format % args}")
+    
+    def send_json(self, payload, status=200):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def authorized(self):
+        """Host and token checks for every request; sends the error response when one fails"""
+        # A foreign Host header means a browser was pointed here (DNS rebinding); refuse it
+        host = self.headers.get("Host", "").strip().lower()
+        if host.startswith("["):
+            host = host[1:host.find("]")]
+        elif host.count(":") == 1:
+            host = host.rsplit(":", 1)[0]
+        if self.daemon.allowed_hosts is not None and host not in self.daemon.allowed_hosts:
+            self.send_json({"error": "Unexpected Host header"}, 403)
+            return False
+        expected = f"Bearer {self.daemon.token}".encode("latin-1")
+        if not hmac.compare_digest(self.headers.get("Authorization", "").encode("latin-1"), expected):
+            self.send_json({"error": "Missing or invalid token"}, 401)
+            return False
+        return True
+    
+    def read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if not length:
+            return {}
+        return json.loads(self.rfile.read(length).decode("utf-8"))
+    
+    def route(self):
+        parsed = urllib.parse.urlparse(self.path)
+        parts = [p for p in parsed.path.split("/") if p]
+        return parts, urllib.parse.parse_qs(parsed.query)
+    
+    def do_GET(self):
+        if not self.authorized():
+            return
+        parts, query = self.route()
+        
+        if parts == ["metrics"]:
+            body = self.daemon.signer.metrics.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        elif parts == ["status"]:
+            jobs = self.daemon.list_jobs()
+            counts = {}
+            for job in jobs:
+                counts[job.status] = counts.get(job.status, 0) + 1
+            controller = self.daemon.controller
+            self.send_json({
+                "max_jobs": self.daemon.max_jobs,
+                "jobs": counts,
+                "scheduler": self.daemon.scheduler.stats(),
+                "concurrency_decisions": list(controller.decisions) if controller else []
+            })
+        elif parts == ["history"]:
+            with self.daemon.signer.history_lock:
+                history = list(self.daemon.signer.history)
+            self.send_json({"history": history})
+        elif parts == ["jobs"]:
+            self.send_json({"jobs": [job.to_dict() for job in self.daemon.list_jobs()]})
+        elif len(parts) >= 2 and parts[0] == "jobs":
+            job = self.daemon.get_job(parts[1])
+            if not job:
+                self.send_json({"error": "Job not found"}, 404)
+            elif len(parts) == 2:
+                self.send_json({"job": job.to_dict()})
+            elif parts[2] == "events":
+                self.send_events(job, int(query.get("since", ["0"])[0]), float(query.get("wait", ["0"])[0]))
+            elif parts[2] == "stream":
+                self.stream_events(job)
+            elif parts[2] == "output":
+                self.send_output(job)
+            else:
+                self.send_json({"error": "Not found"}, 404)
+        else:
+            self.send_json({"error": "Not found"}, 404)
+    
+    def do_POST(self):
+        if not self.authorized():
+            return
+        parts, _ = self.route()
+        if parts != ["jobs"]:
+            self.send_json({"error": "Not found"}, 404)
+            return
+        # Browsers may send text/plain cross-origin without a preflight; JSON requests cannot be forged that way
+        if self.headers.get_content_type() != "application/json":
+            self.send_json({"error": "Content-Type must be application/json"}, 415)
+            return
         
         try:
-            result = subprocess.run(
-                cmd, 
-                capture_output=True, 
-                text=True, 
-                shell=True,
-                timeout=300  # 5 minutes timeout
-            )
-            
-            if result.returncode != 0:
-                error_msg = result.stderr.strip() or result.stdout.strip()
-                logging.error(f"Error in {step_name}: {error_msg}")
-                if progress_queue:
-                    progress_queue.put(("error", error_msg))
-                raise RuntimeError(error_msg)
-            
-            output = result.stdout.strip()
-            logging.info(f"Output: {output}")
-            if progress_queue:
-                progress_queue.put(("log", output))
-            return output
-        except subprocess.TimeoutExpired:
-            error_msg = f"Timeout in {step_name}"
-            logging.error(error_msg)
-            if progress_queue:
-                progress_queue.put(("error", error_msg))
-            raise RuntimeError(error_msg)
-        except Exception as e:
-            error_msg = f"Exception in {step_name}: {str(e)}"
-            logging.error(error_msg)
-            if progress_queue:
-                progress_queue.put(("error", error_msg))
-            raise
+            payload = self.read_json()
+            job = self.daemon.submit(payload.get("action", "sign"), payload.get("apk"), payload.get("priority"))
+        except (ValueError, json.JSONDecodeError) as e:
+            self.send_json({"error": str(e)}, 400)
+            return
+        self.send_json({"job": job.to_dict()}, 202)
     
-    def verify_tools(self):
-        tools = {
-            "jarsigner": os.path.join(self.config_manager.get("JDK_PATH"), "bin", "jarsigner.exe"),
-            "zipalign": os.path.join(self.config_manager.get("SDK_BUILD_TOOLS"), "zipalign.exe"),
-            "apksigner": os.path.join(self.config_manager.get("SDK_BUILD_TOOLS"), "apksigner.bat")
-        }
-        
-        missing = []
-        for name, path in tools.items():
-            if not os.path.exists(path):
-                missing.append(f"{name}: {path}")
-        
-        if missing:
-            raise RuntimeError(f"Missing required tools:\n" + "\n".join(missing))
-        
-        return tools
+    def send_events(self, job, since, wait):
+        # Long-poll: block up to `wait` seconds for events past `since`
+        with job.condition:
+            if wait > 0 and len(job.events) <= since and not job.is_finished():
+                job.condition.wait(timeout=min(wait, 60))
+            events = job.events[since:]
+            status = job.status
+        self.send_json({"events": events, "next": since + len(events), "status": status})
     
-    def sign_apk(self, apk_path, progress_queue=None):
+    def stream_events(self, job):
+        # One JSON document per line until the job finishes; the connection closes at the end
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        
+        sent = 0
         try:
-            tools = self.verify_tools()
-            apk_path = str(Path(apk_path).resolve())
-            
-            # Create output directory if not exists
-            output_dir = Path(self.config_manager.get("OUTPUT_DIR"))
-            output_dir.mkdir(parents=True, exist_ok=True)
-            
-            # Generate output filename
-            apk_name = Path(apk_path).stem
-            timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-            output_name = f"{apk_name}_signed_{timestamp}.apk"
-            output_path = output_dir / output_name
-            
-            # Calculate original APK hash
-            original_hash = self.calculate_hash(apk_path)
-            
-            steps = [
-                ("Jarsigner Signing", [
-                    tools["jarsigner"], "-verbose", "-sigalg", "SHA256withRSA", 
-                    "-digestalg", "SHA-256", "-keystore", self.config_manager.get("KEYSTORE"), 
-                    "-storepass", self.config_manager.get("STOREPASS"), 
-                    "-keypass", self.config_manager.get("KEYPASS"), apk_path, 
-                    self.config_manager.get("ALIAS")
-                ]),
-                ("Zipalign APK", [
-                    tools["zipalign"], "-v", "-p", "4", apk_path, str(output_path)
-                ]),
-                ("Apksigner Signing", [
-                    tools["apksigner"], "sign", "--ks", self.config_manager.get("KEYSTORE"), 
-                    f"--ks-pass=pass:{self.config_manager.get('STOREPASS')}", 
-                    f"--key-pass=pass:{self.config_manager.get('KEYPASS')}", 
-                    "--ks-key-alias", self.config_manager.get("ALIAS"), str(output_path)
-                ]),
-                ("Verify APK", [
-                    tools["apksigner"], "verify", str(output_path)
-                ])
-            ]
-            
-            for i, (step_name, cmd) in enumerate(steps, 1):
-                if progress_queue:
-                    progress_queue.put(("progress", i / len(steps), step_name))
-                self.run_cmd(cmd, step_name, progress_queue)
-            
-            # Calculate signed APK hash
-            signed_hash = self.calculate_hash(str(output_path))
-            
-            # Add to history
-            history_entry = {
-                "timestamp": datetime.datetime.now().isoformat(),
-                "original_apk": apk_path,
-                "signed_apk": str(output_path),
-                "original_hash": original_hash,
-                "signed_hash": signed_hash,
-                "status": "success"
-            }
-            self.history.append(history_entry)
-            self.save_history()
-            
-            if progress_queue:
-                progress_queue.put(("complete", str(output_path)))
-            
-            return str(output_path)
+            while True:
+                with job.condition:
+                    while len(job.events) <= sent and not job.is_finished():
+                        job.condition.wait(timeout=1)
+                    events = job.events[sent:]
+                    finished = job.is_finished()
+                for event in events:
+                    self.wfile.write((json.dumps(event) + "\n").encode("utf-8"))
+                sent += len(events)
+                self.wfile.flush()
+                if finished and sent >= len(job.events):
+                    break
+            self.wfile.write((json.dumps({"type": "job", "data": [job.to_dict()]}) + "\n").encode("utf-8"))
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+    
+    def send_output(self, job):
+        if not job.output_path or not os.path.isfile(job.output_path):
+            self.send_json({"error": "No output available"}, 404)
+            return
         
-        except Exception as e:
-            if progress_queue:
-                progress_queue.put(("failed", str(e)))
-            raise
+        size = os.path.getsize(job.output_path)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/vnd.android.package-archive")
+        self.send_header("Content-Length", str(size))
+        self.send_header("Content-Disposition", f'attachment; filename="{Path(job.output_path).name}"')
+        self.end_headers()
+        with open(job.output_path, "rb") as f:
+            shutil.copyfileobj(f, self.wfile, 1024 * 1024)
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, socket_path, timeout=30):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = socket_path
     
-    def calculate_hash(self, file_path):
-        sha256_hash = hashlib.sha256()
-        with open(file_path, "rb") as f:
-            for byte_block in iter(lambda: f.read(4096), b""):
-                sha256_hash.update(byte_block)
-        return sha256_hash.hexdigest()
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+
+class SigningDaemonClient:
+    """Minimal local client for the signing daemon (HTTP on localhost or a Unix socket)"""
     
-    def batch_sign(self, apk_paths, progress_queue=None):
-        results = []
-        total = len(apk_paths)
-        
-        for i, apk_path in enumerate(apk_paths, 1):
-            try:
-                if progress_queue:
-                    progress_queue.put(("batch_progress", i / total, f"Processing {Path(apk_path).name}"))
-                
-                result = self.sign_apk(apk_path, progress_queue)
-                results.append({"path": apk_path, "result": result, "status": "success"})
-            except Exception as e:
-                results.append({"path": apk_path, "result": str(e), "status": "failed"})
-        
-        if progress_queue:
-            progress_queue.put(("batch_complete", results))
-        
-        return results
+    def __init__(self, host="127.0.0.1", port=8765, socket_path=None, timeout=30, token=None):
+        self.host = host
+        self.port = int(port)
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self.token = token
     
-    def verify_apk(self, apk_path, progress_queue=None):
+    def _headers(self, body=None):
+        headers = {"Authorization": f"Bearer {self.token}"} if self.token else {}
+        if body:
+            headers["Content-Type"] = "application/json"
+        return headers
+    
+    def _connection(self, timeout=None):
+        timeout = timeout or self.timeout
+        if self.socket_path:
+            return UnixHTTPConnection(self.socket_path, timeout=timeout)
+        return http.client.HTTPConnection(self.host, self.port, timeout=timeout)
+    
+    def _request(self, method, path, payload=None):
+        conn = self._connection()
         try:
-            tools = self.verify_tools()
-            apk_path = str(Path(apk_path).resolve())
-            
-            if progress_queue:
-                progress_queue.put(("log", f"Verifying APK: {apk_path}"))
-            
-            # Verify APK signature
-            cmd = [tools["apksigner"], "verify", apk_path]
-            self.run_cmd(cmd, "Verify APK", progress_queue)
-            
-            # Get APK info
-            cmd = [tools["apksigner"], "verify", "--print-certs", apk_path]
-            output = self.run_cmd(cmd, "Get APK Info", progress_queue)
-            
-            if progress_queue:
-                progress_queue.put(("verify_complete", output))
+            body = json.dumps(payload).encode("utf-8") if payload is not None else None
+            conn.request(method, path, body=body, headers=self._headers(body))
+            response = conn.getresponse()
+            data = json.loads(response.read().decode("utf-8") or "{}")
+            if response.status >= 400:
+                raise RuntimeError(data.get("error", f"HTTP {response.status}"))
+            return data
+        finally:
+            conn.close()
+    
+    def submit(self, action, apk_path, priority=None):
+        # The daemon may run from another directory, so paths are sent absolute
+        payload = {"action": action, "apk": str(Path(apk_path).resolve())}
+        if priority:
+            payload["priority"] = priority
+        return self._request("POST", "/jobs", payload)["job"]
+    
+    def job(self, job_id):
+        return self._request("GET", f"/jobs/{job_id}")["job"]
+    
+    def jobs(self):
+        return self._request("GET", "/jobs")["jobs"]
+    
+    def status(self):
+        return self._request("GET", "/status")
+    
+    def history(self):
+        return self._request("GET", "/history")["history"]
+    
+    def poll_events(self, job_id, since=0, wait=10):
+        return self._request("GET", f"/jobs/{job_id}/events?since={since}&wait={wait}")
+    
+    def stream_events(self, job_id):
+        conn = self._connection(timeout=None)
+        try:
+            conn.request("GET", f"/jobs/{job_id}/stream", headers=self._headers())
+            response = conn.getresponse()
+            if response.status >= 400:
+                raise RuntimeError(json.loads(response.read().decode("utf-8")).get("error"))
+            for line in response:
+                if line.strip():
+                    yield json.loads(line.decode("utf-8"))
+        finally:
+            conn.close()
+    
+    def wait(self, job_id):
+        final = None
+        for event in self.stream_events(job_id):
+            if event["type"] == "job":
+                final = event["data"][0]
+        return final or self.job(job_id)
+    
+    def download(self, job_id, destination):
+        conn = self._connection()
+        try:
+            conn.request("GET", f"/jobs/{job_id}/output", headers=self._headers())
+            response = conn.getresponse()
+            if response.status >= 400:
+                raise RuntimeError(json.loads(response.read().decode("utf-8")).get("error"))
             
-            return True
-        except Exception as e:
-            if progress_queue:
-                progress_queue.put(("verify_failed", str(e)))
-            return False
+            destination = Path(destination)
+            if destination.is_dir():
+                disposition = response.getheader("Content-Disposition", "")
+                filename = disposition.split("filename=")[-1].strip('"') or f"{job_id}.apk"
+                destination = destination / filename
+            with open(destination, "wb") as f:
+                shutil.copyfileobj(response, f, 1024 * 1024)
+            return str(destination)
+        finally:
+            conn.close()
 
 # ------------------- Professional GUI -------------------
+class VirtualListView(ttk.Frame):
+    """Listbox that only holds the rows currently on screen.
+    
+    The rows come from a BatchQueue; scrolling re-fills the listbox from the
+    model, so the widget cost does not grow with the number of items.
+    Selection is tracked by path in the view itself.
+    """
+    
+    def __init__(self, parent, model, formatter, **listbox_options):
+        super().__init__(parent)
+        self.model = model
+        self.formatter = formatter
+        self.top = 0
+        self.visible = []
+        self.selected = set()
+        
+        self.scrollbar = ttk.Scrollbar(self, command=self._on_scroll)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.listbox = tk.Listbox(self, exportselection=False, **listbox_options)
+        self.listbox.pack(fill=tk.BOTH, expand=True)
+        self.row_height = tkfont.Font(font=self.listbox.cget("font")).metrics("linespace") + 1
+        
+        self.listbox.bind("<Configure>", lambda e: self.refresh())
+        self.listbox.bind("<<ListboxSelect>>", self._on_select)
+        self.listbox.bind("<MouseWheel>", lambda e: self._scroll_by(-1 if e.delta > 0 else 1) or "break")
+        self.listbox.bind("<Button-4>", lambda e: self._scroll_by(-1) or "break")
+        self.listbox.bind("<Button-5>", lambda e: self._scroll_by(1) or "break")
+    
+    def rows(self):
+        return max(1, self.listbox.winfo_height() // self.row_height)
+    
+    def refresh(self):
+        total, rows = len(self.model), self.rows()
+        self.top = max(0, min(self.top, total - rows))
+        self.visible = self.model.slice(self.top, self.top + rows)
+        self.listbox.delete(0, tk.END)
+        if self.visible:
+            self.listbox.insert(tk.END, *(self.formatter(item) for item in self.visible))
+        for index, item in enumerate(self.visible):
+            if item.path in self.selected:
+                self.listbox.selection_set(index)
+        if total:
+            self.scrollbar.set(self.top / total, min(1.0, (self.top + rows) / total))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+    
+    def _scroll_by(self, rows):
+        self.top += rows * 3
+        self.refresh()
+    
+    def _on_scroll(self, action, amount, unit=None):
+        if action == "moveto":
+            self.top = int(float(amount) * len(self.model))
+        elif unit == "pages":
+            self.top += int(amount) * self.rows()
+        else:
+            self.top += int(amount)
+        self.refresh()
+    
+    def _on_select(self, event):
+        chosen = set(self.listbox.curselection())
+        for index, item in enumerate(self.visible):
+            if index in chosen:
+                self.selected.add(item.path)
+            else:
+                self.selected.discard(item.path)
+    
+    def selected_paths(self):
+        return [path for path in self.selected if path in self.model]
+    
+    def clear_selection(self):
+        self.selected.clear()
+        self.refresh()
+
+
 class ApkSignerGUI:
     def __init__(self, root):
         self.root = root
@@ -608,7 +5035,20 @@ class ApkSignerGUI:
         self.config_manager = ConfigManager()
         self.theme_manager = ThemeManager()
         self.signer = AdvancedApkSigner(self.config_manager)
-        self.progress_queue = queue.Queue()
+        self.engine = AsyncSigningEngine(self.signer)
+        self.scheduler = JobScheduler(
+            int(self.config_manager.get("SCHEDULER_MAX_ACTIVE", 0)) or max(2, os.cpu_count() or 2),
+            int(self.config_manager.get("SCHEDULER_RESERVED_INTERACTIVE", 1)),
+            self.signer.metrics
+        )
+        self.engine.scheduler = self.scheduler
+        self.async_bridge = AsyncBridge()
+        if self.config_manager.get("ADAPTIVE_CONCURRENCY", True):
+            ConcurrencyController(self.scheduler, self.config_manager, self.signer.metrics).start()
+        self.progress_queue = BoundedEventQueue(int(self.config_manager.get("EVENT_QUEUE_SIZE", 1000)))
+        self.batch_queue = BatchQueue()
+        self.folder_scanner = None
+        self.batch_feed = None
         self.current_theme = self.config_manager.get("THEME")
         self.theme = self.theme_manager.get_theme(self.current_theme)
         
@@ -646,6 +5086,9 @@ class ApkSignerGUI:
         # Start progress monitor
         self.root.after(100, self.process_progress_queue)
         
+        # Offer to resume batches interrupted by a crash or reboot
+        self.root.after(500, self.check_interrupted_batches)
+        
         # Set window icon (if available)
         self.set_window_icon()
         
@@ -1047,23 +5490,23 @@ class ApkSignerGUI:
         
         ttk.Label(list_frame, text="APK Files:").pack(anchor=tk.W)
         
-        # Listbox with scrollbar
-        scrollbar = ttk.Scrollbar(list_frame)
-        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
-        
-        self.batch_listbox = tk.Listbox(
+        # Virtual list over the batch queue model
+        self.batch_view = VirtualListView(
             list_frame, 
+            self.batch_queue,
+            self.format_batch_item,
             selectmode=tk.MULTIPLE,
             bg=self.theme["secondary"],
             fg=self.theme["fg"],
             selectbackground=self.theme["accent"],
-            yscrollcommand=scrollbar.set,
             relief="flat",
             borderwidth=0,
             font=(self.theme["font"], self.theme["font_size"])
         )
-        self.batch_listbox.pack(fill=tk.BOTH, expand=True)
-        scrollbar.config(command=self.batch_listbox.yview)
+        self.batch_view.pack(fill=tk.BOTH, expand=True)
+        
+        self.batch_count_label = ttk.Label(list_frame, text="0 APKs")
+        self.batch_count_label.pack(anchor=tk.W, pady=(5, 0))
         
         # Drop zone for batch
         self.batch_drop_zone_frame = ttk.LabelFrame(main_frame, text="Or drag APK files here", padding=10)
@@ -1077,6 +5520,20 @@ class ApkSignerGUI:
         )
         self.batch_drop_zone_label.pack(pady=10)
         
+        # Folder filters
+        filter_frame = ttk.Frame(main_frame)
+        filter_frame.pack(fill=tk.X, pady=(10, 0))
+        
+        ttk.Label(filter_frame, text="Include:").pack(side=tk.LEFT, padx=(0, 5))
+        self.scan_include_entry = ttk.Entry(filter_frame, width=20)
+        self.scan_include_entry.insert(0, self.config_manager.get("SCAN_INCLUDE", "*.apk"))
+        self.scan_include_entry.pack(side=tk.LEFT, padx=(0, 15))
+        
+        ttk.Label(filter_frame, text="Exclude:").pack(side=tk.LEFT, padx=(0, 5))
+        self.scan_exclude_entry = ttk.Entry(filter_frame, width=30)
+        self.scan_exclude_entry.insert(0, self.config_manager.get("SCAN_EXCLUDE", ""))
+        self.scan_exclude_entry.pack(side=tk.LEFT, fill=tk.X, expand=True)
+        
         # Buttons
         button_frame = ttk.Frame(main_frame)
         button_frame.pack(fill=tk.X, pady=10)
@@ -1084,6 +5541,9 @@ class ApkSignerGUI:
         add_icon = IconGenerator.create_icon(16, self.theme["fg"], "folder")
         ttk.Button(button_frame, text="Add APKs", command=self.add_apks, image=add_icon, compound=tk.LEFT).pack(side=tk.LEFT, padx=(0, 10))
         
+        folder_icon = IconGenerator.create_icon(16, self.theme["fg"], "folder")
+        ttk.Button(button_frame, text="Add Folder", command=self.add_folder, image=folder_icon, compound=tk.LEFT).pack(side=tk.LEFT, padx=(0, 10))
+        
         remove_icon = IconGenerator.create_icon(16, self.theme["fg"], "clear")
         ttk.Button(button_frame, text="Remove Selected", command=self.remove_selected, image=remove_icon, compound=tk.LEFT).pack(side=tk.LEFT, padx=(0, 10))
         
@@ -1424,6 +5884,17 @@ class ApkSignerGUI:
         icon_label.image = icon  # Keep a reference
         icon_label.pack(side=tk.LEFT)
         
+        # Job/batch filter (uses the JSON log index)
+        filter_frame = ttk.Frame(main_frame)
+        filter_frame.pack(fill=tk.X, pady=(0, 10))
+        
+        ttk.Label(filter_frame, text="Job/Batch ID:").pack(side=tk.LEFT, padx=(0, 10))
+        self.log_filter_entry = ttk.Entry(filter_frame, width=30)
+        self.log_filter_entry.pack(side=tk.LEFT, padx=(0, 10))
+        self.log_filter_entry.bind("<Return>", lambda e: self.refresh_logs())
+        ttk.Button(filter_frame, text="Filter", command=self.refresh_logs).pack(side=tk.LEFT, padx=(0, 10))
+        ttk.Button(filter_frame, text="Show All", command=self.clear_log_filter).pack(side=tk.LEFT)
+        
         # Log display
         log_frame = ttk.Frame(main_frame)
         log_frame.pack(fill=tk.BOTH, expand=True)
@@ -1667,7 +6138,7 @@ class ApkSignerGUI:
     def browse_file(self):
         file_path = filedialog.askopenfilename(
             title="Select APK file",
-            filetypes=[("APK files", "*.apk"), ("All files", "*.*")]
+            filetypes=[("APK files", "*.apk"), ("App bundles", "*.aab"), ("All files", "*.*")]
         )
         if file_path:
             self.apk_entry.delete(0, tk.END)
@@ -1699,12 +6170,9 @@ class ApkSignerGUI:
         self.status_label.config(text="Signing APK...")
         self.output_text.delete(1.0, tk.END)
         
-        # Start signing in a separate thread
-        threading.Thread(
-            target=self.signer.sign_apk,
-            args=(apk_path, self.progress_queue),
-            daemon=True
-        ).start()
+        # Interactive jobs go ahead of any running batch
+        self.async_bridge.submit(self.scheduler.run(
+            functools.partial(self.engine.sign, apk_path, self.progress_queue), "interactive"))
     
     def verify_tools(self):
         try:
@@ -1723,32 +6191,91 @@ class ApkSignerGUI:
         self.verify_text.delete(1.0, tk.END)
         self.status_label.config(text="Verifying APK...")
         
-        # Start verification in a separate thread
-        threading.Thread(
-            target=self.signer.verify_apk,
-            args=(apk_path, self.progress_queue),
-            daemon=True
-        ).start()
+        # Verify through the scheduler, ahead of bulk signing
+        self.async_bridge.submit(self.scheduler.run(
+            functools.partial(self.engine.verify, apk_path, self.progress_queue), "verify"))
+    
+    def format_batch_item(self, item):
+        size = format_bytes(item.size) if item.size is not None else "missing"
+        text = f"{item.path}   ({size})"
+        if item.status != "pending":
+            text += f"   [{item.status}]"
+        return text
+    
+    def refresh_batch_view(self):
+        self.batch_view.refresh()
+        counts = self.batch_queue.counts()
+        details = ", ".join(f"{n} {status}" for status, n in counts.items() if status != "pending")
+        self.batch_count_label.config(text=f"{len(self.batch_queue)} APKs" + (f" ({details})" if details else ""))
     
     def add_apks(self):
         file_paths = filedialog.askopenfilenames(
             title="Select APK files",
-            filetypes=[("APK files", "*.apk"), ("All files", "*.*")]
+            filetypes=[("APK files", "*.apk"), ("App bundles", "*.aab"), ("All files", "*.*")]
+        )
+        self.batch_queue.add_many(file_paths)
+        self.refresh_batch_view()
+    
+    def add_folder(self):
+        folder = filedialog.askdirectory(title="Select folder with APK files")
+        if not folder:
+            return
+        
+        include = FolderScanner.split_patterns(self.scan_include_entry.get())
+        exclude = FolderScanner.split_patterns(self.scan_exclude_entry.get())
+        self.config_manager.set("SCAN_INCLUDE", ";".join(include))
+        self.config_manager.set("SCAN_EXCLUDE", ";".join(exclude))
+        
+        max_age_days = float(self.config_manager.get("SCAN_MAX_AGE_DAYS", 0))
+        if self.folder_scanner:
+            self.folder_scanner.cancel()
+        self.folder_scanner = FolderScanner(
+            include, exclude,
+            min_size=int(self.config_manager.get("SCAN_MIN_SIZE", 1)),
+            max_size=int(self.config_manager.get("SCAN_MAX_SIZE", 0)) or None,
+            modified_after=time.time() - max_age_days * 86400 if max_age_days else None,
+            workers=int(self.config_manager.get("SCAN_WORKERS", 8))
         )
-        for path in file_paths:
-            if path not in self.batch_listbox.get(0, tk.END):
-                self.batch_listbox.insert(tk.END, path)
+        self.batch_step_label.config(text=f"Scanning {folder}...")
+        threading.Thread(
+            target=self.scan_folder,
+            args=(self.folder_scanner, folder),
+            daemon=True
+        ).start()
+    
+    def scan_folder(self, scanner, folder):
+        # Hand results to the GUI in chunks so the list fills while the walk continues
+        found, chunk, last_flush = 0, [], time.perf_counter()
+        for item in scanner.scan([folder]):
+            chunk.append(item)
+            found += 1
+            if len(chunk) >= 500 or time.perf_counter() - last_flush > 0.25:
+                self.progress_queue.put(("batch_found", scanner, chunk, found))
+                chunk, last_flush = [], time.perf_counter()
+        self.progress_queue.put(("batch_found", scanner, chunk, found))
+        self.progress_queue.put(("batch_scan_complete", scanner, folder, found, scanner.dirs_scanned))
     
     def remove_selected(self):
-        selected = self.batch_listbox.curselection()
-        for index in reversed(selected):
-            self.batch_listbox.delete(index)
+        self.batch_queue.remove_many(self.batch_view.selected_paths())
+        self.batch_view.clear_selection()
+        self.refresh_batch_view()
     
     def clear_batch(self):
-        self.batch_listbox.delete(0, tk.END)
+        if self.folder_scanner:
+            self.folder_scanner.cancel()
+            self.folder_scanner = None
+        self.close_batch_feed()
+        self.batch_queue.clear()
+        self.batch_view.clear_selection()
+        self.refresh_batch_view()
+    
+    def close_batch_feed(self):
+        if self.batch_feed:
+            self.batch_feed.close()
+            self.batch_feed = None
     
-    def start_batch_sign(self):
-        apk_paths = self.batch_listbox.get(0, tk.END)
+    def start_batch_sign(self, batch_id=None):
+        apk_paths = self.batch_queue.paths()
         if not apk_paths:
             messagebox.showerror("Error", "No APK files selected for batch signing.")
             return
@@ -1763,12 +6290,35 @@ class ApkSignerGUI:
         self.batch_step_label.config(text="Starting batch signing...")
         self.status_label.config(text="Batch signing APKs...")
         
-        # Start batch signing in a separate thread
-        threading.Thread(
-            target=self.signer.batch_sign,
-            args=(apk_paths, self.progress_queue),
-            daemon=True
-        ).start()
+        # Each APK is queued on the scheduler as a bulk job, largest first; while
+        # a folder scan is still running, what it finds joins this batch
+        self.close_batch_feed()
+        if self.folder_scanner:
+            self.batch_feed = BatchFeed(self.async_bridge.loop)
+        self.async_bridge.submit(self.engine.sign_batch(apk_paths, self.progress_queue, self.batch_feed, batch_id))
+    
+    def check_interrupted_batches(self):
+        for batch_id, apk_paths, remaining in BatchJournal.find_incomplete():
+            if not remaining:
+                BatchJournal.discard(batch_id)
+                continue
+            
+            resume = messagebox.askyesno(
+                "Resume Batch",
+                f"A batch of {len(apk_paths)} APKs was interrupted.\n"
+                f"{len(apk_paths) - len(remaining)} already signed, {len(remaining)} remaining.\n\n"
+                f"Resume it now?"
+            )
+            if not resume:
+                BatchJournal.discard(batch_id)
+                continue
+            
+            self.batch_queue.clear()
+            self.batch_queue.add_many(apk_paths)
+            self.refresh_batch_view()
+            self.notebook.select(1)
+            self.start_batch_sign(batch_id)
+            break
     
     def refresh_history(self):
         # Clear existing items
@@ -1811,7 +6361,7 @@ class ApkSignerGUI:
         # Create details dialog
         details_window = tk.Toplevel(self.root)
         details_window.title("Signing Details")
-        details_window.geometry("600x400")
+        details_window.geometry("640x640")
         details_window.resizable(False, False)
         
         # Apply theme
@@ -1897,7 +6447,7 @@ class ApkSignerGUI:
             fg=self.theme["fg"]
         ).grid(row=3, column=0, sticky=tk.W, pady=5)
         
-        status_color = self.theme["success"] if values[3] == "success" else self.theme["error"]
+        status_color = self.theme["success"] if values[3] in ("success", "skipped") else self.theme["error"]
         tk.Label(
             details_frame, 
             text=values[3].capitalize(), 
@@ -1909,11 +6459,17 @@ class ApkSignerGUI:
         # Find hash information
         original_hash = ""
         signed_hash = ""
+        stages = {}
+        total_wall = None
+        certificates = []
         
         for entry in self.signer.history:
             if entry["timestamp"] == values[0] and entry["signed_apk"] == values[2]:
                 original_hash = entry.get("original_hash", "")
                 signed_hash = entry.get("signed_hash", "")
+                stages = entry.get("stages", {})
+                total_wall = entry.get("total_wall_s")
+                certificates = entry.get("certificates", [])
                 break
         
         if original_hash:
@@ -1952,6 +6508,71 @@ class ApkSignerGUI:
                 wraplength=400
             ).grid(row=5, column=1, sticky=tk.W, pady=5)
         
+        # Signer certificates, as recorded at signing time (nothing is re-read or spawned here)
+        row = 6
+        for i, cert in enumerate(certificates, 1):
+            tk.Label(
+                details_frame, 
+                text=f"Signer #{i} ({', '.join(cert.get('schemes', []))}):", 
+                font=(self.theme["font"], 10, "bold"),
+                bg=self.theme["bg"],
+                fg=self.theme["fg"]
+            ).grid(row=row, column=0, columnspan=2, sticky=tk.W, pady=(10, 5))
+            row += 1
+            
+            for label, text in (
+                ("Subject", cert["subject"]),
+                ("Issuer", cert["issuer"]),
+                ("Valid", f"{cert['not_before'][:10]} to {cert['not_after'][:10]}"),
+                ("SHA-256", cert["sha256"]),
+                ("SHA-1", cert["sha1"]),
+            ):
+                tk.Label(
+                    details_frame, 
+                    text=f"{label}:", 
+                    font=(self.theme["font"], 9, "bold"),
+                    bg=self.theme["bg"],
+                    fg=self.theme["fg"]
+                ).grid(row=row, column=0, sticky=tk.W, pady=2)
+                
+                tk.Label(
+                    details_frame, 
+                    text=text, 
+                    font=(self.theme["font"], 9),
+                    bg=self.theme["bg"],
+                    fg=self.theme["fg"],
+                    wraplength=400
+                ).grid(row=row, column=1, sticky=tk.W, pady=2)
+                row += 1
+        
+        # Per-stage timing and I/O
+        if stages:
+            tk.Label(
+                details_frame, 
+                text="Stage Timings:" if total_wall is None else f"Stage Timings ({total_wall:.2f}s total):", 
+                font=(self.theme["font"], 10, "bold"),
+                bg=self.theme["bg"],
+                fg=self.theme["fg"]
+            ).grid(row=row, column=0, columnspan=2, sticky=tk.W, pady=(10, 5))
+            
+            for row, (stage_name, stage) in enumerate(stages.items(), row + 1):
+                tk.Label(
+                    details_frame, 
+                    text=f"{stage_name}:", 
+                    font=(self.theme["font"], 9, "bold"),
+                    bg=self.theme["bg"],
+                    fg=self.theme["fg"]
+                ).grid(row=row, column=0, sticky=tk.W, pady=2)
+                
+                tk.Label(
+                    details_frame, 
+                    text=StageTimer.describe(stage), 
+                    font=(self.theme["font"], 9),
+                    bg=self.theme["bg"],
+                    fg=self.theme["fg"],
+                    wraplength=400
+                ).grid(row=row, column=1, sticky=tk.W, pady=2)
+        
         # Buttons
         button_frame = tk.Frame(main_frame, bg=self.theme["bg"])
         button_frame.pack(fill=tk.X, pady=20)
@@ -1997,10 +6618,11 @@ class ApkSignerGUI:
         )
         close_btn.pack(side=tk.RIGHT)
         
-        # Center the window
+        # Fit the height to the rows (signer certificates, stage timings, wrapped paths), within the screen,
+        # and center the window
         details_window.update_idletasks()
         width = details_window.winfo_width()
-        height = details_window.winfo_height()
+        height = min(details_window.winfo_reqheight(), details_window.winfo_screenheight() - 80)
         x = (details_window.winfo_screenwidth() // 2) - (width // 2)
         y = (details_window.winfo_screenheight() // 2) - (height // 2)
         details_window.geometry(f'{width}x{height}+{x}+{y}')
@@ -2075,24 +6697,30 @@ class ApkSignerGUI:
     
     def refresh_logs(self):
         self.log_text.delete(1.0, tk.END)
+        correlation_id = self.log_filter_entry.get().strip()
         try:
-            log_dir = Path("logs")
-            if log_dir.exists():
-                log_files = sorted(log_dir.glob("*.log"), reverse=True)
-                if log_files:
-                    with open(log_files[0], 'r') as f:
-                        self.log_text.insert(tk.END, f.read())
+            if not LOG_FILE.exists():
+                return
+            if not correlation_id:
+                self.log_text.insert(tk.END, read_log_tail(LOG_FILE))
+            elif LOG_FILE.suffix != ".jsonl":
+                self.log_text.insert(tk.END, "Filtering by job or batch ID needs LOG_FORMAT set to \"json\".")
+            else:
+                records = LogIndex(LOG_FILE).update().records(job_id=correlation_id, batch_id=correlation_id)
+                lines = [LogIndex.format_record(record) for record in records]
+                self.log_text.insert(tk.END, "\n".join(lines) if lines else f"No log records for {correlation_id}")
         except Exception as e:
             self.log_text.insert(tk.END, f"Error loading logs: {str(e)}")
     
+    def clear_log_filter(self):
+        self.log_filter_entry.delete(0, tk.END)
+        self.refresh_logs()
+    
     def clear_logs(self):
         if messagebox.askyesno("Confirm", "Are you sure you want to clear all logs?"):
             self.log_text.delete(1.0, tk.END)
             try:
-                log_dir = Path("logs")
-                if log_dir.exists():
-                    shutil.rmtree(log_dir)
-                    log_dir.mkdir()
+                clear_log_files()
             except Exception as e:
                 messagebox.showerror("Error", f"Failed to clear logs: {str(e)}")
     
@@ -2120,6 +6748,7 @@ class ApkSignerGUI:
             self.root.destroy()
     
     def process_progress_queue(self):
+        batch_changed = False
         try:
             while True:
                 msg_type, *data = self.progress_queue.get_nowait()
@@ -2156,12 +6785,47 @@ class ApkSignerGUI:
                     
                     messagebox.showinfo("Success", f"Signed APK saved to:\n{output_path}")
                 
+                elif msg_type == "skipped":
+                    output_path = data[0]
+                    self.step_label.config(text="Already signed - skipped")
+                    self.status_label.config(text="Ready")
+                    messagebox.showinfo("Skipped", f"The APK is already signed with the configured key:\n{output_path}")
+                    
                 elif msg_type == "failed":
                     error = data[0]
                     self.step_label.config(text="Signing failed!")
                     self.status_label.config(text="Ready")
                     messagebox.showerror("Error", f"Signing failed:\n{error}")
                 
+                elif msg_type == "tool_progress":
+                    step_name, done, total = data
+                    count = f"{min(done, total)}/{total}" if total else str(done)
+                    self.step_label.config(text=f"{step_name}: {count} entries")
+                    
+                elif msg_type == "batch_found":
+                    scanner, chunk, found = data
+                    if scanner is not self.folder_scanner:
+                        continue  # cancelled or replaced; its results must not refill the list
+                    if self.batch_feed:
+                        self.batch_feed.put([path for path, size in chunk if path not in self.batch_queue])
+                    self.batch_queue.add_many(chunk)
+                    self.batch_step_label.config(text=f"Scanning... {found} APKs found")
+                    batch_changed = True
+                    
+                elif msg_type == "batch_scan_complete":
+                    scanner, folder, found, dirs = data
+                    if scanner is not self.folder_scanner:
+                        continue
+                    self.folder_scanner = None
+                    self.close_batch_feed()
+                    self.batch_step_label.config(text=f"Found {found} APKs in {dirs} folders under {folder}")
+                    logging.info(f"Folder scan of {folder}: {found} APKs in {dirs} folders")
+                    
+                elif msg_type == "batch_item":
+                    path, status, digest = data
+                    self.batch_queue.update(path, status=status, hash=digest)
+                    batch_changed = True
+                    
                 elif msg_type == "batch_progress":
                     value, text = data
                     self.batch_progress_bar['value'] = value * 100
@@ -2175,21 +6839,25 @@ class ApkSignerGUI:
                     
                     # Show results
                     success_count = sum(1 for r in results if r["status"] == "success")
+                    skipped_count = sum(1 for r in results if r["status"] == "skipped")
                     total_count = len(results)
                     
                     messagebox.showinfo(
                         "Batch Results",
                         f"Batch signing completed:\n"
                         f"Success: {success_count}/{total_count}\n"
-                        f"Failed: {total_count - success_count}/{total_count}"
+                        f"Skipped (already signed): {skipped_count}/{total_count}\n"
+                        f"Failed: {total_count - success_count - skipped_count}/{total_count}"
                     )
                     
                     # Auto open output directory
                     if success_count > 0 and self.config_manager.get("AUTO_OPEN_OUTPUT", True):
                         self.open_output_dir()
                     
-                    # Clear batch list
-                    self.batch_listbox.delete(0, tk.END)
+                    # Drop signed and skipped APKs; failed ones stay queued for a retry
+                    self.batch_queue.remove_many(r["path"] for r in results if r["status"] in ("success", "skipped"))
+                    self.batch_view.clear_selection()
+                    self.refresh_batch_view()
                 
                 elif msg_type == "verify_complete":
                     output = data[0]
@@ -2209,15 +6877,153 @@ class ApkSignerGUI:
         except queue.Empty:
             pass
         
+        # One redraw per drain, however many items changed status
+        if batch_changed:
+            self.refresh_batch_view()
+        
         # Schedule next check
         self.root.after(100, self.process_progress_queue)
 
 # ------------------- Main Application -------------------
-if __name__ == "__main__":
+def run_gui():
     try:
-        root = tk.Tk()
-        app = ApkSignerGUI(root)
+        with Profiler("gui_startup"):
+            root = tk.Tk()
+            app = ApkSignerGUI(root)
+            root.update_idletasks()
         root.mainloop()
     except Exception as e:
         print(f"Error starting application: {e}")
         input("Press Enter to exit...")
+
+
+def build_arg_parser(config_manager):
+    parser = argparse.ArgumentParser(description="APK Super Signer Pro")
+    parser.add_argument("--profile", action="store_true",
+                        help="Profile signing, batch, history loading and GUI startup (dumps go to logs/)")
+    subparsers = parser.add_subparsers(dest="command")
+    
+    serve = subparsers.add_parser("serve", help="Run the local signing daemon")
+    serve.add_argument("--host", default=config_manager.get("DAEMON_HOST", "127.0.0.1"))
+    serve.add_argument("--port", type=int, default=config_manager.get("DAEMON_PORT", 8765))
+    serve.add_argument("--socket", help="Listen on a Unix socket instead of TCP")
+    serve.add_argument("--max-jobs", type=int, default=config_manager.get("DAEMON_MAX_JOBS", 2))
+    serve.add_argument("--allow-remote", action="store_true", default=config_manager.get("DAEMON_ALLOW_REMOTE", False),
+                       help="Allow listening on a non-loopback host (clients still need the token)")
+    serve.add_argument("--token-file", default=config_manager.get("DAEMON_TOKEN_FILE", "daemon.token"),
+                       help="Owner-only file holding the client token (created if missing)")
+    
+    submit = subparsers.add_parser("submit", help="Submit a job to a running daemon")
+    submit.add_argument("action", choices=SigningDaemon.ACTIONS)
+    submit.add_argument("apk")
+    submit.add_argument("--host", default=config_manager.get("DAEMON_HOST", "127.0.0.1"))
+    submit.add_argument("--port", type=int, default=config_manager.get("DAEMON_PORT", 8765))
+    submit.add_argument("--socket", help="Connect over a Unix socket instead of TCP")
+    submit.add_argument("--token-file", default=config_manager.get("DAEMON_TOKEN_FILE", "daemon.token"),
+                        help="File holding the daemon's client token")
+    submit.add_argument("--wait", action="store_true", help="Stream job events until it finishes")
+    submit.add_argument("--download", metavar="DIR", help="Download the signed APK (implies --wait)")
+    submit.add_argument("--priority", choices=JobScheduler.PRIORITIES,
+                        help="Scheduling class (default: interactive for sign, verify for verify)")
+    
+    batch = subparsers.add_parser("batch", help="Sign APKs locally, reporting each one as it finishes")
+    batch.add_argument("apks", nargs="+")
+    batch.add_argument("--json", action="store_true", help="Print one JSON result per line")
+    batch.add_argument("--concurrency", type=int, default=1,
+                       help="APKs signed at once on the async engine (default: 1, sequential)")
+    
+    verify = subparsers.add_parser("verify", help="Verify APK signatures concurrently")
+    verify.add_argument("apks", nargs="+")
+    verify.add_argument("--concurrency", type=int, default=config_manager.get("ASYNC_JOB_LIMIT", 64))
+    
+    check_align = subparsers.add_parser("check-align", help="Check zip alignment like zipalign -c -p 4")
+    check_align.add_argument("apks", nargs="+")
+    return parser
+
+
+async def report_batch(results, as_json=False):
+    """Print SignResults from an async batch iterator as they arrive; returns the exit code"""
+    failed = 0
+    async for result in results:
+        failed += not result.ok
+        if as_json:
+            print(json.dumps(result.to_dict()), flush=True)
+        elif result.status == "skipped":
+            print(f"{result.apk_path}: already signed, skipped -> {result.output_path}", flush=True)
+        elif result.ok:
+            print(f"{result.apk_path} -> {result.output_path} ({result.wall_s:.2f}s, sha256 {result.signed_hash})", flush=True)
+        else:
+            print(f"{result.apk_path}: FAILED: {result.error}", flush=True)
+    return 1 if failed else 0
+
+
+def main(argv=None):
+    config_manager = ConfigManager()
+    args = build_arg_parser(config_manager).parse_args(argv)
+    Profiler.configure(args.profile or config_manager.get("PROFILE", False), config_manager.get("PROFILE_TOP_N", 25))
+    
+    if args.command == "serve":
+        signer = AdvancedApkSigner(config_manager)
+        token = load_daemon_token(args.token_file, create=True)
+        SigningDaemon(signer, args.max_jobs, token).serve_forever(args.host, args.port, args.socket, args.allow_remote)
+        return 0
+    
+    if args.command == "batch":
+        signer = AdvancedApkSigner(config_manager)
+        if args.concurrency > 1:
+            engine = AsyncSigningEngine(signer, job_limit=args.concurrency)
+            return asyncio.run(report_batch(engine.sign_many(args.apks), args.json))
+        return asyncio.run(report_batch(signer.abatch_sign(args.apks), args.json))
+    
+    if args.command == "verify":
+        engine = AsyncSigningEngine(AdvancedApkSigner(config_manager), job_limit=args.concurrency)
+        
+        async def verify_all():
+            failed = 0
+            async for apk_path, ok in engine.verify_many(args.apks):
+                failed += not ok
+                print(f"{apk_path}: {'OK' if ok else 'FAILED'}", flush=True)
+            return 1 if failed else 0
+        
+        return asyncio.run(verify_all())
+    
+    if args.command == "check-align":
+        failed = 0
+        for apk_path in args.apks:
+            try:
+                misaligned = ApkIndex.for_file(apk_path).misaligned_entries()
+            except (OSError, ValueError) as e:
+                print(f"{apk_path}: ERROR: {e}")
+                failed += 1
+                continue
+            for entry in misaligned:
+                print(f"{entry.data_offset:>10} {entry.name} (BAD - {entry.data_offset % entry.alignment})")
+            print(f"{apk_path}: {'FAILED' if misaligned else 'OK'}")
+            failed += bool(misaligned)
+        return 1 if failed else 0
+    
+    if args.command == "submit":
+        client = SigningDaemonClient(args.host, args.port, args.socket, token=load_daemon_token(args.token_file))
+        job = client.submit(args.action, args.apk, args.priority)
+        print(f"Submitted job {job['id']}")
+        if not (args.wait or args.download):
+            return 0
+        
+        for event in client.stream_events(job["id"]):
+            if event["type"] in ("log", "error", "progress"):
+                print(" ".join(str(d) for d in event["data"]))
+            elif event["type"] == "job":
+                job = event["data"][0]
+        print(f"Job {job['id']}: {job['status']}")
+        if job.get("error"):
+            print(f"Error: {job['error']}")
+        if job["status"] == "success" and args.download:
+            print(f"Downloaded: {client.download(job['id'], args.download)}")
+        return 0 if job["status"] == "success" else 1
+    
+    run_gui()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,225 @@
+# ------------------- Native Signer Tests -------------------
+# Round-trips the in-process v1, v2 and v4 signers: every signature is parsed
+# back from the written files and checked against an independent computation.
+#
+#   python -m pytest -q tests
+
+import os
+import sys
+import base64
+import hashlib
+import random
+import shutil
+import zipfile
+import subprocess
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import signkey
+from signkey import (
+    ApkIndex, SigningKey, sign_v1, sign_v2_in_place, write_v4_signature, signer_certificates,
+    content_digest_intact, block_signature_intact, apk_content_digest, v1_signature_intact, _length_prefixed_items,
+)
+
+
+PUBLIC_EXPONENT = 65537  # openssl's default for generated RSA keys
+
+
+@pytest.fixture(scope="module")
+def key(tmp_path_factory):
+    openssl = shutil.which("openssl")
+    if not openssl:
+        pytest.skip("openssl is needed to generate a test key")
+    folder = tmp_path_factory.mktemp("key")
+    subprocess.run([openssl, "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "2",
+                    "-keyout", str(folder / "key.pem"), "-out", str(folder / "cert.pem"), "-subj", "/CN=Test"],
+                   check=True, capture_output=True)
+    return SigningKey.from_pem((folder / "key.pem").read_text() + (folder / "cert.pem").read_text())
+
+
+@pytest.fixture
+def apk(tmp_path):
+    """An unsigned, unaligned archive with stored, deflated and directory entries"""
+    rng = random.Random(7)
+    path = tmp_path / "app.apk"
+    with zipfile.ZipFile(path, "w") as zf:
+        zf.writestr("AndroidManifest.xml", rng.randbytes(1500), zipfile.ZIP_DEFLATED)
+        zf.writestr("classes.dex", b"dex\n035\0" * 40000 + rng.randbytes(70000), zipfile.ZIP_DEFLATED)
+        zf.writestr("res/", b"")
+        zf.writestr("res/raw/blob.bin", rng.randbytes(10001), zipfile.ZIP_STORED)
+        zf.writestr("lib/x86_64/libfoo.so", rng.randbytes(9000), zipfile.ZIP_STORED)
+    return path
+
+
+def rsa_verify(key, data, signature):
+    expected = signkey.SHA256_DIGEST_INFO + hashlib.sha256(data).digest()
+    recovered = pow(int.from_bytes(signature, "big"), PUBLIC_EXPONENT, key.modulus).to_bytes(key.size, "big")
+    return recovered == b"\x00\x01" + b"\xff" * (key.size - len(expected) - 3) + b"\x00" + expected
+
+
+def v2_signed_apk(apk, key):
+    signed = apk.with_name("signed.apk")
+    sign_v1(apk, signed, key, "TEST", v2_signed=True)
+    sign_v2_in_place(signed, key)
+    return signed
+
+
+def test_v1_signature_files(apk, key, tmp_path):
+    signed = tmp_path / "v1.apk"
+    assert sign_v1(apk, signed, key, "TEST", v2_signed=False) == 4
+
+    with zipfile.ZipFile(signed) as zf:
+        assert zf.testzip() is None
+        manifest = zf.read("META-INF/MANIFEST.MF")
+        signature_file = zf.read("META-INF/TEST.SF")
+        for name in ("AndroidManifest.xml", "classes.dex", "res/raw/blob.bin", "lib/x86_64/libfoo.so"):
+            digest = base64.b64encode(hashlib.sha256(zf.read(name)).digest())
+            assert b"Name: " + name.encode() + b"\r\nSHA-256-Digest: " + digest + b"\r\n" in manifest
+
+    manifest_digest = base64.b64encode(hashlib.sha256(manifest).digest())
+    assert b"SHA-256-Digest-Manifest: " + manifest_digest + b"\r\n" in signature_file
+    assert b"X-Android-APK-Signed" not in signature_file
+    assert signer_certificates(signed) == {"v1": [key.certificate]}
+    assert ApkIndex.for_file(signed).is_aligned
+
+
+def rewrite_entry(path, name, data):
+    with zipfile.ZipFile(path) as zf:
+        entries = [(info, data if info.filename == name else zf.read(info)) for info in zf.infolist()]
+    with zipfile.ZipFile(path, "w") as zf:
+        for info, content in entries:
+            zf.writestr(info, content)
+
+
+def test_v1_signature_detects_changed_bundles(apk, key, tmp_path):
+    bundle = tmp_path / "app.aab"
+    sign_v1(apk, bundle, key, "TEST", v2_signed=False)
+    assert v1_signature_intact(bundle, key.certificate)
+    assert not v1_signature_intact(bundle, b"another certificate")
+
+    rewrite_entry(bundle, "res/raw/blob.bin", b"tampered")
+    ApkIndex.invalidate(bundle)
+    assert not v1_signature_intact(bundle, key.certificate)
+
+    sign_v1(apk, bundle, key, "TEST", v2_signed=False)
+    with zipfile.ZipFile(bundle, "a") as zf:
+        zf.writestr("extra.bin", b"added after signing")
+    ApkIndex.invalidate(bundle)
+    assert not v1_signature_intact(bundle, key.certificate)
+
+    sign_v1(apk, bundle, key, "TEST", v2_signed=False)
+    block = ApkIndex.for_file(bundle).read("META-INF/TEST.RSA")
+    rewrite_entry(bundle, "META-INF/TEST.RSA", block[:-256] + bytes(256))  # our certificate, filler signature
+    ApkIndex.invalidate(bundle)
+    assert signer_certificates(bundle) == {"v1": [key.certificate]}
+    assert not v1_signature_intact(bundle, key.certificate)
+
+    sign_v1(apk, bundle, key, "TEST", v2_signed=False)
+    rewrite_entry(bundle, "META-INF/MANIFEST.MF", ApkIndex.for_file(bundle).read("META-INF/MANIFEST.MF") + b"X: y\r\n")
+    ApkIndex.invalidate(bundle)
+    assert not v1_signature_intact(bundle, key.certificate)
+
+
+def test_v2_signature_round_trip(apk, key):
+    signed = v2_signed_apk(apk, key)
+    index = ApkIndex.for_file(signed)
+
+    block = index.signing_block_pairs()[signkey.APK_SIGNATURE_SCHEME_V2_BLOCK_ID]
+    [signer] = _length_prefixed_items(_length_prefixed_items(block)[0])
+    signed_data, signatures, public_key = _length_prefixed_items(signer)
+    [signature] = _length_prefixed_items(signatures)
+    assert int.from_bytes(signature[:4], "little") == signkey.SIGNATURE_RSA_PKCS1_SHA256
+    assert rsa_verify(key, signed_data, _length_prefixed_items(signature[4:])[0])
+    assert public_key == key.public_key_der
+
+    assert content_digest_intact(signed)
+    assert block_signature_intact(signed, key.certificate)
+    assert signer_certificates(signed) == {"v2": [key.certificate], "v1": [key.certificate]}
+    with zipfile.ZipFile(signed) as zf:
+        assert zf.testzip() is None
+
+
+def replace_signing_block(path, pairs):
+    index = ApkIndex.for_file(path)
+    block = signkey.build_signing_block(pairs)
+    eocd = index.eocd[:16] + (index.entries_end + len(block)).to_bytes(4, "little") + index.eocd[20:]
+    tail = block + index.central_directory + eocd
+    ApkIndex.invalidate(path)
+    with open(path, "r+b") as f:
+        f.truncate(index.entries_end)
+        f.seek(index.entries_end)
+        f.write(tail)
+
+
+def test_forged_v2_signature_is_not_trusted(apk, key):
+    signed = v2_signed_apk(apk, key)
+    pairs = ApkIndex.for_file(signed).signing_block_pairs()
+    block = pairs[signkey.APK_SIGNATURE_SCHEME_V2_BLOCK_ID]
+    # Same certificate and content digest, filler in place of the signature value
+    signature_end = block.rindex(key.public_key_der) - 4
+    forged = block[:signature_end - key.size] + bytes(key.size) + block[signature_end:]
+    replace_signing_block(signed, [(signkey.APK_SIGNATURE_SCHEME_V2_BLOCK_ID, forged)])
+
+    assert content_digest_intact(signed)
+    assert signer_certificates(signed)["v2"] == [key.certificate]
+    assert not block_signature_intact(signed, key.certificate)
+
+
+def test_v2_resigning_keeps_other_pairs(apk, key):
+    signed = v2_signed_apk(apk, key)
+    pairs = ApkIndex.for_file(signed).signing_block_pairs()
+    replace_signing_block(signed, [*pairs.items(), (0x12345678, b"extra"), (signkey.VERITY_PADDING_BLOCK_ID, bytes(8))])
+
+    sign_v2_in_place(signed, key)
+    pairs = ApkIndex.for_file(signed).signing_block_pairs()
+    assert list(pairs) == [signkey.APK_SIGNATURE_SCHEME_V2_BLOCK_ID, 0x12345678]
+    assert pairs[0x12345678] == b"extra"
+    assert content_digest_intact(signed)
+
+
+def test_v2_resigning_refuses_v3_signed_input(apk, key):
+    signed = v2_signed_apk(apk, key)
+    pairs = ApkIndex.for_file(signed).signing_block_pairs()
+    replace_signing_block(signed, [*pairs.items(), (signkey.APK_SIGNATURE_SCHEME_V3_BLOCK_ID, b"v3")])
+    with pytest.raises(ValueError, match="v3 signature"):
+        sign_v2_in_place(signed, key)
+
+
+def test_v4_signature_round_trip(apk, key):
+    signed = v2_signed_apk(apk, key)
+    idsig = Path(write_v4_signature(str(signed), key))
+    data = idsig.read_bytes()
+
+    assert int.from_bytes(data[:4], "little") == signkey.V4_SIGNATURE_VERSION
+    hashing_info, signing_infos = _length_prefixed_items(data[4:], 2)
+    algorithm, log2_block_size = int.from_bytes(hashing_info[:4], "little"), hashing_info[4]
+    salt, root = _length_prefixed_items(hashing_info[5:])
+    assert (algorithm, log2_block_size, salt) == (signkey.V4_HASH_ALGORITHM_SHA256, 12, b"")
+
+    # SigningInfo fields sit directly in signingInfos
+    apk_digest, certificate, additional_data, public_key = _length_prefixed_items(signing_infos, 4)
+    pos = sum(4 + len(item) for item in (apk_digest, certificate, additional_data, public_key))
+    assert int.from_bytes(signing_infos[pos:pos + 4], "little") == signkey.SIGNATURE_RSA_PKCS1_SHA256
+    [signature] = _length_prefixed_items(signing_infos[pos + 4:])
+    assert apk_digest == apk_content_digest(ApkIndex.for_file(signed))
+    assert (certificate, additional_data, public_key) == (key.certificate, b"", key.public_key_der)
+
+    signed_data = (os.path.getsize(signed).to_bytes(8, "little") + hashing_info[:5]
+                   + b"".join(len(item).to_bytes(4, "little") + item
+                              for item in (salt, root, apk_digest, certificate, additional_data)))
+    assert rsa_verify(key, (4 + len(signed_data)).to_bytes(4, "little") + signed_data, signature)
+
+    # The tree follows as a u32 size, root level first; the leaves hash the zero-padded file
+    tree_offset = 4 + 4 + len(hashing_info) + 4 + len(signing_infos)
+    tree_size = int.from_bytes(data[tree_offset:tree_offset + 4], "little")
+    tree = data[tree_offset + 4:]
+    assert len(tree) == tree_size and tree_size % 4096 == 0
+    assert hashlib.sha256(tree[:4096]).digest() == root
+
+    content = signed.read_bytes()
+    content += bytes(-len(content) % 4096)
+    leaves = b"".join(hashlib.sha256(content[start:start + 4096]).digest() for start in range(0, len(content), 4096))
+    assert tree.endswith(leaves + bytes(-len(leaves) % 4096))